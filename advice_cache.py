@@ -0,0 +1,149 @@
+"""
+Response cache for LLM advice
+Entries are content-addressed by a hash of the normalized prompt
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class AdviceCache:
+    """Two-tier advice cache: in-memory LRU in front of an optional SQLite file
+
+    Both tiers expire entries after ``ttl_seconds``. The memory tier holds at
+    most ``max_entries`` items and evicts the least recently used; the disk
+    tier holds at most ``max_disk_entries`` and evicts the oldest.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 24 * 3600,
+                 disk_path: Optional[str] = None, max_disk_entries: int = 100000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self.max_disk_entries = max_disk_entries
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'memory_hits': 0, 'disk_hits': 0, 'evictions': 0}
+
+        self._disk = None
+        self._disk_count = 0
+        if disk_path:
+            self._disk = sqlite3.connect(disk_path, timeout=30, check_same_thread=False)
+            self._disk.execute('PRAGMA journal_mode=WAL')
+            self._disk.execute(
+                'CREATE TABLE IF NOT EXISTS advice_cache '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)'
+            )
+            self._disk.execute('CREATE INDEX IF NOT EXISTS idx_advice_cache_created ON advice_cache (created_at)')
+            self._disk.commit()
+            self._disk_count = self._disk.execute('SELECT COUNT(*) FROM advice_cache').fetchone()[0]
+
+    @classmethod
+    def from_env(cls) -> 'AdviceCache':
+        """Build a cache from ADVICE_CACHE_SIZE, ADVICE_CACHE_TTL and ADVICE_CACHE_PATH"""
+        return cls(
+            max_entries=int(os.getenv('ADVICE_CACHE_SIZE', 1024)),
+            ttl_seconds=float(os.getenv('ADVICE_CACHE_TTL', 24 * 3600)),
+            disk_path=os.getenv('ADVICE_CACHE_PATH') or None
+        )
+
+    @staticmethod
+    def make_key(prompt: str) -> str:
+        """Hash a prompt after collapsing whitespace, so indentation does not matter"""
+        normalized = ' '.join(prompt.split())
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value for ``key``, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at < self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._counters['hits'] += 1
+                    self._counters['memory_hits'] += 1
+                    return value
+                del self._memory[key]
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    'SELECT value, created_at FROM advice_cache WHERE key = ?', (key,)
+                ).fetchone()
+                if row is not None and now - row[1] < self.ttl_seconds:
+                    self._remember(key, row[0], row[1])
+                    self._counters['hits'] += 1
+                    self._counters['disk_hits'] += 1
+                    return row[0]
+
+            self._counters['misses'] += 1
+            return None
+
+    def set(self, key: str, value: str):
+        """Store ``value`` in both tiers"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+
+            if self._disk is not None:
+                cursor = self._disk.execute(
+                    'INSERT OR REPLACE INTO advice_cache (key, value, created_at) VALUES (?, ?, ?)',
+                    (key, value, now)
+                )
+                # REPLACE of an existing key reports rowcount 1 as well, so
+                # the count may run slightly high; that only prunes early
+                self._disk_count += cursor.rowcount
+                if self._disk_count > self.max_disk_entries:
+                    self._prune_disk(now)
+                self._disk.commit()
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def _prune_disk(self, now):
+        """Drop expired rows, then the oldest rows beyond the size limit"""
+        self._disk.execute('DELETE FROM advice_cache WHERE created_at < ?', (now - self.ttl_seconds,))
+        self._disk.execute(
+            'DELETE FROM advice_cache WHERE key IN '
+            '(SELECT key FROM advice_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_disk_entries,)
+        )
+        self._disk_count = self._disk.execute('SELECT COUNT(*) FROM advice_cache').fetchone()[0]
+
+    def invalidate(self, key: str):
+        """Remove ``key`` from both tiers"""
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._disk is not None:
+                self._disk.execute('DELETE FROM advice_cache WHERE key = ?', (key,))
+                self._disk.commit()
+
+    def clear(self):
+        """Remove every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            if self._disk is not None:
+                self._disk.execute('DELETE FROM advice_cache')
+                self._disk.commit()
+                self._disk_count = 0
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current sizes"""
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                **self._counters,
+                'hit_rate': round(self._counters['hits'] / lookups, 3) if lookups else 0.0,
+                'memory_size': len(self._memory),
+                'disk_size': self._disk_count if self._disk is not None else None
+            }
@@ -0,0 +1,114 @@
+"""
+Background advice generation
+Runs LLM advice calls on a bounded worker pool so page renders never wait for them
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+
+class AdviceQueueFull(Exception):
+    """Raised when too many advice jobs are already pending"""
+
+
+class AdviceJobManager:
+    """Queue of advice jobs served by a background thread pool
+
+    At most ``max_pending`` jobs may be queued or running at once, and each
+    user has at most one job in flight: submitting again while one is
+    pending returns the existing job. Finished jobs are kept for
+    ``result_ttl`` seconds so clients can poll for them.
+    """
+
+    def __init__(self, service_factory: Callable, max_workers: int = 4,
+                 max_pending: int = 64, result_ttl: float = 600):
+        self.service_factory = service_factory
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='advice')
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._inflight = {}
+
+    def submit(self, user_key: str, user_profile: Dict, context: str) -> Dict:
+        """
+        Queue advice generation for a user
+
+        Returns:
+            Dict: A snapshot of the (possibly already running) job
+        """
+        with self._lock:
+            self._purge_finished()
+
+            job_id = self._inflight.get(user_key)
+            if job_id is not None:
+                return dict(self._jobs[job_id])
+
+            if len(self._inflight) >= self.max_pending:
+                raise AdviceQueueFull("Too many advice requests are pending")
+
+            job = {
+                'id': uuid.uuid4().hex,
+                'user_key': user_key,
+                'status': 'pending',
+                'advice': None,
+                'error': None,
+                'created_at': time.time(),
+                'finished_at': None
+            }
+            self._jobs[job['id']] = job
+            self._inflight[user_key] = job['id']
+            snapshot = dict(job)
+
+        self._executor.submit(self._run, job['id'], user_profile, context)
+        return snapshot
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Return a snapshot of a job, or None if it is unknown or expired"""
+        with self._lock:
+            self._purge_finished()
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _run(self, job_id, user_profile, context):
+        self._update(job_id, status='running')
+        try:
+            advice = self.service_factory().get_personalized_advice(
+                user_profile=user_profile,
+                context=context
+            )
+            self._update(job_id, status='done', advice=advice)
+        except Exception as e:
+            print(f"Warning: Advice job {job_id} failed: {e}")
+            self._update(job_id, status='failed', error=str(e))
+
+    def _update(self, job_id, **changes):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(changes)
+            if job['status'] in ('done', 'failed'):
+                job['finished_at'] = time.time()
+                if self._inflight.get(job['user_key']) == job_id:
+                    del self._inflight[job['user_key']]
+
+    def _purge_finished(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job['finished_at'] is not None and job['finished_at'] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict:
+        """Number of in-flight and retained jobs"""
+        with self._lock:
+            self._purge_finished()
+            return {'in_flight': len(self._inflight), 'retained': len(self._jobs)}
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker pool"""
+        self._executor.shutdown(wait=wait)
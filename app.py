@@ -2,15 +2,20 @@
 Web Application using Flask
 Provides user interface for the Health & Fitness XAI System
 """
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, stream_with_context
 from main import HealthFitnessXAISystem
-from database import UserDatabase
-from tracker import DailyTracker
-from llm_service import GeminiService
+from user_registry import open_user_registry
+from plan_export import resolve_format
+from database import open_database
+from tracker import TrackerStore
+from llm_service import get_gemini_service, init_gemini_service, build_plan_context
+from advice_jobs import AdviceJobManager
+from ml_shap_explainer import get_shap_explainer
 from dotenv import load_dotenv
+import os
 import secrets
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # Load environment variables from .env file
 load_dotenv()
@@ -29,9 +34,35 @@ def set_security_headers(response):
     response.headers['Content-Security-Policy'] = "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline'"
     return response
 
-# Initialize the system and database
-system = HealthFitnessXAISystem()
-db = UserDatabase()
+# DB_BACKEND selects the storage backend: 'json' (default), 'journal' or 'sqlite'
+DB_BACKEND = os.getenv('DB_BACKEND', 'json')
+db = open_database(DB_BACKEND)
+
+# USER_REGISTRY=sqlite keeps the system's user profiles in a SQLite file
+# (USER_REGISTRY_PATH) shared by all worker processes, so sessions need not be
+# sticky. Profiles not in it yet are loaded from the database on first use.
+# Only DB_BACKEND=sqlite is shared too: the json and journal backends are read
+# once per process, so accounts and feedback written by one worker stay
+# invisible to the others and multi-worker deployments still need sticky sessions.
+USER_REGISTRY = os.getenv('USER_REGISTRY', 'memory')
+if USER_REGISTRY == 'sqlite' and DB_BACKEND != 'sqlite':
+    print(f"Warning: USER_REGISTRY=sqlite with DB_BACKEND={DB_BACKEND}: only profiles are shared "
+          "between worker processes; set DB_BACKEND=sqlite to share accounts and feedback too")
+user_registry = open_user_registry(
+    USER_REGISTRY,
+    db_path=os.getenv('USER_REGISTRY_PATH', 'user_registry.sqlite3'),
+    max_entries=int(os.getenv('USER_REGISTRY_SIZE', 1024)),
+    loader=db.find_profile
+)
+
+# Initialize the system. PLAN_PRECOMPUTE=1 builds a user's plan when their
+# profile is saved instead of on the next page view; at most PLAN_CACHE_SIZE
+# users' plans are kept in memory
+system = HealthFitnessXAISystem(
+    precompute_on_save=os.getenv('PLAN_PRECOMPUTE') == '1',
+    registry=user_registry,
+    max_cached_plans=int(os.getenv('PLAN_CACHE_SIZE', 1024))
+)
 
 # Migrate existing profiles to include calculated metrics
 def migrate_profiles():
@@ -58,6 +89,75 @@ def migrate_profiles():
 # Run migration on startup
 migrate_profiles()
 
+# SHAP_BACKEND picks the explanation mode: 'tree' (exact), 'compact' (exact,
+# served from the memory-mapped export), 'truncated', 'distilled' or
+# 'analytic'. Admins can switch it at runtime via /admin/explainer. Set before
+# startup, which memory-maps the compact export only for the compact backend
+get_shap_explainer().set_backend(os.getenv('SHAP_BACKEND', 'tree'))
+
+# Load the SHAP model artifact at startup (retraining in the background if it
+# is missing or stale) so no request pays for training. A corrupt artifact
+# fails startup. SHAP_PRELOAD=0 skips this.
+if os.getenv('SHAP_PRELOAD', '1') == '1':
+    get_shap_explainer().startup(background=True)
+
+# Daily trackers are cached in memory and written back every
+# TRACKER_FLUSH_INTERVAL seconds (0 writes on every change); at most
+# TRACKER_CACHE_SIZE users' trackers are kept. TRACKER_LAYOUT=monthly stores
+# each user's days in one file per month (see migrate_tracker_data.py).
+# A flush merges in whatever other worker processes wrote since; the check and
+# the write are locked with fcntl, so on platforms without it (Windows) run a
+# single worker or set TRACKER_FLUSH_INTERVAL=0
+tracker_store = TrackerStore(
+    max_trackers=int(os.getenv('TRACKER_CACHE_SIZE', 256)),
+    flush_interval=float(os.getenv('TRACKER_FLUSH_INTERVAL', 2.0)),
+    layout=os.getenv('TRACKER_LAYOUT', 'single')
+)
+
+# Largest number of operations accepted by one /tracker/batch request
+TRACKER_BATCH_LIMIT = int(os.getenv('TRACKER_BATCH_LIMIT', 500))
+
+# LLM_EAGER_INIT=1 sets up the shared Gemini service at startup instead of on
+# the first request that needs it
+if os.getenv('LLM_EAGER_INIT') == '1':
+    try:
+        init_gemini_service()
+    except Exception as e:
+        print(f"Warning: Could not initialize Gemini service: {e}")
+
+# ADVICE_MODE=job generates AI advice in the background: pages render with an
+# advice job id that the client polls at /advice-job/<job_id>
+ADVICE_MODE = os.getenv('ADVICE_MODE', 'sync')
+advice_jobs = AdviceJobManager(
+    get_gemini_service,
+    max_workers=int(os.getenv('ADVICE_WORKERS', 4)),
+    max_pending=int(os.getenv('ADVICE_MAX_PENDING', 64))
+) if ADVICE_MODE == 'job' else None
+
+
+def attach_ai_advice(plan, user_email, user_profile):
+    """Add AI advice to the plan, or the id of a background advice job"""
+    gemini = get_gemini_service()
+    context = build_plan_context(plan)
+    
+    if advice_jobs is None:
+        plan['ai_advice'] = gemini.get_personalized_advice(
+            user_profile=user_profile,
+            context=context
+        )
+        return
+    
+    # Cached advice is cheap, so serve it inline
+    cached = gemini.get_cached_advice(user_profile, context)
+    if cached is not None:
+        plan['ai_advice'] = cached
+        return
+    
+    job = advice_jobs.submit(user_email, user_profile, context)
+    plan['ai_advice'] = None
+    plan['ai_advice_job'] = job['id']
+    plan['ai_advice_status'] = job['status']
+
 
 @app.route('/')
 def index():
@@ -82,26 +182,8 @@ def index():
             user_profile = db.get_user_profile(user_email)
             if user_profile:
                 try:
-                    # Initialize Gemini service
-                    gemini = GeminiService()
-                    
-                    # Create context for Gemini
-                    context = f"""
-                    Current Plan Summary:
-                    - Goal: {plan.get('goal', 'Not specified')}
-                    - Daily Calories: {plan.get('daily_calories', 'Not calculated')}
-                    - Workout Frequency: {plan.get('workout_frequency', 'Not specified')}
-                    - Dietary Focus: {plan.get('dietary_focus', 'Balanced')}
-                    """
-                    
-                    # Get AI-powered advice
-                    ai_advice = gemini.get_personalized_advice(
-                        user_profile=user_profile,
-                        context=context
-                    )
-                    
-                    # Add AI advice to the plan
-                    plan['ai_advice'] = ai_advice
+                    # Add AI advice (or a pending advice job) to the plan
+                    attach_ai_advice(plan, user_email, user_profile)
                     
                 except Exception as e:
                     print(f"Warning: Could not generate AI advice: {e}")
@@ -333,26 +415,8 @@ def get_recommendations():
         user_profile = db.get_user_profile(user_email)
         if user_profile:
             try:
-                # Initialize Gemini service
-                gemini = GeminiService()
-                
-                # Create context for Gemini
-                context = f"""
-                Current Plan Summary:
-                - Goal: {plan.get('goal', 'Not specified')}
-                - Daily Calories: {plan.get('daily_calories', 'Not calculated')}
-                - Workout Frequency: {plan.get('workout_frequency', 'Not specified')}
-                - Dietary Focus: {plan.get('dietary_focus', 'Balanced')}
-                """
-                
-                # Get AI-powered advice
-                ai_advice = gemini.get_personalized_advice(
-                    user_profile=user_profile,
-                    context=context
-                )
-                
-                # Add AI advice to the plan
-                plan['ai_advice'] = ai_advice
+                # Add AI advice (or a pending advice job) to the plan
+                attach_ai_advice(plan, user_email, user_profile)
                 
             except Exception as e:
                 print(f"Warning: Could not generate AI advice: {e}")
@@ -408,17 +472,38 @@ def update_profile():
         }), 400
 
 
+# File extensions for downloaded exports
+EXPORT_EXTENSIONS = {'json': 'json', 'ndjson': 'ndjson', 'msgpack': 'msgpack', 'packed': 'hfxp'}
+
+
+def export_response(chunks, fmt, mimetype, filename):
+    """Chunked download response for an export stream"""
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}.{EXPORT_EXTENSIONS[fmt]}'}
+    )
+
+
 @app.route('/export_plan', methods=['GET'])
 def export_plan():
-    """Export plan to JSON"""
+    """Export plan to JSON, or stream it with ?format=json|ndjson|msgpack|packed"""
     try:
         user_id = session.get('user_id')
-        if not user_id:
+        if not user_id or system.get_user(user_id) is None:
             return jsonify({
                 'success': False,
                 'error': 'No user profile found.'
             }), 400
         
+        # With an explicit format the plan is sent as a file, not wrapped in JSON
+        fmt = request.args.get('format')
+        if fmt == 'json':
+            return export_response(iter([system.export_plan(user_id)]), fmt, 'application/json', 'plan')
+        if fmt:
+            fmt, mimetype = resolve_format(fmt)
+            return export_response(system.export_plans([user_id], fmt), fmt, mimetype, 'plan')
+        
         plan_json = system.export_plan(user_id)
         
         return jsonify({
@@ -433,6 +518,41 @@ def export_plan():
         }), 400
 
 
+@app.route('/admin/export_plans', methods=['GET'])
+def admin_export_plans():
+    """Stream plans for every user with a profile (admin only)"""
+    if 'user_email' not in session:
+        return jsonify({'success': False, 'error': 'Please login first'}), 401
+    if not db.is_admin(session['user_email']):
+        return jsonify({'success': False, 'error': 'Admin access required'}), 403
+    
+    try:
+        fmt, mimetype = resolve_format(request.args.get('format', 'ndjson'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    workers = request.args.get('workers')
+    if workers is not None:
+        try:
+            workers = int(workers)
+        except ValueError:
+            workers = 0
+        if workers < 1:
+            return jsonify({'success': False, 'error': 'workers must be a positive integer'}), 400
+        # One plan worker process per CPU at most
+        workers = min(workers, os.cpu_count() or 1)
+    profiles = [user.get('profile') for user in list(db.get_all_users().values())]
+    
+    def user_ids():
+        for profile in profiles:
+            if not profile:
+                continue
+            if system.get_user(profile['user_id']) is None:
+                system.create_user(profile)
+            yield profile['user_id']
+    
+    return export_response(system.export_plans(user_ids(), fmt, workers=workers), fmt, mimetype, 'plans')
+
+
 @app.route('/tracking_template', methods=['GET'])
 def tracking_template():
     """Get progress tracking template"""
@@ -449,15 +569,15 @@ def get_today_tracker():
     if 'user_email' not in session:
         return jsonify({'success': False, 'error': 'Not logged in'}), 401
     
-    tracker = DailyTracker(session['user_email'])
-    today_data = tracker.get_today_data()
-    stats = tracker.get_progress_stats()
-    
-    return jsonify({
-        'success': True,
-        'data': today_data,
-        'stats': stats
-    })
+    with tracker_store.open(session['user_email']) as tracker:
+        today_data = tracker.get_today_data()
+        stats = tracker.get_progress_stats()
+        
+        return jsonify({
+            'success': True,
+            'data': today_data,
+            'stats': stats
+        })
 
 
 @app.route('/tracker/steps', methods=['POST'])
@@ -469,10 +589,9 @@ def update_steps():
     data = request.json
     steps = data.get('steps', 0)
     
-    tracker = DailyTracker(session['user_email'])
-    result = tracker.update_steps(steps)
-    
-    return jsonify({'success': True, 'data': result})
+    with tracker_store.open(session['user_email']) as tracker:
+        result = tracker.update_steps(steps)
+        return jsonify({'success': True, 'data': result})
 
 
 @app.route('/tracker/water', methods=['POST'])
@@ -484,10 +603,9 @@ def add_water():
     data = request.json
     ml = data.get('ml', 250)  # Default glass size
     
-    tracker = DailyTracker(session['user_email'])
-    result = tracker.add_water(ml)
-    
-    return jsonify({'success': True, 'data': result})
+    with tracker_store.open(session['user_email']) as tracker:
+        result = tracker.add_water(ml)
+        return jsonify({'success': True, 'data': result})
 
 
 @app.route('/tracker/sleep', methods=['POST'])
@@ -499,10 +617,9 @@ def update_sleep():
     data = request.json
     hours = data.get('hours', 0)
     
-    tracker = DailyTracker(session['user_email'])
-    result = tracker.update_sleep(hours)
-    
-    return jsonify({'success': True, 'data': result})
+    with tracker_store.open(session['user_email']) as tracker:
+        result = tracker.update_sleep(hours)
+        return jsonify({'success': True, 'data': result})
 
 
 @app.route('/tracker/meal/<meal_type>/<action>', methods=['POST'])
@@ -511,16 +628,15 @@ def toggle_meal(meal_type, action):
     if 'user_email' not in session:
         return jsonify({'success': False, 'error': 'Not logged in'}), 401
     
-    tracker = DailyTracker(session['user_email'])
-    
-    if action == 'complete':
-        result = tracker.complete_meal(meal_type)
-    elif action == 'uncomplete':
-        result = tracker.uncomplete_meal(meal_type)
-    else:
+    if action not in ('complete', 'uncomplete'):
         return jsonify({'success': False, 'error': 'Invalid action'}), 400
     
-    return jsonify({'success': True, 'data': result})
+    with tracker_store.open(session['user_email']) as tracker:
+        if action == 'complete':
+            result = tracker.complete_meal(meal_type)
+        else:
+            result = tracker.uncomplete_meal(meal_type)
+        return jsonify({'success': True, 'data': result})
 
 
 @app.route('/tracker/exercise/<day>/<exercise_name>/<action>', methods=['POST'])
@@ -529,16 +645,15 @@ def toggle_exercise(day, exercise_name, action):
     if 'user_email' not in session:
         return jsonify({'success': False, 'error': 'Not logged in'}), 401
     
-    tracker = DailyTracker(session['user_email'])
-    
-    if action == 'complete':
-        result = tracker.complete_exercise(exercise_name, day)
-    elif action == 'uncomplete':
-        result = tracker.uncomplete_exercise(exercise_name, day)
-    else:
+    if action not in ('complete', 'uncomplete'):
         return jsonify({'success': False, 'error': 'Invalid action'}), 400
     
-    return jsonify({'success': True, 'data': result})
+    with tracker_store.open(session['user_email']) as tracker:
+        if action == 'complete':
+            result = tracker.complete_exercise(exercise_name, day)
+        else:
+            result = tracker.uncomplete_exercise(exercise_name, day)
+        return jsonify({'success': True, 'data': result})
 
 
 @app.route('/tracker/replace_food', methods=['POST'])
@@ -552,10 +667,41 @@ def replace_food():
     original_food = data.get('original_food')
     replacement_food = data.get('replacement_food')
     
-    tracker = DailyTracker(session['user_email'])
-    result = tracker.replace_food(meal_type, original_food, replacement_food)
+    with tracker_store.open(session['user_email']) as tracker:
+        result = tracker.replace_food(meal_type, original_food, replacement_food)
+        return jsonify({'success': True, 'data': result})
+
+
+@app.route('/tracker/batch', methods=['POST'])
+def tracker_batch():
+    """Apply an ordered list of tracker updates with a single write"""
+    if 'user_email' not in session:
+        return jsonify({'success': False, 'error': 'Not logged in'}), 401
+    
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'error': 'Request body must be a JSON object'}), 400
+    operations = data.get('operations')
+    if not isinstance(operations, list):
+        return jsonify({'success': False, 'error': 'operations must be a list'}), 400
+    if len(operations) > TRACKER_BATCH_LIMIT:
+        return jsonify({
+            'success': False,
+            'error': f'At most {TRACKER_BATCH_LIMIT} operations per batch'
+        }), 400
     
-    return jsonify({'success': True, 'data': result})
+    with tracker_store.open(session['user_email']) as tracker:
+        try:
+            result = tracker.apply_batch(operations)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        return jsonify({
+            'success': True,
+            'data': result,
+            'stats': tracker.get_progress_stats(),
+            'applied': len(operations)
+        })
 
 
 @app.route('/tracker/weekly', methods=['GET'])
@@ -564,10 +710,9 @@ def get_weekly_summary():
     if 'user_email' not in session:
         return jsonify({'success': False, 'error': 'Not logged in'}), 401
     
-    tracker = DailyTracker(session['user_email'])
-    weekly_data = tracker.get_weekly_summary()
-    
-    return jsonify({'success': True, 'data': weekly_data})
+    with tracker_store.open(session['user_email']) as tracker:
+        weekly_data = tracker.get_weekly_summary()
+        return jsonify({'success': True, 'data': weekly_data})
 
 
 @app.route('/regenerate-advice', methods=['POST'])
@@ -595,22 +740,17 @@ def regenerate_advice():
         user_profile = db.get_user_profile(user_email)
         if user_profile:
             try:
-                # Initialize Gemini service
-                gemini = GeminiService()
+                # Shared Gemini service
+                gemini = get_gemini_service()
                 
                 # Create context for Gemini
-                context = f"""
-                Current Plan Summary:
-                - Goal: {plan.get('goal', 'Not specified')}
-                - Daily Calories: {plan.get('daily_calories', 'Not calculated')}
-                - Workout Frequency: {plan.get('workout_frequency', 'Not specified')}
-                - Dietary Focus: {plan.get('dietary_focus', 'Balanced')}
-                """
+                context = build_plan_context(plan)
                 
-                # Get AI-powered advice
+                # Get fresh AI-powered advice, bypassing the cache
                 ai_advice = gemini.get_personalized_advice(
                     user_profile=user_profile,
-                    context=context
+                    context=context,
+                    use_cache=False
                 )
                 
                 return jsonify({
@@ -637,6 +777,125 @@ def regenerate_advice():
         }), 400
 
 
+def format_sse(data, event=None):
+    """Format one server-sent event; multi-line data becomes several data: lines"""
+    message = f"event: {event}\n" if event else ''
+    message += ''.join(f"data: {line}\n" for line in data.split('\n'))
+    return message + '\n'
+
+
+@app.route('/regenerate-advice/stream', methods=['GET'])
+def stream_advice():
+    """Stream freshly generated AI advice as server-sent events"""
+    if 'user_email' not in session:
+        return jsonify({'success': False, 'error': 'Please login first'}), 401
+    
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({
+            'success': False,
+            'error': 'No user profile found. Please create a profile first.'
+        }), 400
+    
+    user_profile = db.get_user_profile(session['user_email'])
+    if not user_profile:
+        return jsonify({
+            'success': False,
+            'error': 'Please complete your profile to get personalized AI advice.'
+        }), 400
+    
+    try:
+        plan = system.generate_complete_plan(user_id)
+        gemini = get_gemini_service()
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    def generate():
+        try:
+            for chunk in gemini.stream_personalized_advice(user_profile, build_plan_context(plan)):
+                yield format_sse(chunk, event='chunk')
+            yield format_sse('', event='done')
+        except Exception as e:
+            # Also raised after a partial answer, which must not end with 'done'
+            print(f"Warning: Could not stream AI advice: {e}")
+            yield format_sse('Failed to generate advice. Please try again.', event='error')
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/advice-job/<job_id>', methods=['GET'])
+def advice_job_status(job_id):
+    """Poll a background advice job"""
+    if 'user_email' not in session:
+        return jsonify({'success': False, 'error': 'Please login first'}), 401
+    
+    job = advice_jobs.get(job_id) if advice_jobs is not None else None
+    if job is None or job['user_key'] != session['user_email']:
+        return jsonify({'success': False, 'error': 'Advice job not found'}), 404
+    
+    if job['status'] == 'failed':
+        return jsonify({
+            'success': False,
+            'status': job['status'],
+            'error': 'Failed to generate advice. Please try again.'
+        }), 500
+    
+    return jsonify({
+        'success': True,
+        'status': job['status'],
+        'ai_advice': job['advice']
+    })
+
+
+@app.route('/health/llm', methods=['GET'])
+def llm_health():
+    """Report the state of the shared Gemini service"""
+    try:
+        gemini = get_gemini_service()
+    except Exception as e:
+        return jsonify({'success': False, 'status': 'unavailable', 'error': str(e)}), 503
+    
+    # A live probe costs an API call, so only admins may request it
+    probe = request.args.get('probe') == '1' and db.is_admin(session.get('user_email'))
+    health = gemini.health_check(probe=probe)
+    # 'degraded' means the circuit breaker is serving fallbacks; the app itself is up
+    status_code = 503 if health['status'] == 'error' else 200
+    return jsonify({'success': status_code == 200, **health}), status_code
+
+
+@app.route('/admin/explainer', methods=['GET', 'POST'])
+def admin_explainer():
+    """Inspect or switch the SHAP explanation mode (admin only)"""
+    if 'user_email' not in session:
+        return jsonify({'success': False, 'error': 'Please login first'}), 401
+    if not db.is_admin(session['user_email']):
+        return jsonify({'success': False, 'error': 'Admin access required'}), 403
+    
+    explainer = get_shap_explainer()
+    try:
+        if request.method == 'POST':
+            data = request.json or {}
+            if data.get('backend'):
+                explainer.set_backend(data['backend'], **data.get('options', {}))
+            # Calibration explains a few hundred rows with every mode
+            if data.get('calibrate'):
+                explainer.calibrate(n_samples=int(data.get('samples', 200)))
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'backend': explainer.backend_name,
+        'options': explainer.backend_options,
+        'cache': explainer.cache_stats(),
+        'report': explainer.mode_report
+    })
+
+
 @app.route('/submit-feedback', methods=['POST'])
 def submit_feedback():
     """Store user feedback on AI advice"""
@@ -695,6 +954,16 @@ def feedback_stats():
                 'error': 'Admin access required'
             }), 403
         
+        # Optional ?days=N limits the stats to the last N days
+        days = request.args.get('days', type=int)
+        if days:
+            since = (datetime.now() - timedelta(days=days - 1)).date().isoformat()
+            return jsonify({
+                'success': True,
+                'stats': db.get_feedback_stats(since=since),
+                'daily': db.get_daily_feedback_stats(since=since)
+            })
+        
         stats = db.get_feedback_stats()
         
         return jsonify({
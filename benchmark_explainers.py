@@ -0,0 +1,77 @@
+"""
+Explainer Backend Benchmark
+Compares latency and attribution agreement of the tree and analytic SHAP engines
+
+Usage:
+    python benchmark_explainers.py [--rows 500] [--repeat 5]
+"""
+import argparse
+import time
+import numpy as np
+from ml_shap_explainer import SHAPMLExplainer
+
+
+def time_call(fn, repeat):
+    """Best-of-``repeat`` wall time for ``fn`` in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SHAP explainer backends")
+    parser.add_argument('--rows', type=int, default=500, help="Number of profiles to explain")
+    parser.add_argument('--repeat', type=int, default=5, help="Timing repetitions (best is reported)")
+    args = parser.parse_args()
+
+    explainer = SHAPMLExplainer(backend='tree')
+    if not explainer.load_model():
+        explainer.train_model()
+
+    df = explainer.generate_training_data(n_samples=args.rows)
+    X = df[explainer.feature_names].to_numpy(dtype=float)
+    target = df['target_calories'].to_numpy()
+
+    backends = {}
+    for name in SHAPMLExplainer.BACKENDS:
+        explainer.set_backend(name)
+        backends[name] = explainer.get_backend()
+
+    print("=" * 70)
+    print("EXPLAINER BACKEND BENCHMARK")
+    print("=" * 70)
+    print(f"{'backend':10s} {'single row':>14s} {'batch of ' + str(args.rows):>16s} {'per row':>12s} {'pred MAE':>10s}")
+
+    results = {}
+    for name, backend in backends.items():
+        single = time_call(lambda: backend.explain(X[:1]), args.repeat)
+        batch = time_call(lambda: backend.explain(X), args.repeat)
+        results[name] = backend.explain(X)
+        mae = np.mean(np.abs(results[name][0] - target))
+        print(f"{name:10s} {single * 1e3:11.3f} ms {batch * 1e3:13.2f} ms {batch / args.rows * 1e6:9.1f} us {mae:10.1f}")
+
+    tree_shap = results['tree'][1]
+    analytic_shap = results['analytic'][1]
+
+    print("\n" + "=" * 70)
+    print("ATTRIBUTION AGREEMENT (tree vs analytic)")
+    print("=" * 70)
+    print(f"{'feature':15s} {'mean |diff|':>12s} {'correlation':>12s}")
+    for i, feature in enumerate(explainer.feature_names):
+        diff = np.mean(np.abs(tree_shap[:, i] - analytic_shap[:, i]))
+        if np.std(tree_shap[:, i]) > 0 and np.std(analytic_shap[:, i]) > 0:
+            corr = f"{np.corrcoef(tree_shap[:, i], analytic_shap[:, i])[0, 1]:12.3f}"
+        else:
+            corr = f"{'n/a':>12s}"
+        print(f"{feature:15s} {diff:12.1f} {corr}")
+
+    top_agree = np.mean(np.argmax(np.abs(tree_shap), axis=1) == np.argmax(np.abs(analytic_shap), axis=1))
+    print(f"\nTop feature agreement: {top_agree * 100:.1f}%")
+    print(f"Base values: tree {results['tree'][2]:.1f}, analytic {results['analytic'][2]:.1f}")
+
+
+if __name__ == "__main__":
+    main()
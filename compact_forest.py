@@ -0,0 +1,276 @@
+"""
+Compact Forest Format
+Pickle-free, memory-mappable storage for a trained RandomForest with a pure-NumPy predictor and TreeSHAP
+"""
+import json
+import os
+import numpy as np
+
+
+FORMAT = 'compact-forest-v2'
+
+# v1 exports lack the SHAP tables; they are rebuilt in memory on load
+READABLE_FORMATS = ('compact-forest-v1', FORMAT)
+
+# Node arrays drive prediction; leaf arrays drive TreeSHAP
+NODE_ARRAYS = ('left', 'right', 'feature', 'threshold', 'value', 'roots')
+LEAF_ARRAYS = ('leaf_value', 'leaf_lower', 'leaf_upper', 'leaf_zero_fraction')
+
+# Row-independent TreeSHAP factors per leaf, derived from leaf_zero_fraction
+SHAP_ARRAYS = ('shap_log_out', 'shap_log_ratio', 'shap_inv_out', 'shap_inv_delta')
+
+
+class CompactForest:
+    """A RandomForestRegressor flattened into plain NumPy arrays
+
+    All trees share one set of node arrays indexed by global node id:
+    ``left``/``right`` hold child ids (-1 at leaves), ``feature`` and
+    ``threshold`` the split, ``value`` the node output and ``roots`` the id of
+    each tree's root.
+
+    For TreeSHAP every leaf is also stored as the box of feature intervals
+    leading to it (``leaf_lower`` < x <= ``leaf_upper``) together with the
+    product of cover ratios along its path for each feature
+    (``leaf_zero_fraction``). Features not split on keep an unbounded
+    interval and a ratio of 1.
+
+    The row-independent part of TreeSHAP (see shap_values) is precomputed
+    into the ``shap_*`` arrays, which are about three times the size of the
+    leaf arrays.
+
+    Saved as one ``.npy`` file per array plus ``meta.json`` in a directory, so
+    worker processes can ``np.load(..., mmap_mode='r')`` the same files and
+    share their pages instead of each unpickling a private copy.
+    """
+
+    # Rows x leaves x features evaluated at once by shap_values; small blocks
+    # keep the temporaries in cache, which matters more than call overhead
+    BLOCK_CELLS = 32768
+    MAX_BLOCK_ROWS = 256
+    # Batches up to this size are explained row by row over all leaves at
+    # once, which beats blocking when there is only one row to amortize over
+    ROW_BY_ROW = 2
+
+    def __init__(self, arrays, feature_names, max_depth, base_value=None):
+        self.feature_names = list(feature_names)
+        if any(name not in arrays for name in SHAP_ARRAYS):
+            arrays = {**arrays, **self._shap_tables(np.asarray(arrays['leaf_zero_fraction']))}
+        self.arrays = arrays
+        self.max_depth = int(max_depth)
+        self.n_trees = len(arrays['roots'])
+        for name in NODE_ARRAYS + LEAF_ARRAYS + SHAP_ARRAYS:
+            setattr(self, name, arrays[name])
+        if base_value is None:
+            base_value = float(np.sum(self.leaf_value * np.prod(self.leaf_zero_fraction, axis=1)) / self.n_trees)
+        self.base_value = base_value
+
+    @classmethod
+    def from_sklearn(cls, model, feature_names):
+        """Flatten a fitted RandomForestRegressor (or a single DecisionTreeRegressor)"""
+        estimators = getattr(model, 'estimators_', [model])
+        n_features = len(feature_names)
+        nodes = {name: [] for name in ('left', 'right', 'feature', 'threshold', 'value')}
+        leaves = {name: [] for name in LEAF_ARRAYS}
+        roots = []
+        offset = 0
+        max_depth = 0
+
+        for estimator in estimators:
+            tree = estimator.tree_
+            left = tree.children_left.astype(np.int64)
+            right = tree.children_right.astype(np.int64)
+            cover = tree.weighted_n_node_samples
+            value = tree.value.reshape(tree.node_count, -1)[:, 0]
+
+            nodes['left'].append(np.where(left >= 0, left + offset, -1))
+            nodes['right'].append(np.where(right >= 0, right + offset, -1))
+            nodes['feature'].append(tree.feature)
+            nodes['threshold'].append(tree.threshold)
+            nodes['value'].append(value)
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+
+            stack = [(0, np.full(n_features, -np.inf), np.full(n_features, np.inf), np.ones(n_features))]
+            while stack:
+                node, lower, upper, zero_fraction = stack.pop()
+                if left[node] < 0:
+                    leaves['leaf_value'].append(value[node])
+                    leaves['leaf_lower'].append(lower)
+                    leaves['leaf_upper'].append(upper)
+                    leaves['leaf_zero_fraction'].append(zero_fraction)
+                    continue
+
+                feature, threshold = tree.feature[node], tree.threshold[node]
+                for child, is_left in ((left[node], True), (right[node], False)):
+                    child_lower, child_upper, child_zero = lower.copy(), upper.copy(), zero_fraction.copy()
+                    if is_left:
+                        child_upper[feature] = min(upper[feature], threshold)
+                    else:
+                        child_lower[feature] = max(lower[feature], threshold)
+                    child_zero[feature] *= cover[child] / cover[node]
+                    stack.append((child, child_lower, child_upper, child_zero))
+
+            offset += tree.node_count
+
+        arrays = {
+            'left': np.concatenate(nodes['left']).astype(np.int32),
+            'right': np.concatenate(nodes['right']).astype(np.int32),
+            'feature': np.concatenate(nodes['feature']).astype(np.int32),
+            'threshold': np.concatenate(nodes['threshold']).astype(np.float64),
+            'value': np.concatenate(nodes['value']).astype(np.float64),
+            'roots': np.array(roots, dtype=np.int32),
+            'leaf_value': np.array(leaves['leaf_value'], dtype=np.float64),
+            'leaf_lower': np.array(leaves['leaf_lower'], dtype=np.float64),
+            'leaf_upper': np.array(leaves['leaf_upper'], dtype=np.float64),
+            'leaf_zero_fraction': np.array(leaves['leaf_zero_fraction'], dtype=np.float64)
+        }
+        return cls(arrays, feature_names, max_depth)
+
+    @staticmethod
+    def _quadrature(n_features):
+        """Gauss-Legendre nodes and weights on [0, 1], exact for degree n_features - 1"""
+        nodes, weights = np.polynomial.legendre.leggauss(n_features // 2 + 1)
+        return (nodes + 1) / 2, weights / 2
+
+    @classmethod
+    def _shap_tables(cls, zero_fraction):
+        """Per-leaf logs and inverses of the factors z_j (1 - u) and z_j (1 - u) + u"""
+        u, _ = cls._quadrature(zero_fraction.shape[1])
+        factor_out = zero_fraction[:, None, :] * (1 - u)[:, None]
+        factor_in = factor_out + u[:, None]
+        log_out = np.log(factor_out)
+        return {
+            'shap_log_out': log_out.sum(axis=2),
+            'shap_log_ratio': np.ascontiguousarray((np.log(factor_in) - log_out).transpose(0, 2, 1)),
+            'shap_inv_out': 1 / factor_out,
+            'shap_inv_delta': 1 / factor_in - 1 / factor_out
+        }
+
+    def save(self, path):
+        """Write the arrays and meta.json into directory ``path``"""
+        os.makedirs(path, exist_ok=True)
+        for name in NODE_ARRAYS + LEAF_ARRAYS + SHAP_ARRAYS:
+            np.save(os.path.join(path, name + '.npy'), np.ascontiguousarray(self.arrays[name]))
+
+        meta = {
+            'format': FORMAT,
+            'feature_names': self.feature_names,
+            'n_trees': self.n_trees,
+            'n_nodes': int(len(self.value)),
+            'n_leaves': int(len(self.leaf_value)),
+            'max_depth': self.max_depth,
+            'base_value': self.base_value
+        }
+        # meta.json goes last and marks the directory as complete
+        tmp_path = os.path.join(path, 'meta.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, os.path.join(path, 'meta.json'))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Open a saved forest
+
+        Args:
+            path: Directory written by save()
+            mmap: Map the arrays read-only instead of reading them into memory
+
+        Raises:
+            ValueError: If the directory is not a complete compact forest
+        """
+        meta_path = os.path.join(path, 'meta.json')
+        if not os.path.exists(meta_path):
+            raise ValueError(f"No compact forest at {path}")
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        if meta.get('format') not in READABLE_FORMATS:
+            raise ValueError(f"Unsupported compact forest format: {meta.get('format')}")
+
+        names = NODE_ARRAYS + LEAF_ARRAYS + (SHAP_ARRAYS if meta['format'] == FORMAT else ())
+        arrays = {
+            name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r' if mmap else None)
+            for name in names
+        }
+        if len(arrays['value']) != meta['n_nodes'] or len(arrays['leaf_value']) != meta['n_leaves']:
+            raise ValueError(f"Compact forest at {path} does not match its metadata")
+        return cls(arrays, meta['feature_names'], meta['max_depth'], meta['base_value'])
+
+    def _as_matrix(self, X):
+        # Compare in float32 like scikit-learn so rows land in the same leaves
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(self.feature_names))
+        return X.astype(np.float32).astype(np.float64)
+
+    def predict(self, X):
+        """Average leaf value over all trees, walking every tree level by level"""
+        X = self._as_matrix(X)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(np.asarray(self.roots), (len(X), self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            left = self.left[node]
+            if not (left >= 0).any():
+                break
+            goes_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(left < 0, node, np.where(goes_left, left, self.right[node]))
+        return self.value[node].mean(axis=1)
+
+    def shap_values(self, X):
+        """
+        Path-dependent TreeSHAP values, shape (N, F)
+
+        For one leaf with value v, zero fractions z_j and one fractions o_j
+        (1 if the row lies inside the leaf's interval for feature j), the
+        Shapley value of feature i is
+
+            v * (o_i - z_i) * sum_S |S|! (F-1-|S|)! / F! * prod_{j in S} o_j * prod_{j not in S, j != i} z_j
+
+        The Shapley weights are Beta integrals, so the sum over subsets equals
+        the integral over u in [0, 1] of prod_{j != i} (z_j (1 - u) + o_j u),
+        a polynomial of degree F-1 that Gauss-Legendre quadrature with
+        F/2 + 1 nodes integrates exactly. Unsplit features have z = o = 1 and
+        act as dummy players, so every leaf uses the full feature set.
+
+        Because o is 0 or 1, the product is exp(sum_j log(z_j (1 - u)) +
+        sum_j o_j log ratio_j), and dividing out factor i takes one of two
+        precomputed inverses. The per-row work is therefore a few small
+        matrix products per block of leaves, with the logs and inverses read
+        from the shap_* tables.
+        """
+        X = self._as_matrix(X)
+        n_rows, n_features = X.shape
+        _, weights = self._quadrature(n_features)
+        result = np.zeros((n_rows, n_features))
+
+        if n_rows <= self.ROW_BY_ROW:
+            for i, row in enumerate(X):
+                one = ((row > self.leaf_lower) & (row <= self.leaf_upper)).astype(np.float64)
+                weighted_product = np.exp(np.einsum('lf,lfq->lq', one, self.shap_log_ratio) + self.shap_log_out)
+                weighted_product *= weights
+                integral = np.einsum('lq,lqf->lf', weighted_product, self.shap_inv_out)
+                integral += one * np.einsum('lq,lqf->lf', weighted_product, self.shap_inv_delta)
+                integral *= one - self.leaf_zero_fraction
+                result[i] = self.leaf_value @ integral
+            return result / self.n_trees
+
+        for row_start in range(0, n_rows, self.MAX_BLOCK_ROWS):
+            rows = X[row_start:row_start + self.MAX_BLOCK_ROWS]
+            block = max(1, self.BLOCK_CELLS // (len(rows) * n_features))
+            for start in range(0, len(self.leaf_value), block):
+                leaves = slice(start, start + block)
+                # one[l, n, j]: row n lies inside leaf l's interval for feature j
+                one = ((rows > self.leaf_lower[leaves, None, :])
+                       & (rows <= self.leaf_upper[leaves, None, :])).astype(np.float64)
+
+                weighted_product = np.exp(one @ self.shap_log_ratio[leaves] + self.shap_log_out[leaves, None, :])
+                weighted_product *= weights
+                integral = weighted_product @ self.shap_inv_out[leaves]
+                integral += one * (weighted_product @ self.shap_inv_delta[leaves])
+                integral *= one - self.leaf_zero_fraction[leaves, None, :]
+                result[row_start:row_start + len(rows)] += np.tensordot(
+                    self.leaf_value[leaves], integral, axes=(0, 0)
+                )
+        return result / self.n_trees
+
+    def explain(self, X):
+        """``(predictions, shap_values, base_value)`` in the explainer backend format"""
+        return self.predict(X), self.shap_values(X), float(self.base_value)
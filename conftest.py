@@ -0,0 +1,54 @@
+"""
+Helpers shared by the test scripts
+pytest loads this file itself; the scripts import it when run directly
+"""
+import contextlib
+import functools
+import os
+import sys
+import tempfile
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    """Run a block with path as the working directory"""
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+
+
+def in_temp_dir(test):
+    """Run a test with a fresh working directory (database and tracker files are relative)"""
+    @functools.wraps(test)
+    def wrapper():
+        with tempfile.TemporaryDirectory() as tmp, working_directory(tmp):
+            test()
+    return wrapper
+
+
+def skip(reason):
+    """Skip a test that cannot run in this checkout
+
+    Under pytest this raises, so the test is reported as skipped rather than
+    passed; a script run directly only prints the reason and the caller returns.
+    """
+    if 'pytest' in sys.modules:
+        import pytest
+        pytest.skip(reason)
+    print(f"[SKIP] {reason}")
+
+
+def requires(import_error):
+    """Skip a test when an import it needs failed (import_error is None when it worked)"""
+    def decorator(test):
+        @functools.wraps(test)
+        def wrapper():
+            if import_error is not None:
+                skip(f"{test.__name__}: {import_error}")
+                return
+            test()
+        return wrapper
+    return decorator
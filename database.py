@@ -1,32 +1,334 @@
 """
 Simple database module for user authentication
 """
+import atexit
 import json
 import os
+import sqlite3
+import threading
+import time
 from datetime import datetime
 import hashlib
 
 
-class UserDatabase:
-    """Simple JSON-based user database"""
+def _read_json(path, default):
+    """Read a JSON file, returning ``default`` if it does not exist"""
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return default
+
+
+class FeedbackStats:
+    """Feedback counters maintained at write time
+    
+    Keeps the total, per-type, per-user and per-day counts so statistics never
+    need a pass over the feedback entries. Day keys are ISO dates, so a date
+    range query costs O(days).
+    """
+    
+    def __init__(self, data=None):
+        data = data or {}
+        self.total = data.get('total', 0)
+        self.by_type = data.get('by_type', {})
+        self.by_user = data.get('by_user', {})
+        self.by_day = data.get('by_day', {})
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_feedback(cls, feedback):
+        """Rebuild the counters from a list of feedback entries"""
+        stats = cls()
+        for entry in feedback:
+            stats.add(entry)
+        return stats
+    
+    def add(self, entry):
+        """Count a newly stored feedback entry"""
+        feedback_type = entry['feedback_type']
+        day = entry['timestamp'][:10]
+        with self._lock:
+            self.total += 1
+            self.by_type[feedback_type] = self.by_type.get(feedback_type, 0) + 1
+            user_counts = self.by_user.setdefault(entry['user_email'], {})
+            user_counts[feedback_type] = user_counts.get(feedback_type, 0) + 1
+            day_counts = self.by_day.setdefault(day, {})
+            day_counts[feedback_type] = day_counts.get(feedback_type, 0) + 1
+    
+    def window(self, since=None, until=None):
+        """Per-type counts for days in [since, until)"""
+        with self._lock:
+            if since is None and until is None:
+                return dict(self.by_type)
+            
+            counts = {}
+            for day, day_counts in self.by_day.items():
+                if (since is None or day >= since) and (until is None or day < until):
+                    for feedback_type, count in day_counts.items():
+                        counts[feedback_type] = counts.get(feedback_type, 0) + count
+            return counts
+    
+    def daily(self, since=None, until=None):
+        """Copies of the per-type counts of each day in [since, until)"""
+        with self._lock:
+            return {
+                day: dict(counts) for day, counts in self.by_day.items()
+                if (since is None or day >= since) and (until is None or day < until)
+            }
+    
+    def user(self, user_email):
+        """Copy of one user's per-type counts"""
+        with self._lock:
+            return dict(self.by_user.get(user_email, {}))
+    
+    def to_dict(self):
+        with self._lock:
+            return {
+                'total': self.total,
+                'by_type': dict(self.by_type),
+                'by_user': {email: dict(counts) for email, counts in self.by_user.items()},
+                'by_day': {day: dict(counts) for day, counts in self.by_day.items()}
+            }
+
+
+def _summarize_feedback_counts(counts):
+    """Shape per-type counts the way the stats endpoint reports them"""
+    return {
+        'total': sum(counts.values()),
+        'helpful': counts.get('helpful', 0),
+        'not_helpful': counts.get('not-helpful', 0),
+        'neutral': counts.get('neutral', 0)
+    }
+
+
+class JSONFileStorage:
+    """Storage backend that rewrites the full JSON files on every change"""
     
     def __init__(self, db_file='users_db.json', feedback_file='feedback_db.json'):
         self.db_file = db_file
         self.feedback_file = feedback_file
-        self.users = self._load_database()
-        self.feedback = self._load_feedback()
-    
-    def _load_database(self):
-        """Load users from JSON file"""
-        if os.path.exists(self.db_file):
-            with open(self.db_file, 'r') as f:
-                return json.load(f)
-        return {}
-    
-    def _save_database(self):
-        """Save users to JSON file"""
+        # Held by UserDatabase around every change, so a file is never
+        # serialized while another thread is modifying the data
+        self.lock = threading.RLock()
+    
+    def load(self):
+        """Load users and feedback from the JSON files
+        
+        The feedback file is a plain list, so the counters are rebuilt here
+        once per process rather than stored.
+        """
+        users = _read_json(self.db_file, {})
+        feedback = _read_json(self.feedback_file, [])
+        return users, feedback, FeedbackStats.from_feedback(feedback)
+    
+    def save_user(self, email, users):
+        """Persist a changed user record"""
         with open(self.db_file, 'w') as f:
-            json.dump(self.users, f, indent=2)
+            json.dump(users, f, indent=2)
+    
+    def append_feedback(self, entry, feedback):
+        """Persist a newly appended feedback entry"""
+        with open(self.feedback_file, 'w') as f:
+            json.dump(feedback, f, indent=2)
+    
+    def flush(self):
+        """Nothing is buffered, every write goes straight to disk"""
+    
+    def close(self):
+        """Nothing to release"""
+
+
+class JournalStorage:
+    """Append-only journal storage with periodic snapshot compaction
+    
+    Each change is appended to the journal as one JSON line, so a write costs
+    O(record) instead of O(database). fsync calls are batched: the journal is
+    synced after ``fsync_batch`` records or ``fsync_interval`` seconds,
+    whichever comes first. Once the journal holds ``compact_every`` records
+    the full state is written to the snapshot file and the journal is reset.
+    
+    On startup the snapshot is loaded and the journal replayed on top of it.
+    If neither exists yet, the legacy JSON files are imported.
+    
+    The users and feedback returned by load() are shared with UserDatabase,
+    which changes them only while holding ``lock``; the snapshot is
+    serialized under the same lock, so it never sees a half-applied change.
+    """
+    
+    SNAPSHOT_VERSION = 2
+    
+    def __init__(self, journal_file='users_db.journal', snapshot_file='users_db.snapshot.json',
+                 db_file='users_db.json', feedback_file='feedback_db.json',
+                 fsync_batch=32, fsync_interval=1.0, compact_every=1000):
+        self.journal_file = journal_file
+        self.snapshot_file = snapshot_file
+        self.db_file = db_file
+        self.feedback_file = feedback_file
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        
+        self.lock = threading.RLock()
+        self._journal = None
+        self._seq = 0
+        self._journal_records = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._sync_timer = None
+        self._users = {}
+        self._feedback = []
+        self._stats = FeedbackStats()
+        atexit.register(self.close)
+    
+    def load(self):
+        """Load the snapshot, replay the journal and open it for appending"""
+        with self.lock:
+            if os.path.exists(self.snapshot_file) or os.path.exists(self.journal_file):
+                snapshot = _read_json(self.snapshot_file, {})
+                self._users = snapshot.get('users', {})
+                self._feedback = snapshot.get('feedback', [])
+                if 'feedback_stats' in snapshot:
+                    self._stats = FeedbackStats(snapshot['feedback_stats'])
+                else:
+                    self._stats = FeedbackStats.from_feedback(self._feedback)
+                self._seq = snapshot.get('seq', 0)
+                self._replay()
+            else:
+                self._users, self._feedback, self._stats = JSONFileStorage(self.db_file, self.feedback_file).load()
+                self._seq = 0
+                self._write_snapshot()
+            
+            self._journal = open(self.journal_file, 'a', encoding='utf-8')
+            return self._users, self._feedback, self._stats
+    
+    def _replay(self):
+        """Apply journal records newer than the snapshot"""
+        if not os.path.exists(self.journal_file):
+            return
+        
+        valid_bytes = 0
+        terminated = True
+        with open(self.journal_file, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn write from a crash; drop it and everything after
+                    break
+                valid_bytes += len(line)
+                terminated = line.endswith(b'\n')
+                self._journal_records += 1
+                if record['seq'] <= self._seq:
+                    continue
+                self._apply(record)
+                self._seq = record['seq']
+        
+        if valid_bytes < os.path.getsize(self.journal_file):
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(valid_bytes)
+        if not terminated:
+            # The crash only lost the newline of a complete last record; end
+            # the line so the next append does not join onto it
+            with open(self.journal_file, 'ab') as f:
+                f.write(b'\n')
+    
+    def _apply(self, record):
+        if record['op'] == 'user':
+            self._users[record['email']] = record['record']
+        elif record['op'] == 'feedback':
+            self._feedback.append(record['entry'])
+            self._stats.add(record['entry'])
+    
+    def save_user(self, email, users):
+        """Append the current version of a user record to the journal"""
+        self._append({'op': 'user', 'email': email, 'record': users[email]})
+    
+    def append_feedback(self, entry, feedback):
+        """Append a feedback entry to the journal"""
+        self._append({'op': 'feedback', 'entry': entry})
+    
+    def _append(self, record):
+        with self.lock:
+            self._seq += 1
+            record['seq'] = self._seq
+            self._journal.write(json.dumps(record, separators=(',', ':')) + '\n')
+            self._journal.flush()
+            self._journal_records += 1
+            self._unsynced += 1
+            
+            if self._journal_records >= self.compact_every:
+                self.compact()
+            elif (self._unsynced >= self.fsync_batch
+                  or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync()
+            elif self._sync_timer is None:
+                # Bound how long a lone write can stay unsynced
+                self._sync_timer = threading.Timer(self.fsync_interval, self.flush)
+                self._sync_timer.daemon = True
+                self._sync_timer.start()
+    
+    def _sync(self):
+        os.fsync(self._journal.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+    
+    def flush(self):
+        """fsync any journal records that have not been synced yet"""
+        with self.lock:
+            self._sync_timer = None
+            if self._journal and self._unsynced:
+                self._sync()
+    
+    def compact(self):
+        """Fold the journal into a new snapshot and start an empty journal"""
+        with self.lock:
+            self._write_snapshot()
+            if self._journal:
+                self._journal.close()
+            self._journal = open(self.journal_file, 'w', encoding='utf-8')
+            self._journal_records = 0
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+    
+    def _write_snapshot(self):
+        # Serialized in one go under the lock, then written out
+        with self.lock:
+            data = json.dumps({
+                'version': self.SNAPSHOT_VERSION,
+                'seq': self._seq,
+                'users': self._users,
+                'feedback': self._feedback,
+                'feedback_stats': self._stats.to_dict()
+            }, separators=(',', ':'))
+        tmp_file = self.snapshot_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.snapshot_file)
+    
+    def close(self):
+        """Sync and close the journal"""
+        with self.lock:
+            if self._sync_timer is not None:
+                self._sync_timer.cancel()
+            self.flush()
+            if self._journal:
+                self._journal.close()
+                self._journal = None
+
+
+class UserDatabase:
+    """Simple user database backed by a pluggable storage backend"""
+    
+    def __init__(self, db_file='users_db.json', feedback_file='feedback_db.json', storage=None):
+        self.db_file = db_file
+        self.feedback_file = feedback_file
+        self.storage = storage or JSONFileStorage(db_file, feedback_file)
+        # Guards users and feedback; shared with the storage backend so it
+        # never persists them mid-change
+        self._lock = getattr(self.storage, 'lock', None) or threading.RLock()
+        self.users, self.feedback, self.stats = self.storage.load()
     
     def _hash_password(self, password):
         """Hash password using SHA-256"""
@@ -34,16 +336,17 @@ class UserDatabase:
     
     def register_user(self, email, password, name):
         """Register a new user"""
-        if email in self.users:
-            return False, "Email already registered"
-        
-        self.users[email] = {
-            'password': self._hash_password(password),
-            'name': name,
-            'created_at': datetime.now().isoformat(),
-            'profile': None
-        }
-        self._save_database()
+        with self._lock:
+            if email in self.users:
+                return False, "Email already registered"
+            
+            self.users[email] = {
+                'password': self._hash_password(password),
+                'name': name,
+                'created_at': datetime.now().isoformat(),
+                'profile': None
+            }
+            self.storage.save_user(email, self.users)
         return True, "Registration successful"
     
     def authenticate_user(self, email, password):
@@ -62,10 +365,11 @@ class UserDatabase:
     
     def update_user_profile(self, email, profile_data):
         """Update user's health profile"""
-        if email in self.users:
-            self.users[email]['profile'] = profile_data
-            self._save_database()
-            return True
+        with self._lock:
+            if email in self.users:
+                self.users[email]['profile'] = profile_data
+                self.storage.save_user(email, self.users)
+                return True
         return False
     
     def get_user_profile(self, email):
@@ -74,6 +378,15 @@ class UserDatabase:
             return self.users[email].get('profile')
         return None
     
+    def find_profile(self, user_id):
+        """Get the health profile with the given user_id"""
+        with self._lock:
+            for user in self.users.values():
+                profile = user.get('profile')
+                if profile and profile.get('user_id') == user_id:
+                    return profile
+        return None
+    
     def get_all_users(self):
         """Get all users (admin only)"""
         return self.users
@@ -82,18 +395,6 @@ class UserDatabase:
         """Check if user is admin"""
         return email == 'admin@123.com'
     
-    def _load_feedback(self):
-        """Load feedback from JSON file"""
-        if os.path.exists(self.feedback_file):
-            with open(self.feedback_file, 'r') as f:
-                return json.load(f)
-        return []
-    
-    def _save_feedback(self):
-        """Save feedback to JSON file"""
-        with open(self.feedback_file, 'w') as f:
-            json.dump(self.feedback, f, indent=2)
-    
     def store_feedback(self, user_email, feedback_type, advice_text, detailed_comment=None):
         """Store user feedback on AI advice"""
         feedback_entry = {
@@ -103,23 +404,306 @@ class UserDatabase:
             'detailed_comment': detailed_comment,
             'timestamp': datetime.now().isoformat()
         }
-        self.feedback.append(feedback_entry)
-        self._save_feedback()
+        with self._lock:
+            self.feedback.append(feedback_entry)
+            self.stats.add(feedback_entry)
+            self.storage.append_feedback(feedback_entry, self.feedback)
         return True
     
-    def get_feedback_stats(self):
-        """Get feedback statistics"""
-        if not self.feedback:
-            return {'total': 0, 'helpful': 0, 'not_helpful': 0, 'neutral': 0}
-        
-        stats = {
-            'total': len(self.feedback),
-            'helpful': sum(1 for f in self.feedback if f['feedback_type'] == 'helpful'),
-            'not_helpful': sum(1 for f in self.feedback if f['feedback_type'] == 'not-helpful'),
-            'neutral': sum(1 for f in self.feedback if f['feedback_type'] == 'neutral')
+    def get_feedback_stats(self, since=None, until=None):
+        """Get feedback statistics, optionally limited to ISO dates [since, until)"""
+        return _summarize_feedback_counts(self.stats.window(since, until))
+    
+    def get_daily_feedback_stats(self, since=None, until=None):
+        """Get feedback statistics per day for ISO dates [since, until)"""
+        return {
+            day: _summarize_feedback_counts(counts)
+            for day, counts in sorted(self.stats.daily(since, until).items())
         }
-        return stats
+    
+    def get_user_feedback_stats(self, user_email):
+        """Get feedback statistics for a specific user"""
+        return _summarize_feedback_counts(self.stats.user(user_email))
     
     def get_user_feedback(self, user_email):
         """Get all feedback from a specific user"""
         return [f for f in self.feedback if f['user_email'] == user_email]
+
+
+class SQLiteUserDatabase(UserDatabase):
+    """SQLite-backed user database
+    
+    Users and feedback are kept in SQLite (WAL mode) rather than in memory.
+    Feedback lookups use the indexes on user_email, feedback_type and
+    timestamp. Statistics are read from counter tables that a trigger keeps
+    up to date on every insert. On first use an empty database is populated
+    from the legacy JSON files.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            email TEXT PRIMARY KEY,
+            password TEXT NOT NULL,
+            name TEXT,
+            created_at TEXT NOT NULL,
+            profile TEXT
+        );
+        CREATE TABLE IF NOT EXISTS feedback (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_email TEXT NOT NULL,
+            feedback_type TEXT NOT NULL,
+            advice_text TEXT,
+            detailed_comment TEXT,
+            timestamp TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_feedback_user_email ON feedback (user_email);
+        CREATE INDEX IF NOT EXISTS idx_feedback_type ON feedback (feedback_type);
+        CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback (timestamp);
+        CREATE TABLE IF NOT EXISTS feedback_type_counts (
+            feedback_type TEXT PRIMARY KEY,
+            count INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS feedback_user_counts (
+            user_email TEXT NOT NULL,
+            feedback_type TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (user_email, feedback_type)
+        );
+        CREATE TABLE IF NOT EXISTS feedback_daily_counts (
+            day TEXT NOT NULL,
+            feedback_type TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, feedback_type)
+        );
+        CREATE TRIGGER IF NOT EXISTS feedback_count_insert AFTER INSERT ON feedback
+        BEGIN
+            INSERT INTO feedback_type_counts (feedback_type, count) VALUES (NEW.feedback_type, 1)
+                ON CONFLICT (feedback_type) DO UPDATE SET count = count + 1;
+            INSERT INTO feedback_user_counts (user_email, feedback_type, count)
+                VALUES (NEW.user_email, NEW.feedback_type, 1)
+                ON CONFLICT (user_email, feedback_type) DO UPDATE SET count = count + 1;
+            INSERT INTO feedback_daily_counts (day, feedback_type, count)
+                VALUES (substr(NEW.timestamp, 1, 10), NEW.feedback_type, 1)
+                ON CONFLICT (day, feedback_type) DO UPDATE SET count = count + 1;
+        END;
+    """
+    
+    REBUILD_COUNTERS = """
+        DELETE FROM feedback_type_counts;
+        DELETE FROM feedback_user_counts;
+        DELETE FROM feedback_daily_counts;
+        INSERT INTO feedback_type_counts (feedback_type, count)
+            SELECT feedback_type, COUNT(*) FROM feedback GROUP BY feedback_type;
+        INSERT INTO feedback_user_counts (user_email, feedback_type, count)
+            SELECT user_email, feedback_type, COUNT(*) FROM feedback GROUP BY user_email, feedback_type;
+        INSERT INTO feedback_daily_counts (day, feedback_type, count)
+            SELECT substr(timestamp, 1, 10), feedback_type, COUNT(*) FROM feedback
+            GROUP BY substr(timestamp, 1, 10), feedback_type;
+    """
+    
+    def __init__(self, db_path='users.sqlite3', db_file='users_db.json', feedback_file='feedback_db.json'):
+        self.db_path = db_path
+        self.db_file = db_file
+        self.feedback_file = feedback_file
+        self._local = threading.local()
+        
+        with self._connection() as conn:
+            conn.executescript(self.SCHEMA)
+        
+        if self._is_empty():
+            self.import_json(db_file, feedback_file)
+        elif self._counters_missing():
+            # Database created before the counter tables existed
+            self.rebuild_counters()
+    
+    def _connection(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+    
+    def _is_empty(self):
+        conn = self._connection()
+        users = conn.execute('SELECT 1 FROM users LIMIT 1').fetchone()
+        feedback = conn.execute('SELECT 1 FROM feedback LIMIT 1').fetchone()
+        return users is None and feedback is None
+    
+    def _counters_missing(self):
+        conn = self._connection()
+        counters = conn.execute('SELECT 1 FROM feedback_type_counts LIMIT 1').fetchone()
+        feedback = conn.execute('SELECT 1 FROM feedback LIMIT 1').fetchone()
+        return counters is None and feedback is not None
+    
+    def rebuild_counters(self):
+        """Recompute the feedback counter tables from the feedback rows"""
+        conn = self._connection()
+        with conn:
+            conn.execute('BEGIN')
+            for statement in self.REBUILD_COUNTERS.split(';'):
+                if statement.strip():
+                    conn.execute(statement)
+    
+    def import_json(self, db_file='users_db.json', feedback_file='feedback_db.json'):
+        """Import users and feedback from the legacy JSON files"""
+        # Read the files directly: the triggers rebuild the counters, so the
+        # FeedbackStats that JSONFileStorage.load() computes are not needed
+        users = _read_json(db_file, {})
+        feedback = _read_json(feedback_file, [])
+        with self._connection() as conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO users (email, password, name, created_at, profile) VALUES (?, ?, ?, ?, ?)',
+                [
+                    (email, user['password'], user.get('name'), user.get('created_at', ''),
+                     json.dumps(user['profile']) if user.get('profile') is not None else None)
+                    for email, user in users.items()
+                ]
+            )
+            conn.executemany(
+                'INSERT INTO feedback (user_email, feedback_type, advice_text, detailed_comment, timestamp) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [
+                    (f['user_email'], f['feedback_type'], f.get('advice_text'),
+                     f.get('detailed_comment'), f['timestamp'])
+                    for f in feedback
+                ]
+            )
+    
+    @staticmethod
+    def _user_from_row(row):
+        return {
+            'password': row['password'],
+            'name': row['name'],
+            'created_at': row['created_at'],
+            'profile': json.loads(row['profile']) if row['profile'] is not None else None
+        }
+    
+    def register_user(self, email, password, name):
+        """Register a new user"""
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    'INSERT INTO users (email, password, name, created_at, profile) VALUES (?, ?, ?, ?, NULL)',
+                    (email, self._hash_password(password), name, datetime.now().isoformat())
+                )
+        except sqlite3.IntegrityError:
+            return False, "Email already registered"
+        return True, "Registration successful"
+    
+    def authenticate_user(self, email, password):
+        """Authenticate user login"""
+        row = self._connection().execute('SELECT password FROM users WHERE email = ?', (email,)).fetchone()
+        if row is None:
+            return False, "Email not found"
+        
+        if row['password'] != self._hash_password(password):
+            return False, "Invalid password"
+        
+        return True, "Login successful"
+    
+    def get_user(self, email):
+        """Get user data"""
+        row = self._connection().execute('SELECT * FROM users WHERE email = ?', (email,)).fetchone()
+        return self._user_from_row(row) if row is not None else None
+    
+    def update_user_profile(self, email, profile_data):
+        """Update user's health profile"""
+        with self._connection() as conn:
+            cursor = conn.execute(
+                'UPDATE users SET profile = ? WHERE email = ?',
+                (json.dumps(profile_data) if profile_data is not None else None, email)
+            )
+        return cursor.rowcount > 0
+    
+    def get_user_profile(self, email):
+        """Get user's health profile"""
+        row = self._connection().execute('SELECT profile FROM users WHERE email = ?', (email,)).fetchone()
+        if row is None or row['profile'] is None:
+            return None
+        return json.loads(row['profile'])
+    
+    def find_profile(self, user_id):
+        """Get the health profile with the given user_id"""
+        row = self._connection().execute(
+            "SELECT profile FROM users WHERE json_extract(profile, '$.user_id') = ?", (user_id,)
+        ).fetchone()
+        return json.loads(row['profile']) if row is not None else None
+    
+    def get_all_users(self):
+        """Get all users (admin only)"""
+        rows = self._connection().execute('SELECT * FROM users ORDER BY created_at')
+        return {row['email']: self._user_from_row(row) for row in rows}
+    
+    def store_feedback(self, user_email, feedback_type, advice_text, detailed_comment=None):
+        """Store user feedback on AI advice"""
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT INTO feedback (user_email, feedback_type, advice_text, detailed_comment, timestamp) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (user_email, feedback_type, advice_text[:200], detailed_comment, datetime.now().isoformat())
+            )
+        return True
+    
+    @staticmethod
+    def _day_range(since, until):
+        conditions, params = [], []
+        if since is not None:
+            conditions.append('day >= ?')
+            params.append(since)
+        if until is not None:
+            conditions.append('day < ?')
+            params.append(until)
+        return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), params
+    
+    def get_feedback_stats(self, since=None, until=None):
+        """Get feedback statistics, optionally limited to ISO dates [since, until)"""
+        if since is None and until is None:
+            rows = self._connection().execute('SELECT feedback_type, count FROM feedback_type_counts')
+        else:
+            where, params = self._day_range(since, until)
+            rows = self._connection().execute(
+                'SELECT feedback_type, SUM(count) AS count FROM feedback_daily_counts'
+                + where + ' GROUP BY feedback_type',
+                params
+            )
+        return _summarize_feedback_counts({row['feedback_type']: row['count'] for row in rows})
+    
+    def get_daily_feedback_stats(self, since=None, until=None):
+        """Get feedback statistics per day for ISO dates [since, until)"""
+        where, params = self._day_range(since, until)
+        daily = {}
+        for row in self._connection().execute(
+                'SELECT day, feedback_type, count FROM feedback_daily_counts' + where + ' ORDER BY day', params):
+            daily.setdefault(row['day'], {})[row['feedback_type']] = row['count']
+        return {day: _summarize_feedback_counts(counts) for day, counts in daily.items()}
+    
+    def get_user_feedback_stats(self, user_email):
+        """Get feedback statistics for a specific user"""
+        rows = self._connection().execute(
+            'SELECT feedback_type, count FROM feedback_user_counts WHERE user_email = ?', (user_email,)
+        )
+        return _summarize_feedback_counts({row['feedback_type']: row['count'] for row in rows})
+    
+    def get_user_feedback(self, user_email):
+        """Get all feedback from a specific user"""
+        rows = self._connection().execute(
+            'SELECT user_email, feedback_type, advice_text, detailed_comment, timestamp '
+            'FROM feedback WHERE user_email = ? ORDER BY id',
+            (user_email,)
+        )
+        return [dict(row) for row in rows]
+
+
+def open_database(backend='json'):
+    """Create the UserDatabase for the configured storage backend"""
+    if backend == 'json':
+        return UserDatabase()
+    if backend == 'journal':
+        return UserDatabase(storage=JournalStorage())
+    if backend == 'sqlite':
+        return SQLiteUserDatabase()
+    raise ValueError(f"Unknown database backend: {backend}")
@@ -3,48 +3,415 @@ LLM Service for Health & Fitness XAI System
 Uses Google's Gemini API for enhanced recommendations
 """
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime
 import google.generativeai as genai
 from dotenv import load_dotenv
 import json
-from typing import Dict, Optional
+from typing import Dict, Iterator, List, Optional, Union
+from advice_cache import AdviceCache
+from llm_resilience import CircuitBreaker, TokenBucket, backoff_delay
 
 load_dotenv()
 
+# Using the latest stable model
+DEFAULT_MODEL = 'gemini-2.5-flash'
+
+
+def build_plan_context(plan: Dict) -> str:
+    """Summarize a generated plan as context for the advice prompt"""
+    return f"""
+    Current Plan Summary:
+    - Goal: {plan.get('goal', 'Not specified')}
+    - Daily Calories: {plan.get('daily_calories', 'Not calculated')}
+    - Workout Frequency: {plan.get('workout_frequency', 'Not specified')}
+    - Dietary Focus: {plan.get('dietary_focus', 'Balanced')}
+    """
+
+
 class GeminiService:
-    def __init__(self):
-        """Initialize the Gemini service with API key"""
-        api_key = os.getenv('GOOGLE_API_KEY')
-        if not api_key or api_key == 'your_api_key_here':
-            raise ValueError(
-                "Please set your GOOGLE_API_KEY in the .env file. "
-                "Get it from: https://makersuite.google.com/"
-            )
-        
-        genai.configure(api_key=api_key)
-        # Using the latest stable model
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
-        
-    def get_personalized_advice(self, user_profile: Dict, context: str) -> str:
+    def __init__(self, api_key: Optional[str] = None, model_name: Optional[str] = None,
+                 cache: Optional[AdviceCache] = None, model=None,
+                 timeout: Optional[float] = None, hedge_after: Optional[float] = None,
+                 breaker: Optional[CircuitBreaker] = None, max_concurrency: Optional[int] = None):
+        """Initialize the Gemini service with API key
+        
+        Args:
+            api_key: Gemini API key (defaults to GOOGLE_API_KEY)
+            model_name: Model to use (defaults to GEMINI_MODEL or DEFAULT_MODEL)
+            cache: Optional advice cache shared by all calls
+            model: Pre-built model object with a ``generate_content`` method,
+                e.g. a local fake for offline tests. Skips API configuration.
+            timeout: Deadline in seconds for one model call (LLM_TIMEOUT, default 30)
+            hedge_after: Latency budget in seconds after which cached or
+                fallback advice is served while the call finishes in the
+                background (LLM_HEDGE_AFTER, disabled by default)
+            breaker: Circuit breaker guarding the model (defaults from
+                LLM_BREAKER_THRESHOLD and LLM_BREAKER_RESET)
+            max_concurrency: Maximum concurrent model calls (LLM_MAX_CONCURRENCY, default 8)
+        """
+        self.model_name = model_name or os.getenv('GEMINI_MODEL', DEFAULT_MODEL)
+        
+        if model is None:
+            api_key = api_key or os.getenv('GOOGLE_API_KEY')
+            if not api_key or api_key == 'your_api_key_here':
+                raise ValueError(
+                    "Please set your GOOGLE_API_KEY in the .env file. "
+                    "Get it from: https://makersuite.google.com/"
+                )
+            genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(self.model_name)
+        
+        self.model = model
+        self.cache = cache
+        self.last_batch_stats = None
+        
+        self.timeout = timeout if timeout is not None else float(os.getenv('LLM_TIMEOUT', 30))
+        if hedge_after is None and os.getenv('LLM_HEDGE_AFTER'):
+            hedge_after = float(os.getenv('LLM_HEDGE_AFTER'))
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=int(os.getenv('LLM_BREAKER_THRESHOLD', 5)),
+            reset_timeout=float(os.getenv('LLM_BREAKER_RESET', 30))
+        )
+        # Calls run on this pool so a request thread can stop waiting at its
+        # deadline; a timed-out call keeps its pool slot until it returns
+        self._call_pool = ThreadPoolExecutor(
+            max_workers=max_concurrency or int(os.getenv('LLM_MAX_CONCURRENCY', 8)),
+            thread_name_prefix='gemini'
+        )
+        self._call_counters = {'calls': 0, 'timeouts': 0, 'hedged': 0, 'short_circuited': 0}
+        self._counter_lock = threading.Lock()
+        self.initialized_at = datetime.now().isoformat()
+    
+    def health_check(self, probe: bool = False) -> Dict:
+        """
+        Report whether the service is ready to serve requests
+        
+        Args:
+            probe: Also make a lightweight count_tokens call to the API
+            
+        Returns:
+            Dict: Status, model name, metrics and, when probing, the round-trip latency
+        """
+        metrics = self.metrics()
+        health = {
+            'status': 'ok' if metrics['breaker']['state'] == CircuitBreaker.CLOSED else 'degraded',
+            'model': self.model_name,
+            'initialized_at': self.initialized_at,
+            **metrics
+        }
+        if probe:
+            start = time.perf_counter()
+            try:
+                self.model.count_tokens('ping')
+                health['probe_latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            except Exception as e:
+                health['status'] = 'error'
+                health['error'] = str(e)
+        return health
+        
+    def get_personalized_advice(self, user_profile: Dict, context: str, use_cache: bool = True) -> str:
         """
         Get personalized health/fitness advice using Google Gemini
         
         Args:
             user_profile: Dictionary containing user details
             context: Current plan context/summary
+            use_cache: Serve a cached answer for an identical prompt if there
+                is one. A fresh answer always replaces the cached entry.
             
         Returns:
             str: Personalized advice or error message
         """
         try:
             prompt = self._create_prompt(user_profile, context)
-            response = self.model.generate_content(prompt)
-            return self._format_response(response.text)
+            cache_key = self._cache_key(prompt)
+            if use_cache and self.cache:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
+            
+            if not self.breaker.allow_request():
+                self._count('short_circuited')
+                return self._get_degraded_advice(cache_key, user_profile)
+            
+            self._count('calls')
+            future = self._call_pool.submit(self.model.generate_content, prompt)
+            outcome = {'recorded': False, 'cached': False}
+            future.add_done_callback(lambda f: self._on_call_done(f, cache_key, outcome))
+            
+            hedging = self.hedge_after is not None and self.hedge_after < self.timeout
+            try:
+                response = future.result(timeout=self.hedge_after if hedging else self.timeout)
+            except FutureTimeoutError:
+                if hedging:
+                    # Serve something now; the call keeps running and fills
+                    # the cache for the next request when it finishes, but
+                    # still counts as a failure if it misses the full deadline
+                    self._count('hedged')
+                    deadline = threading.Timer(
+                        self.timeout - self.hedge_after, self._expire_call, args=(future, outcome)
+                    )
+                    deadline.daemon = True
+                    outcome['deadline'] = deadline
+                    deadline.start()
+                    if future.done():
+                        deadline.cancel()
+                    return self._get_degraded_advice(cache_key, user_profile)
+                self._expire_call(future, outcome)
+                raise TimeoutError(f"Gemini call exceeded the {self.timeout}s deadline")
+            
+            advice = self._format_response(response.text)
+            self._record_outcome(outcome, success=True)
+            if self.cache and not outcome.get('cached'):
+                outcome['cached'] = True
+                self.cache.set(cache_key, advice)
+            return advice
             
         except Exception as e:
             error_msg = f"Error generating advice: {str(e)}"
             print(error_msg)
             return self._get_fallback_advice(user_profile)
     
+    def _on_call_done(self, future, cache_key, outcome):
+        """Finish bookkeeping for a model call, including ones that outlived their caller
+        
+        A late answer is still cached so the next request can use it, but a
+        call already counted as a timeout is not reported to the breaker again.
+        """
+        if outcome.get('deadline') is not None:
+            outcome['deadline'].cancel()
+        if future.cancelled():
+            return
+        try:
+            advice = self._format_response(future.result().text)
+        except Exception:
+            self._record_outcome(outcome, success=False)
+            return
+        self._record_outcome(outcome, success=True)
+        if self.cache and not outcome['cached']:
+            outcome['cached'] = True
+            self.cache.set(cache_key, advice)
+    
+    def _expire_call(self, future, outcome):
+        """Deadline reached: drop the call if it has not started and report the timeout"""
+        if future.done():
+            return
+        future.cancel()
+        if self._record_outcome(outcome, success=False):
+            self._count('timeouts')
+    
+    def _await(self, future):
+        """Wait up to the call deadline for a pool task, cancelling it on timeout"""
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self._count('timeouts')
+            raise TimeoutError(f"Gemini stream stalled for more than {self.timeout}s")
+    
+    def _record_outcome(self, outcome, success) -> bool:
+        """Report a call to the breaker; returns False if it was already reported"""
+        with self._counter_lock:
+            if outcome['recorded']:
+                return False
+            outcome['recorded'] = True
+        if success:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        return True
+    
+    def _count(self, counter):
+        with self._counter_lock:
+            self._call_counters[counter] += 1
+    
+    def _get_degraded_advice(self, cache_key: str, user_profile: Dict) -> str:
+        """Cached advice if there is any, otherwise the generic fallback"""
+        if self.cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        return self._get_fallback_advice(user_profile)
+    
+    def metrics(self) -> Dict:
+        """Call counters, circuit breaker state and cache statistics"""
+        with self._counter_lock:
+            calls = dict(self._call_counters)
+        return {
+            'calls': calls,
+            'breaker': self.breaker.metrics(),
+            'cache': self.cache.stats() if self.cache else None
+        }
+    
+    def stream_personalized_advice(self, user_profile: Dict, context: str) -> Iterator[str]:
+        """
+        Stream personalized advice, yielding text chunks as the model produces them
+        
+        The complete answer is stored in the advice cache once the stream
+        finishes. If the model fails before producing any text, the fallback
+        advice is yielded instead; if it fails after some text was yielded,
+        the error is re-raised so the caller can tell the client the advice
+        is incomplete. The stream fails if the model goes quiet
+        for longer than the call deadline, and its outcome is reported to
+        the circuit breaker however it ends, including when the client
+        disconnects and the generator is closed.
+        
+        Args:
+            user_profile: Dictionary containing user details
+            context: Current plan context/summary
+            
+        Yields:
+            str: Successive chunks of the advice text
+        """
+        prompt = self._create_prompt(user_profile, context)
+        if not self.breaker.allow_request():
+            self._count('short_circuited')
+            yield self._get_degraded_advice(self._cache_key(prompt), user_profile)
+            return
+        
+        self._count('calls')
+        chunks = []
+        succeeded = None
+        pending = None
+        try:
+            # Chunks are pulled on the call pool so a stalled stream hits the deadline
+            pending = self._call_pool.submit(lambda: iter(self.model.generate_content(prompt, stream=True)))
+            stream = self._await(pending)
+            while True:
+                pending = self._call_pool.submit(next, stream, None)
+                chunk = self._await(pending)
+                if chunk is None:
+                    break
+                text = chunk.text
+                if text:
+                    chunks.append(text)
+                    yield text
+            succeeded = True
+        except Exception as e:
+            print(f"Error streaming advice: {str(e)}")
+            succeeded = False
+            if chunks:
+                raise
+            yield self._get_fallback_advice(user_profile)
+            return
+        finally:
+            if pending is not None:
+                pending.cancel()
+            # A closed generator (client gone) still ends a half-open trial;
+            # it counts as a success only if the model had been answering
+            if succeeded is None:
+                succeeded = bool(chunks)
+            if succeeded:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+        
+        if self.cache and chunks:
+            self.cache.set(self._cache_key(prompt), self._format_response(''.join(chunks)))
+    
+    def generate_batch(self, profiles: List[Dict], contexts: Union[str, List[str]],
+                       max_concurrency: int = 4, requests_per_second: float = 2.0,
+                       max_retries: int = 3, retry_base_delay: float = 1.0,
+                       use_cache: bool = True) -> List[str]:
+        """
+        Generate advice for many profiles at once
+        
+        Identical prompts inside the batch are generated only once, and
+        prompts already in the cache are not sent at all. Model calls run on
+        ``max_concurrency`` threads, are rate limited by a token bucket and
+        retried with jittered exponential backoff. Results are written to
+        the advice cache. Statistics for the run are kept in
+        ``last_batch_stats``.
+        
+        Args:
+            profiles: User profile dictionaries
+            contexts: One context string per profile, or one shared by all
+            max_concurrency: Maximum number of concurrent model calls
+            requests_per_second: Sustained model call rate
+            max_retries: Retries per prompt before using the fallback advice
+            retry_base_delay: Base delay in seconds for the backoff
+            use_cache: Skip prompts that already have cached advice
+            
+        Returns:
+            List[str]: Advice for each profile, in input order
+        """
+        if isinstance(contexts, str):
+            contexts = [contexts] * len(profiles)
+        if len(contexts) != len(profiles):
+            raise ValueError("profiles and contexts must have the same length")
+        
+        start = time.perf_counter()
+        keys = []
+        pending = {}
+        results = {}
+        for profile, context in zip(profiles, contexts):
+            prompt = self._create_prompt(profile, context)
+            key = self._cache_key(prompt)
+            keys.append(key)
+            if key in results or key in pending:
+                continue
+            if use_cache and self.cache:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    results[key] = cached
+                    continue
+            pending[key] = (prompt, profile)
+        
+        cache_hits = len(results)
+        failures = []
+        bucket = TokenBucket(requests_per_second, capacity=max_concurrency)
+        
+        def generate(key, prompt, profile):
+            for attempt in range(max_retries + 1):
+                bucket.acquire()
+                try:
+                    response = self.model.generate_content(prompt)
+                    advice = self._format_response(response.text)
+                    if self.cache:
+                        self.cache.set(key, advice)
+                    return advice
+                except Exception as e:
+                    if attempt == max_retries:
+                        print(f"Error generating advice after {attempt + 1} attempts: {str(e)}")
+                        failures.append(key)
+                        return self._get_fallback_advice(profile)
+                    time.sleep(backoff_delay(attempt, retry_base_delay))
+        
+        if pending:
+            with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+                futures = {
+                    pool.submit(generate, key, prompt, profile): key
+                    for key, (prompt, profile) in pending.items()
+                }
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+        
+        elapsed = time.perf_counter() - start
+        self.last_batch_stats = {
+            'profiles': len(profiles),
+            'unique_prompts': cache_hits + len(pending),
+            'cache_hits': cache_hits,
+            'generated': len(pending) - len(failures),
+            'failed': len(failures),
+            'elapsed_seconds': round(elapsed, 2)
+        }
+        return [results[key] for key in keys]
+    
+    def get_cached_advice(self, user_profile: Dict, context: str) -> Optional[str]:
+        """Return cached advice for this profile and context without calling the model"""
+        if not self.cache:
+            return None
+        return self.cache.get(self._cache_key(self._create_prompt(user_profile, context)))
+    
+    def _cache_key(self, prompt: str) -> str:
+        """Cache key for a prompt; answers from different models never mix"""
+        return AdviceCache.make_key(f"{self.model_name}\n{prompt}")
+    
     def _create_prompt(self, user_profile: Dict, context: str) -> str:
         """Create a structured prompt for the Gemini model"""
         age = user_profile.get('age', 'unknown')
@@ -134,6 +501,34 @@ IMPORTANT GUIDELINES:
         Please check your internet connection and try again later for personalized advice.
         """
 
+_shared_service = None
+_shared_service_lock = threading.Lock()
+
+
+def get_gemini_service() -> GeminiService:
+    """
+    Return the process-wide GeminiService, creating it on first use
+    
+    The instance (and its configured client) is shared by all request
+    threads, so the per-request setup cost is paid only once.
+    """
+    global _shared_service
+    if _shared_service is None:
+        with _shared_service_lock:
+            if _shared_service is None:
+                _shared_service = GeminiService(cache=AdviceCache.from_env())
+    return _shared_service
+
+
+def init_gemini_service(**kwargs) -> GeminiService:
+    """Create (or replace) the shared GeminiService eagerly, e.g. at app startup"""
+    global _shared_service
+    kwargs.setdefault('cache', AdviceCache.from_env())
+    with _shared_service_lock:
+        _shared_service = GeminiService(**kwargs)
+    return _shared_service
+
+
 # Example usage
 if __name__ == "__main__":
     try:
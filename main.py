@@ -5,22 +5,142 @@ Integrates all components and provides the main interface
 from models.user_profile import UserProfile
 from engines.diet_engine import DietRecommendationEngine
 from engines.exercise_engine import ExerciseRecommendationEngine
-from typing import Dict, List, Optional
+from user_registry import InMemoryUserRegistry
+from plan_export import resolve_format, stream_records
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 import json
+import multiprocessing
+import threading
+import time
+
+
+# Start methods for bulk plan workers, in order of preference. Forking the
+# (multi-threaded) server process is avoided; the forkserver starts workers
+# from a clean process that has already imported this module and built the
+# engines in plan_engines, so the workers share them copy-on-write. Under
+# spawn (no forkserver, e.g. Windows) every worker builds its own engines.
+PLAN_WORKER_START_METHODS = ('forkserver', 'spawn')
+
+# Modules the forkserver imports before forking any worker. They are looked
+# up from the working directory and PYTHONPATH (run from the project root);
+# a module the forkserver cannot import is then imported by each worker
+PLAN_WORKER_PRELOAD = [__name__, 'plan_engines']
+
+# System built in each bulk plan worker process
+_worker_system = None
+
+
+def _init_plan_worker():
+    """Set up the worker's system; only plain profile dicts cross the process boundary"""
+    global _worker_system
+    # Normally already imported (and the engines built) in the forkserver
+    import plan_engines
+    _worker_system = HealthFitnessXAISystem(
+        diet_engine=plan_engines.diet_engine,
+        exercise_engine=plan_engines.exercise_engine
+    )
+
+
+def _plan_worker_context():
+    start_methods = multiprocessing.get_all_start_methods()
+    method = next(m for m in PLAN_WORKER_START_METHODS if m in start_methods)
+    context = multiprocessing.get_context(method)
+    if method == 'forkserver':
+        context.set_forkserver_preload(PLAN_WORKER_PRELOAD)
+    return context
+
+
+def _generate_plan_chunk(profiles: List[Dict], system=None) -> List[Tuple[str, Optional[Dict], Optional[str]]]:
+    """Build plans for a chunk of profile dicts, by default with the worker's system"""
+    system = system or _worker_system
+    results = []
+    for profile in profiles:
+        try:
+            user = UserProfile.from_dict(profile)
+            results.append((user.user_id, system._build_plan(user), None))
+        except Exception as e:
+            results.append((profile.get('user_id'), None, str(e)))
+    return results
 
 
 class HealthFitnessXAISystem:
     """Main system integrating diet and exercise recommendations with XAI"""
     
-    def __init__(self):
-        self.diet_engine = DietRecommendationEngine()
-        self.exercise_engine = ExerciseRecommendationEngine()
-        self.users = {}
+    def __init__(self, precompute_on_save: bool = False, registry=None, max_cached_plans: int = 1024,
+                 diet_engine=None, exercise_engine=None):
+        """
+        Args:
+            precompute_on_save: Build a user's plan as soon as their profile is
+                created or updated, so the next read is a cache lookup
+            registry: Where user profiles live (see user_registry); defaults to
+                a per-process InMemoryUserRegistry
+            max_cached_plans: Plans kept in the LRU plan cache
+            diet_engine, exercise_engine: Engines to use instead of building
+                new ones (bulk plan workers share the ones in plan_engines)
+        """
+        self.diet_engine = diet_engine or DietRecommendationEngine()
+        self.exercise_engine = exercise_engine or ExerciseRecommendationEngine()
+        self.users = registry if registry is not None else InMemoryUserRegistry()
+        self.precompute_on_save = precompute_on_save
+        # user_id -> (profile fingerprint, plan), least recently used first
+        self._plan_cache = OrderedDict()
+        self.max_cached_plans = max_cached_plans
+        self._plan_lock = threading.Lock()
+        self.plan_cache_hits = 0
+        self.plan_cache_misses = 0
+        self.plan_cache_evictions = 0
+        self.bulk_stats = None
+    
+    @staticmethod
+    def profile_fingerprint(user: UserProfile) -> str:
+        """Hash of everything in a profile that can influence its plan"""
+        payload = json.dumps(user.to_dict(), sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _cached_plan(self, user_id: str, fingerprint: str) -> Optional[Dict]:
+        """The cached plan if it was built from this fingerprint; a stale one is dropped"""
+        with self._plan_lock:
+            cached = self._plan_cache.get(user_id)
+            if cached is None:
+                return None
+            if cached[0] != fingerprint:
+                del self._plan_cache[user_id]
+                return None
+            self._plan_cache.move_to_end(user_id)
+            return cached[1]
+    
+    def _cache_plan(self, user_id: str, fingerprint: str, plan: Dict):
+        with self._plan_lock:
+            self._plan_cache[user_id] = (fingerprint, plan)
+            self._plan_cache.move_to_end(user_id)
+            while len(self._plan_cache) > self.max_cached_plans:
+                self._plan_cache.popitem(last=False)
+                self.plan_cache_evictions += 1
+    
+    def invalidate_plan(self, user_id: str):
+        """Drop a user's cached plan"""
+        with self._plan_lock:
+            self._plan_cache.pop(user_id, None)
+    
+    def _profile_saved(self, user: UserProfile):
+        """Invalidate (or rebuild) the cached plan if the profile changed"""
+        with self._plan_lock:
+            cached = self._plan_cache.get(user.user_id)
+            # Logging in re-creates an unchanged profile; keep its plan
+            if cached is not None and cached[0] == self.profile_fingerprint(user):
+                return
+            self._plan_cache.pop(user.user_id, None)
+        if self.precompute_on_save:
+            self.generate_complete_plan(user.user_id, use_cache=False)
     
     def create_user(self, user_data: Dict) -> UserProfile:
         """Create a new user profile"""
         user = UserProfile.from_dict(user_data)
         self.users[user.user_id] = user
+        self._profile_saved(user)
         return user
     
     def get_user(self, user_id: str) -> Optional[UserProfile]:
@@ -40,14 +160,145 @@ class HealthFitnessXAISystem:
         
         # Recalculate metrics
         user.__post_init__()
+        self.users[user_id] = user
+        self._profile_saved(user)
         return user
     
-    def generate_complete_plan(self, user_id: str) -> Dict:
-        """Generate complete personalized plan with explanations"""
+    def generate_complete_plan(self, user_id: str, use_cache: bool = True) -> Dict:
+        """
+        Generate complete personalized plan with explanations
+        
+        Plans are cached per user and reused while the profile fingerprint is
+        unchanged; at most ``max_cached_plans`` users are kept, least recently
+        used first out. Callers get a shallow copy, so adding top-level keys (such
+        as AI advice) does not touch the cached plan; nested sections are
+        shared and must not be modified.
+        
+        Args:
+            user_id: User to generate the plan for
+            use_cache: Set to False to force regeneration
+        """
         user = self.users.get(user_id)
         if not user:
             raise ValueError(f"User {user_id} not found")
         
+        fingerprint = self.profile_fingerprint(user)
+        if use_cache:
+            cached = self._cached_plan(user_id, fingerprint)
+            with self._plan_lock:
+                if cached is not None:
+                    self.plan_cache_hits += 1
+                    return dict(cached)
+                self.plan_cache_misses += 1
+        
+        complete_plan = self._build_plan(user)
+        self._cache_plan(user_id, fingerprint, complete_plan)
+        return dict(complete_plan)
+    
+    def plan_cache_stats(self) -> Dict:
+        """Plan cache size and hit rate"""
+        with self._plan_lock:
+            lookups = self.plan_cache_hits + self.plan_cache_misses
+            return {
+                'size': len(self._plan_cache),
+                'max_size': self.max_cached_plans,
+                'hits': self.plan_cache_hits,
+                'misses': self.plan_cache_misses,
+                'evictions': self.plan_cache_evictions,
+                'hit_rate': round(self.plan_cache_hits / lookups, 3) if lookups else 0.0
+            }
+    
+    def generate_plans(self, user_ids: Iterable[str], workers: int = None, chunksize: int = 16,
+                       use_cache: bool = False) -> Iterator[Tuple[str, Optional[Dict]]]:
+        """
+        Generate plans for many users, yielding ``(user_id, plan)`` in input order
+        
+        Users are sent to a process pool in chunks as plain profile dicts, so
+        nothing of this system (locks, registry, database handles) is pickled
+        and the pool works with any start method. With the forkserver the
+        engines' food and exercise tables are built once and shared
+        copy-on-write by all workers (see PLAN_WORKER_START_METHODS). At most two chunks per
+        worker are in flight at once, so memory stays bounded for any number
+        of users. Plans are also stored in the plan cache.
+        
+        Users that are unknown or fail yield ``None`` as their plan. Counts and
+        throughput are kept on ``bulk_stats`` once the generator finishes.
+        
+        Args:
+            user_ids: Users to generate plans for
+            workers: Worker processes; None or 1 generates in this process
+            chunksize: Users per task sent to a worker
+            use_cache: Serve unchanged users from the plan cache
+        """
+        stats = {'users': 0, 'generated': 0, 'cached': 0, 'failed': 0, 'workers': workers or 1}
+        started = time.perf_counter()
+        
+        def chunks():
+            """Yield lists of (user_id, fingerprint, profile dict, cached plan)"""
+            chunk = []
+            for user_id in user_ids:
+                stats['users'] += 1
+                user = self.users.get(user_id)
+                entry = (user_id, None, None, None)
+                if user is not None:
+                    fingerprint = self.profile_fingerprint(user)
+                    hit = self._cached_plan(user_id, fingerprint) if use_cache else None
+                    entry = (user_id, fingerprint, user.to_dict(), hit)
+                chunk.append(entry)
+                if len(chunk) >= chunksize:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+        
+        def to_generate(chunk):
+            return [profile for _, _, profile, hit in chunk if profile is not None and hit is None]
+        
+        def collect(chunk, results):
+            """Yield one entry per user in the chunk; results cover to_generate(chunk)"""
+            results = iter(results)
+            for user_id, fingerprint, profile, hit in chunk:
+                if hit is not None:
+                    stats['cached'] += 1
+                    yield user_id, dict(hit)
+                    continue
+                
+                plan, error = (None, 'user not found') if profile is None else next(results)[1:]
+                if plan is None:
+                    stats['failed'] += 1
+                    print(f"✗ Could not generate plan for {user_id}: {error}")
+                    yield user_id, None
+                    continue
+                
+                stats['generated'] += 1
+                self._cache_plan(user_id, fingerprint, plan)
+                yield user_id, dict(plan)
+        
+        try:
+            if not workers or workers <= 1:
+                for chunk in chunks():
+                    yield from collect(chunk, _generate_plan_chunk(to_generate(chunk), system=self))
+                return
+            
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_plan_worker_context(),
+                                     initializer=_init_plan_worker) as pool:
+                pending = deque()
+                for chunk in chunks():
+                    pending.append((chunk, pool.submit(_generate_plan_chunk, to_generate(chunk))))
+                    while len(pending) >= workers * 2:
+                        chunk, future = pending.popleft()
+                        yield from collect(chunk, future.result())
+                while pending:
+                    chunk, future = pending.popleft()
+                    yield from collect(chunk, future.result())
+        finally:
+            elapsed = time.perf_counter() - started
+            stats['seconds'] = round(elapsed, 3)
+            stats['plans_per_second'] = round((stats['generated'] + stats['cached']) / elapsed, 1) if elapsed else 0.0
+            self.bulk_stats = stats
+    
+    def _build_plan(self, user: UserProfile) -> Dict:
+        """Run both engines and the summary for a user"""
         # Generate recommendations
         diet_plan = self.diet_engine.generate_recommendations(user)
         exercise_plan = self.exercise_engine.generate_recommendations(user)
@@ -178,6 +429,30 @@ class HealthFitnessXAISystem:
         else:
             raise ValueError(f"Format {format} not supported")
     
+    def export_plans(self, user_ids: Iterable[str], format: str = 'ndjson', workers: int = None) -> Iterator[bytes]:
+        """
+        Stream plans for many users as encoded byte chunks
+        
+        Each record is ``{'user_id': ..., 'plan': ...}``; users without a plan
+        are skipped. Plans are generated and encoded as the chunks are
+        consumed, so memory does not grow with the number of users.
+        
+        Args:
+            user_ids: Users to export
+            format: 'ndjson', 'msgpack' or 'packed' (see plan_export)
+            workers: Worker processes for plan generation
+        
+        Raises:
+            ValueError: For an unknown format
+        """
+        fmt, _ = resolve_format(format)
+        records = (
+            {'user_id': user_id, 'plan': plan}
+            for user_id, plan in self.generate_plans(user_ids, workers=workers, use_cache=True)
+            if plan is not None
+        )
+        return stream_records(records, fmt)
+    
     def get_progress_tracking_template(self) -> Dict:
         """Provide template for tracking progress"""
         return {
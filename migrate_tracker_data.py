@@ -0,0 +1,58 @@
+"""
+Tracker Data Migration
+Splits single-file daily trackers (tracker_data/<user>.json) into monthly
+partitions (tracker_data/<user>/<YYYY-MM>.json) for TRACKER_LAYOUT=monthly
+
+Usage:
+    python migrate_tracker_data.py [--dir tracker_data] [--keep] [--dry-run]
+
+Migrated files are renamed to <user>.json.migrated unless --keep is given.
+Trackers opened with the monthly layout also migrate themselves on first use.
+"""
+import argparse
+import json
+import os
+from tracker import migrate_to_monthly
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Split tracker files into monthly partitions")
+    parser.add_argument('--dir', default='tracker_data', help="Tracker data directory")
+    parser.add_argument('--keep', action='store_true', help="Keep the original files")
+    parser.add_argument('--dry-run', action='store_true', help="Only report what would be migrated")
+    args = parser.parse_args(argv)
+
+    legacy_files = sorted(
+        name for name in os.listdir(args.dir)
+        if name.endswith('.json') and os.path.isfile(os.path.join(args.dir, name))
+    )
+    print(f"Found {len(legacy_files)} tracker files in {args.dir}")
+
+    migrated = failed = days = 0
+    for name in legacy_files:
+        path = os.path.join(args.dir, name)
+        directory = os.path.join(args.dir, name[:-5])
+        try:
+            if args.dry_run:
+                with open(path, 'r') as f:
+                    count = len(json.load(f))
+            else:
+                count = migrate_to_monthly(path, directory, keep=args.keep)
+        except (OSError, ValueError) as e:
+            print(f"✗ {name}: {e}")
+            failed += 1
+            continue
+        print(f"✓ {name}: {count} days -> {directory}")
+        migrated += 1
+        days += count
+
+    print("\n" + "=" * 60)
+    print("MIGRATION COMPLETE" if not args.dry_run else "DRY RUN COMPLETE")
+    print("=" * 60)
+    print(f"  Files: {migrated}")
+    print(f"  Days: {days}")
+    print(f"  Failed: {failed}")
+
+
+if __name__ == "__main__":
+    main()
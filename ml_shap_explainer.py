@@ -5,32 +5,241 @@ Uses machine learning with SHAP for accurate feature importance
 import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
 import shap
 import json
 import os
+import threading
+import time
+from collections import OrderedDict
+from compact_forest import CompactForest
+from model_registry import ModelRegistry, ArtifactValidationError
+from shap_backends import (
+    TreeSHAPBackend, TruncatedTreeSHAPBackend, DistilledSHAPBackend, CompactSHAPBackend,
+    AnalyticSHAPBackend, attribution_error
+)
+
+
+class ExplanationCache:
+    """LRU cache of SHAP results keyed by quantized feature vectors
+    
+    Continuous features are rounded to the configured bucket width (e.g. 1 kg,
+    1 cm, 1 year) so nearby profiles share an entry; features without a
+    bucket must match exactly. Keys include the model generation, so results
+    from a replaced model are never served.
+    """
+    
+    DEFAULT_BUCKETS = {'age': 1, 'weight': 1, 'height': 1, 'bmi': 0.1}
+    
+    def __init__(self, feature_names, buckets=None, max_entries=4096):
+        buckets = self.DEFAULT_BUCKETS if buckets is None else buckets
+        self.steps = np.array([buckets.get(f, 0) for f in feature_names], dtype=float)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def quantize(self, X):
+        """Round each bucketed column of X to the centre of its bucket"""
+        X = np.asarray(X, dtype=float)
+        bucketed = self.steps > 0
+        Xq = X.copy()
+        Xq[:, bucketed] = np.round(X[:, bucketed] / self.steps[bucketed]) * self.steps[bucketed]
+        return Xq
+    
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """Hit-rate metrics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'size': len(self._entries)
+            }
 
 
 class SHAPMLExplainer:
     """ML model with SHAP explanations for calorie recommendations"""
     
-    def __init__(self):
+    # Changing any of these makes stored artifacts stale
+    TRAINING_CONFIG = {
+        'n_samples': 2000,
+        'n_estimators': 100,
+        'max_depth': 10,
+        'random_state': 42,
+        'chunk_size': 250000,
+        'data_generator': 'mifflin_st_jeor_v2'
+    }
+    
+    # Held-out rows kept for scoring; bounds memory on very large runs
+    MAX_TEST_ROWS = 50000
+    
+    ACTIVITY_MAP = {
+        'sedentary': 1.2,
+        'lightly_active': 1.375,
+        'moderately_active': 1.55,
+        'very_active': 1.725,
+        'extra_active': 1.9
+    }
+    
+    GOAL_MAP = {
+        'weight_loss': -500,
+        'muscle_gain': 300,
+        'maintenance': 0,
+        'endurance': 200
+    }
+    
+    # Attribution engines selectable with the ``backend`` setting, from exact
+    # TreeSHAP to cheaper approximations; see calibrate() for their error
+    BACKENDS = ('tree', 'compact', 'truncated', 'distilled', 'analytic')
+    
+    BACKEND_OPTIONS = {
+        'truncated_trees': 10,     # trees kept by 'truncated'
+        'distilled_depth': 6,      # depth of the 'distilled' student tree
+        'distill_samples': 20000   # rows the student tree is fitted on
+    }
+    
+    def __init__(self, registry=None, backend='tree', cache_buckets=None, cache_size=4096,
+                 training_config=None, backend_options=None):
+        """
+        Args:
+            registry: ModelRegistry holding the trained artifacts
+            training_config: Overrides for TRAINING_CONFIG (e.g. n_samples)
+            backend: Attribution engine, one of BACKENDS
+            backend_options: Overrides for BACKEND_OPTIONS
+            cache_buckets: Quantization width per feature for the explanation
+                cache (defaults to ExplanationCache.DEFAULT_BUCKETS; {} caches
+                exact vectors only)
+            cache_size: Maximum cached explanations; 0 disables the cache
+        """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown explainer backend: {backend}")
+        self.backend_name = backend
+        self.backend_options = self._merge_backend_options(backend_options or {})
+        self._backend = None
+        self._backend_lock = threading.Lock()
+        self._model_generation = 0
+        self.mode_report = None
         self.model = None
         self.explainer = None
         self.feature_names = ['age', 'weight', 'height', 'bmi', 'gender', 'activity_level', 'goal']
         self.model_path = 'models/calorie_model.pkl'
+        self.registry = registry or ModelRegistry()
+        self.model_version = None
+        self.model_metadata = None
+        self.compact_forest = None
+        self.training_config = {**self.TRAINING_CONFIG, **(training_config or {})}
+        self.last_training_stats = None
+        self._training_thread = None
+        self._train_lock = threading.Lock()
+        self.explanation_cache = (
+            ExplanationCache(self.feature_names, cache_buckets, cache_size) if cache_size else None
+        )
+    
+    def startup(self, background=True, max_age_days=None):
+        """
+        Load the latest model artifact, retraining only if it is missing or stale
+        
+        Validation is fail-fast: a corrupt artifact or one trained on other
+        features raises ArtifactValidationError instead of being used. A stale
+        artifact is still loaded and served while its replacement trains.
+        
+        Args:
+            background: Retrain on a daemon thread instead of blocking
+            max_age_days: Treat artifacts older than this as stale
+        """
+        # The compact backend serves from the memory-mapped export alone
+        loaded = (self.backend_name == 'compact' and self.load_compact_model()) or self.load_model()
+        if loaded and not self.registry.is_stale(self.model_metadata, self.training_config, max_age_days):
+            return
+        
+        if background:
+            self._training_thread = threading.Thread(
+                target=self._train_and_publish, name='shap-train', daemon=True
+            )
+            self._training_thread.start()
+        else:
+            self._train_and_publish()
+    
+    def _train_and_publish(self):
+        """Train a fresh model and store it as a new registry version"""
+        try:
+            self.train_model()
+            self.save_model()
+        except Exception as e:
+            print(f"Model retraining failed: {e}")
+    
+    def _ensure_model(self):
+        """
+        Make sure a scikit-learn model is available
+        
+        Waits for background training if it is running, then loads the latest
+        artifact (after a compact-only startup none is loaded yet). A model
+        is only trained, and then published, if the registry has none.
+        """
+        if self.model is not None and self.explainer is not None:
+            return
+        
+        thread = self._training_thread
+        if thread is not None and thread.is_alive():
+            thread.join()
+        
+        with self._train_lock:
+            if self.model is not None and self.explainer is not None:
+                return
+            if self.load_model():
+                return
+            self.train_model()
+            try:
+                self.save_model()
+            except Exception as e:
+                print(f"Could not save the trained model: {e}")
+    
+    def generate_training_data(self, n_samples=1000, rng=None):
+        """
+        Generate synthetic training data based on BMR/TDEE formulas
         
-    def generate_training_data(self, n_samples=1000):
-        """Generate synthetic training data based on BMR/TDEE formulas"""
-        np.random.seed(42)
+        Args:
+            n_samples: Number of rows
+            rng: np.random.Generator to draw from; defaults to one seeded with
+                the configured random_state, so calls are reproducible without
+                touching NumPy's global state
+        """
+        if rng is None:
+            rng = np.random.default_rng(self.training_config['random_state'])
         
         data = {
-            'age': np.random.randint(18, 70, n_samples),
-            'weight': np.random.uniform(50, 120, n_samples),
-            'height': np.random.uniform(150, 200, n_samples),
-            'gender': np.random.choice([0, 1], n_samples),  # 0=female, 1=male
-            'activity_level': np.random.choice([1.2, 1.375, 1.55, 1.725, 1.9], n_samples),
-            'goal': np.random.choice([-500, 0, 300], n_samples)  # weight_loss, maintenance, muscle_gain
+            'age': rng.integers(18, 70, n_samples),
+            'weight': rng.uniform(50, 120, n_samples),
+            'height': rng.uniform(150, 200, n_samples),
+            'gender': rng.choice([0, 1], n_samples),  # 0=female, 1=male
+            'activity_level': rng.choice([1.2, 1.375, 1.55, 1.725, 1.9], n_samples),
+            'goal': rng.choice([-500, 0, 300], n_samples)  # weight_loss, maintenance, muscle_gain
         }
         
         df = pd.DataFrame(data)
@@ -50,103 +259,396 @@ class SHAPMLExplainer:
         
         return df
     
-    def train_model(self):
-        """Train Random Forest model"""
-        print("Generating training data...")
-        df = self.generate_training_data(n_samples=2000)
+    def iter_training_chunks(self, n_samples, chunk_size, data=None):
+        """
+        Yield (DataFrame, Generator) pairs of at most ``chunk_size`` rows
         
-        X = df[self.feature_names]
-        y = df['target_calories']
+        Synthetic chunks each get their own child seed of random_state, so
+        the data does not depend on how many chunks are consumed. With
+        ``data`` (a DataFrame or CSV path holding feature_names plus
+        target_calories) the chunks are slices of it instead.
+        """
+        n_chunks = max(1, -(-n_samples // chunk_size))
+        seeds = np.random.SeedSequence(self.training_config['random_state']).spawn(n_chunks)
+        for i, seed in enumerate(seeds):
+            rng = np.random.default_rng(seed)
+            if data is None:
+                rows = min(chunk_size, n_samples - i * chunk_size)
+                yield self.generate_training_data(rows, rng=rng), rng
+            else:
+                yield data.iloc[i * chunk_size:(i + 1) * chunk_size], rng
+    
+    def train_model(self, n_samples=None, chunk_size=None, n_jobs=-1, time_budget=None, data=None):
+        """
+        Train Random Forest model
+        
+        Data is generated (or read) one chunk at a time and each chunk grows
+        the forest with ``warm_start``, so memory stays bounded by the chunk
+        size. Trees are split evenly over the chunks; with more chunks than
+        ``n_estimators`` every chunk still adds one tree.
+        
+        Args:
+            n_samples: Synthetic rows to train on (default from training_config)
+            chunk_size: Rows per chunk (default from training_config)
+            n_jobs: Parallel jobs for tree fitting
+            time_budget: Seconds after which no further chunks are fitted
+                (the first chunk is always fitted)
+            data: Real training data instead of synthetic rows, as a DataFrame
+                or CSV path with feature_names and target_calories columns
         
-        print("Training Random Forest model...")
-        self.model = RandomForestRegressor(
-            n_estimators=100,
-            max_depth=10,
-            random_state=42,
-            n_jobs=-1
+        Returns:
+            float: R² score on the held-out rows
+        """
+        config = dict(self.training_config)
+        if data is not None:
+            if isinstance(data, str):
+                data = pd.read_csv(data)
+            missing = [c for c in self.feature_names + ['target_calories'] if c not in data.columns]
+            if missing:
+                raise ValueError(f"Training data is missing columns: {missing}")
+            config.update({'n_samples': len(data), 'data_generator': 'external'})
+        if n_samples is not None and data is None:
+            config['n_samples'] = n_samples
+        if chunk_size is not None:
+            config['chunk_size'] = chunk_size
+        
+        n_samples, chunk_size = config['n_samples'], config['chunk_size']
+        n_chunks = max(1, -(-n_samples // chunk_size))
+        trees = [len(t) for t in np.array_split(np.arange(max(config['n_estimators'], n_chunks)), n_chunks)]
+        
+        model = RandomForestRegressor(
+            n_estimators=0,
+            max_depth=config['max_depth'],
+            random_state=config['random_state'],
+            n_jobs=n_jobs,
+            warm_start=True
         )
         
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-        self.model.fit(X_train, y_train)
+        timings = {'generation': 0.0, 'fit': 0.0}
+        test_X, test_y = [], []
+        held_out = 0
+        rows_used = 0
+        chunks_fitted = 0
+        started = time.perf_counter()
+        chunks = self.iter_training_chunks(n_samples, chunk_size, data)
+        
+        print(f"Training Random Forest model on {n_samples} rows in {n_chunks} chunk(s)...")
+        for i in range(n_chunks):
+            if time_budget is not None and i > 0 and time.perf_counter() - started > time_budget:
+                print(f"Time budget of {time_budget}s reached after {i} of {n_chunks} chunks")
+                break
+            
+            t0 = time.perf_counter()
+            df, rng = next(chunks)
+            X = df[self.feature_names].to_numpy(dtype=float)
+            y = df['target_calories'].to_numpy(dtype=float)
+            is_test = rng.random(len(df)) < 0.2
+            timings['generation'] += time.perf_counter() - t0
+            
+            t0 = time.perf_counter()
+            model.n_estimators += trees[i]
+            model.fit(pd.DataFrame(X[~is_test], columns=self.feature_names), y[~is_test])
+            timings['fit'] += time.perf_counter() - t0
+            
+            rows_used += len(df)
+            chunks_fitted += 1
+            if held_out < self.MAX_TEST_ROWS:
+                take = np.flatnonzero(is_test)[:self.MAX_TEST_ROWS - held_out]
+                test_X.append(X[take])
+                test_y.append(y[take])
+                held_out += len(take)
         
-        score = self.model.score(X_test, y_test)
+        t0 = time.perf_counter()
+        X_test = pd.DataFrame(np.concatenate(test_X), columns=self.feature_names)
+        score = model.score(X_test, np.concatenate(test_y))
+        timings['evaluation'] = time.perf_counter() - t0
         print(f"Model R² Score: {score:.4f}")
         
         # Create SHAP explainer
         print("Creating SHAP explainer...")
-        self.explainer = shap.TreeExplainer(self.model)
+        t0 = time.perf_counter()
+        explainer = shap.TreeExplainer(model)
+        timings['explainer_build'] = time.perf_counter() - t0
+        
+        # Swap both in together so concurrent requests never see a mismatched pair
+        self.model, self.explainer = model, explainer
+        self.compact_forest = None
+        self.model_version = None
+        # A run cut short by time_budget is marked partial; the registry treats
+        # partial models as stale so the full configuration is trained later
+        partial = chunks_fitted < n_chunks
+        self.model_metadata = {
+            'training_config': config,
+            'score': float(score),
+            'rows': rows_used,
+            'n_estimators': model.n_estimators,
+            'partial': partial
+        }
+        self.last_training_stats = {
+            'rows': rows_used,
+            'chunks': chunks_fitted,
+            'planned_chunks': n_chunks,
+            'partial': partial,
+            'n_estimators': model.n_estimators,
+            'timings': {stage: round(seconds, 3) for stage, seconds in timings.items()},
+            'total_seconds': round(time.perf_counter() - started, 3)
+        }
+        print("Stage timings: " + ", ".join(f"{k} {v:.2f}s" for k, v in self.last_training_stats['timings'].items()))
         
         return score
     
-    def get_shap_values(self, user_data):
-        """Get SHAP values for a user"""
-        if self.model is None or self.explainer is None:
-            self.train_model()
+    def _merge_backend_options(self, options):
+        """Current backend options with ``options`` applied, after checking them"""
+        unknown = set(options) - set(self.BACKEND_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown explainer backend options: {sorted(unknown)}")
+        for name, value in options.items():
+            # Every option is a count; bool is an int subclass but never meant here
+            if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+                raise ValueError(f"Explainer backend option {name} must be a positive integer, got {value!r}")
+        return {**getattr(self, 'backend_options', self.BACKEND_OPTIONS), **options}
+    
+    def set_backend(self, backend, **options):
+        """
+        Switch the attribution engine
+        
+        The new engine is built before it is swapped in, so a bad option or a
+        failed build raises ValueError and leaves the current engine and its
+        options untouched; requests keep using the current engine meanwhile.
+        Before any model is loaded the build is deferred to the first request.
+        
+        Args:
+            backend: One of BACKENDS
+            **options: Overrides for BACKEND_OPTIONS, e.g. truncated_trees=5
+        """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown explainer backend: {backend}")
+        new_options = self._merge_backend_options(options)
+        
+        model, explainer = self.model, self.explainer
+        new_backend = None
+        if backend == 'analytic' or model is not None or (backend == 'compact' and self.compact_forest is not None):
+            try:
+                new_backend = self._build_backend(backend, model, explainer, new_options)
+            except Exception as e:
+                raise ValueError(f"Could not build explainer backend {backend}: {e}") from e
         
-        # Prepare user data
-        X = pd.DataFrame([user_data], columns=self.feature_names)
+        with self._backend_lock:
+            self.backend_options = new_options
+            self.backend_name = backend
+            self._backend = new_backend
+            # Explanations from the previous engine can never be hit again
+            self._model_generation += 1
+            if self.explanation_cache:
+                self.explanation_cache.clear()
+    
+    def _build_backend(self, name, model, explainer, options=None):
+        """Create an attribution engine of the given kind for a trained model"""
+        options = options or self.backend_options
+        if name == 'analytic':
+            return AnalyticSHAPBackend(self.feature_names)
+        if name == 'compact':
+            if model is None:
+                return CompactSHAPBackend(self.compact_forest)
+            return CompactSHAPBackend(CompactForest.from_sklearn(model, self.feature_names), source_model=model)
+        if name == 'truncated':
+            return TruncatedTreeSHAPBackend(model, self.feature_names, options['truncated_trees'])
+        if name == 'distilled':
+            rng = np.random.default_rng(self.training_config['random_state'] + 1)
+            df = self.generate_training_data(options['distill_samples'], rng=rng)
+            return DistilledSHAPBackend(
+                model, self.feature_names, df[self.feature_names],
+                max_depth=options['distilled_depth']
+            )
+        return TreeSHAPBackend(model, explainer, self.feature_names)
+    
+    def get_backend(self):
+        """
+        Return the active attribution engine
+        
+        The analytic engine needs no trained model, and the compact engine
+        only needs the export loaded by load_compact_model(). The other
+        engines are rebuilt whenever a new model has been trained or loaded.
+        """
+        backend = self._backend
+        if self.backend_name == 'analytic':
+            if backend is None:
+                backend = self._backend = self._build_backend('analytic', None, None)
+            return backend
+        
+        if self.backend_name == 'compact' and self.model is None and self.compact_forest is not None:
+            source = self.compact_forest
+        else:
+            self._ensure_model()
+            source = self.model
+        if backend is not None and backend.source_model is source:
+            return backend
+        
+        with self._backend_lock:
+            backend = self._backend
+            if backend is None or backend.source_model is not source:
+                backend = self._build_backend(self.backend_name, self.model, self.explainer)
+                self._backend = backend
+                # Explanations from the previous engine can never be hit again
+                self._model_generation += 1
+                if self.explanation_cache:
+                    self.explanation_cache.clear()
+        return backend
+    
+    def calibrate(self, n_samples=500, modes=None):
+        """
+        Measure the error and latency of each explainer mode against exact TreeSHAP
+        
+        Every mode explains the same held-out synthetic rows. The report is
+        also kept on ``mode_report``.
+        
+        Args:
+            n_samples: Rows to explain
+            modes: Backends to measure (default: all of BACKENDS)
+            
+        Returns:
+            dict: Per mode, its error metrics, latency per row and speedup over exact
+        """
+        self._ensure_model()
+        model, explainer = self.model, self.explainer
+        rng = np.random.default_rng(self.training_config['random_state'] + 2)
+        X = self.generate_training_data(n_samples, rng=rng)[self.feature_names].to_numpy(dtype=float)
+        
+        report = {}
+        reference = None
+        exact_seconds = None
+        for name in ['tree'] + [m for m in (modes or self.BACKENDS) if m != 'tree']:
+            backend = self._build_backend(name, model, explainer)
+            start = time.perf_counter()
+            result = backend.explain(X)
+            seconds = time.perf_counter() - start
+            
+            if reference is None:
+                reference, exact_seconds = result, seconds
+            report[name] = {
+                **attribution_error(reference, result),
+                'latency_ms_per_row': round(seconds / n_samples * 1e3, 4),
+                'speedup': round(exact_seconds / seconds, 1) if seconds > 0 else None
+            }
+        
+        self.mode_report = report
+        return report
+    
+    def _explain_matrix(self, X):
+        """
+        Predictions and SHAP values for an encoded feature matrix
         
-        # Get SHAP values
-        shap_values = self.explainer.shap_values(X)
+        With the explanation cache enabled, rows are quantized and looked up
+        first; all misses are explained with a single backend call.
         
-        # Get prediction
-        prediction = self.model.predict(X)[0]
+        Returns:
+            tuple: (predictions of shape (N,), SHAP values of shape (N, F), base value)
+        """
+        backend = self.get_backend()
+        X = np.asarray(X, dtype=float).reshape(-1, len(self.feature_names))
+        cache = self.explanation_cache
+        if cache is None:
+            return backend.explain(X)
         
+        Xq = cache.quantize(X)
+        model_key = (backend.name, self._model_generation)
+        keys = [(model_key, row.tobytes()) for row in Xq]
+        
+        predictions = np.empty(len(Xq))
+        shap_values = np.empty(Xq.shape)
+        base_value = None
+        missing = {}
+        for i, key in enumerate(keys):
+            cached = cache.get(key)
+            if cached is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                predictions[i], shap_values[i], base_value = cached
+        
+        if missing:
+            rows = [indexes[0] for indexes in missing.values()]
+            new_predictions, new_shap, base_value = backend.explain(Xq[rows])
+            for j, (key, indexes) in enumerate(missing.items()):
+                cache.set(key, (new_predictions[j], new_shap[j].copy(), base_value))
+                predictions[indexes] = new_predictions[j]
+                shap_values[indexes] = new_shap[j]
+        
+        return predictions, shap_values, base_value
+    
+    def cache_stats(self):
+        """Explanation cache hit-rate metrics, or None when caching is disabled"""
+        return self.explanation_cache.stats() if self.explanation_cache else None
+    
+    def _shap_result(self, prediction, shap_row, base_value):
         return {
             'prediction': float(prediction),
             'shap_values': {
-                feature: float(shap_values[0][i])
+                feature: float(shap_row[i])
                 for i, feature in enumerate(self.feature_names)
             },
-            'base_value': float(self.explainer.expected_value)
+            'base_value': base_value
         }
     
-    def explain_recommendation(self, user_profile):
-        """Generate SHAP-based explanation for user"""
-        # Encode user data
-        gender_encoded = 1 if user_profile.gender.lower() == 'male' else 0
-        
-        activity_map = {
-            'sedentary': 1.2,
-            'lightly_active': 1.375,
-            'moderately_active': 1.55,
-            'very_active': 1.725,
-            'extra_active': 1.9
-        }
-        activity_encoded = activity_map.get(user_profile.activity_level, 1.2)
-        
-        goal_map = {
-            'weight_loss': -500,
-            'muscle_gain': 300,
-            'maintenance': 0,
-            'endurance': 200
-        }
+    def get_shap_values(self, user_data):
+        """Get SHAP values for a user"""
+        row = [user_data[feature] for feature in self.feature_names]
+        predictions, shap_values, base_value = self._explain_matrix([row])
+        return self._shap_result(predictions[0], shap_values[0], base_value)
+    
+    def encode_profile(self, user_profile):
+        """Encode a UserProfile as model features"""
         primary_goal = user_profile.fitness_goals[0] if user_profile.fitness_goals else 'maintenance'
-        goal_encoded = goal_map.get(primary_goal, 0)
-        
-        user_data = {
+        return {
             'age': user_profile.age,
             'weight': user_profile.weight,
             'height': user_profile.height,
             'bmi': user_profile.bmi or 25,
-            'gender': gender_encoded,
-            'activity_level': activity_encoded,
-            'goal': goal_encoded
+            'gender': 1 if user_profile.gender.lower() == 'male' else 0,
+            'activity_level': self.ACTIVITY_MAP.get(user_profile.activity_level, 1.2),
+            'goal': self.GOAL_MAP.get(primary_goal, 0)
         }
+    
+    def encode_profiles(self, profiles):
+        """Encode UserProfiles into an (N, F) feature matrix in feature_names order"""
+        X = np.empty((len(profiles), len(self.feature_names)), dtype=float)
+        for i, profile in enumerate(profiles):
+            encoded = self.encode_profile(profile)
+            X[i] = [encoded[feature] for feature in self.feature_names]
+        return X
+    
+    def explain_recommendation(self, user_profile):
+        """Generate SHAP-based explanation for user"""
+        return self.explain_batch([user_profile])[0]
+    
+    def explain_batch(self, profiles):
+        """
+        Generate SHAP-based explanations for many users at once
         
-        # Get SHAP explanation
-        shap_result = self.get_shap_values(user_data)
+        All profiles are encoded into one matrix and explained with a single
+        model and explainer invocation.
         
-        # Generate human-readable explanation
-        explanation = self._generate_human_explanation(shap_result, user_profile)
+        Args:
+            profiles: List of UserProfile objects
+            
+        Returns:
+            list: One explanation dict per profile, in input order
+        """
+        if not profiles:
+            return []
         
-        return {
-            'ml_prediction': shap_result['prediction'],
-            'shap_values': shap_result['shap_values'],
-            'base_value': shap_result['base_value'],
-            'feature_importance': self._calculate_feature_importance(shap_result['shap_values']),
-            'explanation': explanation
-        }
+        predictions, shap_values, base_value = self._explain_matrix(self.encode_profiles(profiles))
+        
+        results = []
+        for i, user_profile in enumerate(profiles):
+            shap_result = self._shap_result(predictions[i], shap_values[i], base_value)
+            results.append({
+                'ml_prediction': shap_result['prediction'],
+                'shap_values': shap_result['shap_values'],
+                'base_value': shap_result['base_value'],
+                'feature_importance': self._calculate_feature_importance(shap_result['shap_values']),
+                'explanation': self._generate_human_explanation(shap_result, user_profile)
+            })
+        return results
     
     def _calculate_feature_importance(self, shap_values):
         """Calculate normalized feature importance from SHAP values"""
@@ -210,22 +712,102 @@ class SHAPMLExplainer:
         return explanations
     
     def save_model(self):
-        """Save trained model"""
-        import pickle
-        os.makedirs('models', exist_ok=True)
-        with open(self.model_path, 'wb') as f:
-            pickle.dump((self.model, self.explainer), f)
-        print(f"Model saved to {self.model_path}")
+        """Save trained model as a new version in the model registry"""
+        trained = self.model_metadata or {}
+        metadata = {
+            'feature_names': self.feature_names,
+            'training_config': trained.get('training_config', dict(self.training_config)),
+            'score': trained.get('score'),
+            'rows': trained.get('rows'),
+            'n_estimators': len(getattr(self.model, 'estimators_', [])),
+            'partial': bool(trained.get('partial'))
+        }
+        # The TreeExplainer is cheap to rebuild, so only the model is pickled
+        compact = CompactForest.from_sklearn(self.model, self.feature_names)
+        self.model_version = self.registry.save(self.model, metadata, compact=compact)
+        self.model_metadata = self.registry.read_metadata(self.model_version)
+        print(f"Model saved as {self.registry.name} v{self.model_version}")
     
     def load_model(self):
-        """Load saved model"""
+        """
+        Load the latest validated model from the registry
+        
+        Falls back to the legacy unversioned pickle at ``model_path`` when the
+        registry is empty. Raises ArtifactValidationError for a bad artifact.
+        """
         import pickle
+        payload, metadata = self.registry.load(expected_features=self.feature_names)
+        if payload is not None:
+            # Older versions pickled a (model, explainer) pair
+            model = payload[0] if isinstance(payload, tuple) else payload
+            self.model, self.explainer = model, shap.TreeExplainer(model)
+            self.compact_forest = None
+            self.model_version = metadata['version']
+            self.model_metadata = metadata
+            print(f"Model loaded successfully ({self.registry.name} v{self.model_version})")
+            return True
+        
         if os.path.exists(self.model_path):
             with open(self.model_path, 'rb') as f:
                 self.model, self.explainer = pickle.load(f)
+            # Unversioned pickles carry no metadata, so they always count as stale
+            self.model_version = None
+            self.model_metadata = {}
             print("Model loaded successfully")
             return True
         return False
+    
+    def load_compact_model(self, version=None):
+        """
+        Map the pickle-free export of a registry version (the latest by default)
+        
+        Only the 'compact' backend can serve from it; the scikit-learn model
+        is not loaded.
+        
+        Returns:
+            bool: False if the version has no export
+        
+        Raises:
+            ArtifactValidationError: If the export is incomplete or was
+                trained on different features
+        """
+        if version is None:
+            version = self.registry.latest_version()
+            if version is None:
+                return False
+        metadata = self.registry.read_metadata(version)
+        if not metadata.get('compact'):
+            return False
+        
+        try:
+            forest = CompactForest.load(self.registry.compact_path(version))
+        except (OSError, ValueError) as e:
+            raise ArtifactValidationError(f"Bad compact export for {self.registry.name} v{version}: {e}")
+        if forest.feature_names != self.feature_names:
+            raise ArtifactValidationError(
+                f"{self.registry.name} v{version} was trained on {forest.feature_names}, "
+                f"expected {self.feature_names}"
+            )
+        
+        self.compact_forest = forest
+        self.model_version = version
+        self.model_metadata = metadata
+        print(f"Compact model mapped successfully ({self.registry.name} v{version})")
+        return True
+
+
+_shared_explainer = None
+_shared_explainer_lock = threading.Lock()
+
+
+def get_shap_explainer():
+    """Return the process-wide SHAPMLExplainer, creating it on first use"""
+    global _shared_explainer
+    if _shared_explainer is None:
+        with _shared_explainer_lock:
+            if _shared_explainer is None:
+                _shared_explainer = SHAPMLExplainer()
+    return _shared_explainer
 
 
 if __name__ == "__main__":
@@ -0,0 +1,195 @@
+"""
+Model Artifact Registry
+Versioned storage for trained models with a checksummed metadata sidecar
+"""
+import glob
+import hashlib
+import json
+import os
+import pickle
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+
+class ArtifactValidationError(Exception):
+    """Raised when a stored model artifact fails validation"""
+
+
+class ModelRegistry:
+    """Versioned model artifacts on disk
+
+    Each version is a pickle (``<name>-v0001.pkl``) plus a JSON sidecar
+    (``<name>-v0001.json``) holding its SHA-256 checksum, feature names,
+    training configuration and the library versions it was built with, and
+    optionally a pickle-free export directory (``<name>-v0001.forest``). The
+    sidecar is written last, so a version without one is incomplete and
+    ignored.
+
+    A writer first claims its version number by creating
+    ``<name>-v0001.reserved`` exclusively, so processes retraining at the
+    same time never share a version; the pickle and the sidecar are each
+    written to a temporary file and renamed into place.
+    """
+
+    def __init__(self, root: str = 'models', name: str = 'calorie_model'):
+        self.root = root
+        self.name = name
+
+    def _paths(self, version: int):
+        base = os.path.join(self.root, f"{self.name}-v{version:04d}")
+        return base + '.pkl', base + '.json'
+
+    def _reserve_version(self):
+        """Claim the next free version number; returns (version, reservation file)"""
+        version = (self.latest_version() or 0) + 1
+        while True:
+            artifact_path, meta_path = self._paths(version)
+            reservation = artifact_path[:-len('.pkl')] + '.reserved'
+            try:
+                os.close(os.open(reservation, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                version += 1
+                continue
+            # A writer removes its reservation only after writing the sidecar,
+            # so a version finished since latest_version() was read shows here
+            if not os.path.exists(meta_path):
+                return version, reservation
+            os.remove(reservation)
+            version += 1
+
+    @staticmethod
+    def _write_atomic(path, data: bytes):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def versions(self) -> List[int]:
+        """All complete versions, oldest first"""
+        pattern = re.compile(re.escape(self.name) + r'-v(\d+)\.json$')
+        found = []
+        for path in glob.glob(os.path.join(self.root, f"{self.name}-v*.json")):
+            match = pattern.search(os.path.basename(path))
+            if match:
+                found.append(int(match.group(1)))
+        return sorted(found)
+
+    def latest_version(self) -> Optional[int]:
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def compact_path(self, version: int) -> str:
+        """Directory holding the pickle-free export of a version"""
+        artifact_path, _ = self._paths(version)
+        return artifact_path[:-len('.pkl')] + '.forest'
+
+    def save(self, payload, metadata: Dict, compact=None) -> int:
+        """
+        Store a new version of the artifact
+
+        Args:
+            payload: Picklable object to store (e.g. the model)
+            metadata: Extra metadata such as feature names and training config
+            compact: Optional export with a ``save(path)`` method (e.g. a
+                CompactForest), written to compact_path(version)
+
+        Returns:
+            int: The new version number
+        """
+        os.makedirs(self.root, exist_ok=True)
+        data = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+        version, reservation = self._reserve_version()
+        artifact_path, meta_path = self._paths(version)
+
+        self._write_atomic(artifact_path, data)
+        if compact is not None:
+            compact.save(self.compact_path(version))
+
+        sidecar = {
+            **metadata,
+            'name': self.name,
+            'version': version,
+            'created_at': datetime.now().isoformat(),
+            'sha256': hashlib.sha256(data).hexdigest(),
+            'size_bytes': len(data),
+            'compact': compact is not None,
+            'library_versions': library_versions()
+        }
+        self._write_atomic(meta_path, json.dumps(sidecar, indent=2).encode('utf-8'))
+        # The sidecar now marks the version as taken
+        os.remove(reservation)
+        return version
+
+    def read_metadata(self, version: int) -> Dict:
+        _, meta_path = self._paths(version)
+        with open(meta_path, 'r') as f:
+            return json.load(f)
+
+    def load(self, version: Optional[int] = None, expected_features: Optional[List[str]] = None):
+        """
+        Load and validate a version (the latest by default)
+
+        Returns:
+            tuple: (payload, metadata), or (None, None) if no version exists
+
+        Raises:
+            ArtifactValidationError: If the artifact is missing, corrupt or
+                was trained on different features
+        """
+        if version is None:
+            version = self.latest_version()
+            if version is None:
+                return None, None
+
+        artifact_path, _ = self._paths(version)
+        try:
+            metadata = self.read_metadata(version)
+        except (OSError, ValueError) as e:
+            raise ArtifactValidationError(f"Unreadable metadata for {self.name} v{version}: {e}")
+
+        if not os.path.exists(artifact_path):
+            raise ArtifactValidationError(f"Artifact file missing for {self.name} v{version}")
+
+        with open(artifact_path, 'rb') as f:
+            data = f.read()
+        if hashlib.sha256(data).hexdigest() != metadata.get('sha256'):
+            raise ArtifactValidationError(f"Checksum mismatch for {self.name} v{version}")
+
+        if expected_features is not None and metadata.get('feature_names') != expected_features:
+            raise ArtifactValidationError(
+                f"{self.name} v{version} was trained on {metadata.get('feature_names')}, "
+                f"expected {expected_features}"
+            )
+
+        return pickle.loads(data), metadata
+
+    def is_stale(self, metadata: Dict, training_config: Dict, max_age_days: Optional[float] = None) -> bool:
+        """
+        Whether an artifact should be retrained
+
+        An artifact is stale if it was trained with a different configuration,
+        was cut short by a training time budget, was pickled by different
+        scikit-learn/SHAP versions, or is older than ``max_age_days``.
+        """
+        if metadata.get('training_config') != training_config:
+            return True
+        if metadata.get('partial'):
+            return True
+        if metadata.get('library_versions') != library_versions():
+            return True
+        if max_age_days is not None:
+            created_at = datetime.fromisoformat(metadata['created_at'])
+            if datetime.now() - created_at > timedelta(days=max_age_days):
+                return True
+        return False
+
+
+def library_versions() -> Dict:
+    """Versions of the libraries whose pickles must match at load time"""
+    import numpy
+    import sklearn
+    import shap
+    return {'numpy': numpy.__version__, 'scikit-learn': sklearn.__version__, 'shap': shap.__version__}
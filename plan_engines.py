@@ -0,0 +1,16 @@
+"""
+Plan Engines
+Recommendation engines built once, at import, for bulk plan worker processes
+
+Only the forkserver (see main.generate_plans) imports this module up front:
+the engines' food and exercise tables are built there once, and every
+worker forked from it shares them copy-on-write. The web process never
+imports it.
+"""
+from engines.diet_engine import DietRecommendationEngine
+from engines.exercise_engine import ExerciseRecommendationEngine
+
+
+# Read-only in the workers: nothing may modify them after import
+diet_engine = DietRecommendationEngine()
+exercise_engine = ExerciseRecommendationEngine()
@@ -0,0 +1,160 @@
+"""
+Plan Export Formats
+Streaming encoders for exporting many plans without building one large document
+"""
+import io
+import json
+import struct
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+
+# Export format -> MIME type
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'msgpack': 'application/x-msgpack',
+    'packed': 'application/octet-stream'
+}
+
+# Stream header of the 'packed' format
+PACKED_MAGIC = b'HFXP\x01'
+
+# Bytes collected before a chunk is handed to the response
+CHUNK_SIZE = 64 * 1024
+
+
+def resolve_format(fmt):
+    """
+    Map a requested export format to the one actually used and its MIME type
+
+    'msgpack' falls back to 'packed' when msgpack is not installed.
+
+    Raises:
+        ValueError: For an unknown format
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Format {fmt} not supported")
+    if fmt == 'msgpack' and msgpack is None:
+        fmt = 'packed'
+    return fmt, FORMATS[fmt]
+
+
+def _pack_value(value, out):
+    """Append one tagged value to ``out``; unknown types are written as strings"""
+    if value is None:
+        out.append(b'n')
+    elif value is True:
+        out.append(b't')
+    elif value is False:
+        out.append(b'f')
+    elif isinstance(value, int) and -2 ** 63 <= value < 2 ** 63:
+        out.append(b'i' + struct.pack('>q', value))
+    elif isinstance(value, float):
+        out.append(b'd' + struct.pack('>d', value))
+    elif isinstance(value, dict):
+        out.append(b'm' + struct.pack('>I', len(value)))
+        for key, item in value.items():
+            _pack_value(str(key), out)
+            _pack_value(item, out)
+    elif isinstance(value, (list, tuple)):
+        out.append(b'l' + struct.pack('>I', len(value)))
+        for item in value:
+            _pack_value(item, out)
+    else:
+        data = (value if isinstance(value, str) else str(value)).encode('utf-8')
+        out.append(b's' + struct.pack('>I', len(data)) + data)
+
+
+def encode_packed(record):
+    """
+    Encode one record in the 'packed' format
+
+    A record is a 4-byte big-endian length followed by a tagged value:
+    ``n`` None, ``t``/``f`` booleans, ``i`` int64, ``d`` float64, ``s``
+    length-prefixed UTF-8, ``l`` count + items and ``m`` count + key/value
+    pairs.
+    """
+    parts = []
+    _pack_value(record, parts)
+    body = b''.join(parts)
+    return struct.pack('>I', len(body)) + body
+
+
+def _unpack_value(buf, pos):
+    tag = buf[pos:pos + 1]
+    pos += 1
+    if tag == b'n':
+        return None, pos
+    if tag == b't':
+        return True, pos
+    if tag == b'f':
+        return False, pos
+    if tag == b'i':
+        return struct.unpack_from('>q', buf, pos)[0], pos + 8
+    if tag == b'd':
+        return struct.unpack_from('>d', buf, pos)[0], pos + 8
+    (length,) = struct.unpack_from('>I', buf, pos)
+    pos += 4
+    if tag == b's':
+        return buf[pos:pos + length].decode('utf-8'), pos + length
+    if tag == b'l':
+        items = []
+        for _ in range(length):
+            item, pos = _unpack_value(buf, pos)
+            items.append(item)
+        return items, pos
+    if tag == b'm':
+        mapping = {}
+        for _ in range(length):
+            key, pos = _unpack_value(buf, pos)
+            mapping[key], pos = _unpack_value(buf, pos)
+        return mapping, pos
+    raise ValueError(f"Unknown tag {tag!r} in packed export")
+
+
+def read_packed(stream):
+    """Iterate over the records of a 'packed' export read from a binary file object"""
+    if stream.read(len(PACKED_MAGIC)) != PACKED_MAGIC:
+        raise ValueError("Not a packed plan export")
+    while True:
+        header = stream.read(4)
+        if not header:
+            return
+        (length,) = struct.unpack('>I', header)
+        record, _ = _unpack_value(stream.read(length), 0)
+        yield record
+
+
+def encode_record(record, fmt):
+    """Encode one record in a resolved format"""
+    if fmt == 'ndjson':
+        return (json.dumps(record, default=str, separators=(',', ':')) + '\n').encode('utf-8')
+    if fmt == 'msgpack':
+        return msgpack.packb(record, default=str)
+    return encode_packed(record)
+
+
+def stream_records(records, fmt):
+    """
+    Encode records lazily, yielding chunks of about CHUNK_SIZE bytes
+
+    Only one chunk is held in memory at a time, so this can feed a chunked
+    HTTP response for any number of records.
+
+    Args:
+        records: Iterable of JSON-like dicts
+        fmt: A format returned by resolve_format
+    """
+    buffer = io.BytesIO()
+    if fmt == 'packed':
+        buffer.write(PACKED_MAGIC)
+    for record in records:
+        buffer.write(encode_record(record, fmt))
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer = io.BytesIO()
+    if buffer.tell():
+        yield buffer.getvalue()
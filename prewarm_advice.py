@@ -0,0 +1,82 @@
+"""
+Advice Cache Pre-warming
+Generates AI advice for every user profile in the database and stores it in the advice cache
+
+Usage:
+    python prewarm_advice.py [--concurrency 4] [--rate 2.0] [--retries 3] [--limit N] [--workers N] [--force]
+
+Set ADVICE_CACHE_PATH so the results land in the on-disk cache tier that the
+web app reads; the in-memory tier does not outlive this process.
+"""
+import argparse
+import os
+from dotenv import load_dotenv
+from database import open_database
+from llm_service import get_gemini_service, build_plan_context
+from main import HealthFitnessXAISystem
+
+load_dotenv()
+
+
+def collect_requests(db, system, limit=None, workers=None):
+    """Build (profile, context) pairs for every user with a profile"""
+    by_user_id = {}
+    for email, user_data in db.get_all_users().items():
+        profile = user_data.get('profile')
+        if not profile:
+            continue
+        try:
+            system.create_user(profile)
+        except Exception as e:
+            print(f"✗ Skipping {email}: {e}")
+            continue
+        by_user_id[profile['user_id']] = profile
+        if limit and len(by_user_id) >= limit:
+            break
+    
+    profiles, contexts = [], []
+    for user_id, plan in system.generate_plans(list(by_user_id), workers=workers):
+        if plan is not None:
+            profiles.append(by_user_id[user_id])
+            contexts.append(build_plan_context(plan))
+    return profiles, contexts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-warm the AI advice cache for all users")
+    parser.add_argument('--concurrency', type=int, default=4, help="Concurrent model calls")
+    parser.add_argument('--rate', type=float, default=2.0, help="Model calls per second")
+    parser.add_argument('--retries', type=int, default=3, help="Retries per prompt")
+    parser.add_argument('--limit', type=int, default=None, help="Only process the first N users")
+    parser.add_argument('--workers', type=int, default=None, help="Processes used to build plans")
+    parser.add_argument('--force', action='store_true', help="Regenerate advice that is already cached")
+    args = parser.parse_args()
+
+    if not os.getenv('ADVICE_CACHE_PATH'):
+        print("Warning: ADVICE_CACHE_PATH is not set, results will only live in memory")
+
+    db = open_database(os.getenv('DB_BACKEND', 'json'))
+    system = HealthFitnessXAISystem()
+    gemini = get_gemini_service()
+
+    profiles, contexts = collect_requests(db, system, limit=args.limit, workers=args.workers)
+    print(f"Generating advice for {len(profiles)} profiles...")
+
+    gemini.generate_batch(
+        profiles,
+        contexts,
+        max_concurrency=args.concurrency,
+        requests_per_second=args.rate,
+        max_retries=args.retries,
+        use_cache=not args.force
+    )
+
+    print("\n" + "=" * 60)
+    print("PRE-WARM COMPLETE")
+    print("=" * 60)
+    for key, value in gemini.last_batch_stats.items():
+        print(f"  {key.replace('_', ' ').title()}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+SHAP Explainer Backends
+Interchangeable engines that turn an encoded feature matrix into predictions and attributions
+"""
+import copy
+import numpy as np
+import pandas as pd
+import shap
+from sklearn.tree import DecisionTreeRegressor
+
+
+class ExplainerBackend:
+    """Interface for SHAP attribution engines
+
+    ``explain`` takes an (N, F) matrix whose columns follow ``feature_names``
+    and returns ``(predictions, shap_values, base_value)`` with shapes (N,),
+    (N, F) and a float, where each row of SHAP values sums to its
+    prediction minus the base value.
+    """
+
+    name = None
+
+    def __init__(self, feature_names):
+        self.feature_names = list(feature_names)
+
+    def explain(self, X):
+        raise NotImplementedError
+
+
+class TreeSHAPBackend(ExplainerBackend):
+    """Path-dependent TreeSHAP over the trained RandomForest"""
+
+    name = 'tree'
+
+    def __init__(self, model, explainer, feature_names):
+        super().__init__(feature_names)
+        self.model = model
+        self.explainer = explainer
+        # The trained model this backend was derived from
+        self.source_model = model
+
+    def explain(self, X):
+        X = pd.DataFrame(np.asarray(X, dtype=float).reshape(-1, len(self.feature_names)),
+                         columns=self.feature_names)
+        shap_values = np.asarray(self.explainer.shap_values(X)).reshape(len(X), -1)
+        predictions = self.model.predict(X)
+        # Recent SHAP versions return a one-element array for single-output models
+        base_value = float(np.ravel(self.explainer.expected_value)[0])
+        return predictions, shap_values, base_value
+
+
+class TruncatedTreeSHAPBackend(TreeSHAPBackend):
+    """TreeSHAP over the first ``n_trees`` trees of the forest
+
+    The sub-forest is its own model: predictions and attributions are both
+    averaged over the kept trees, so rows still sum to prediction minus base.
+    Cost scales linearly with ``n_trees``.
+    """
+
+    name = 'truncated'
+
+    def __init__(self, model, feature_names, n_trees=10):
+        sub_forest = copy.copy(model)
+        sub_forest.estimators_ = model.estimators_[:n_trees]
+        sub_forest.n_estimators = len(sub_forest.estimators_)
+        super().__init__(sub_forest, shap.TreeExplainer(sub_forest), feature_names)
+        self.source_model = model
+        self.n_trees = sub_forest.n_estimators
+
+
+class DistilledSHAPBackend(ExplainerBackend):
+    """TreeSHAP over a shallow decision tree distilled from the forest
+
+    The student tree is fitted to the forest's predictions on ``X``. For a
+    single tree, path-dependent TreeSHAP depends on a row only through the
+    branch it takes at every split, so attributions are memoized by that
+    decision signature and precomputed for ``X``; most rows at serving time
+    are a dictionary lookup.
+    """
+
+    name = 'distilled'
+
+    # Upper bound on memoized signatures
+    MAX_MEMO_ENTRIES = 100000
+
+    def __init__(self, model, feature_names, X, max_depth=6):
+        super().__init__(feature_names)
+        self.source_model = model
+        X = pd.DataFrame(np.asarray(X, dtype=float), columns=self.feature_names)
+        self.student = DecisionTreeRegressor(max_depth=max_depth, random_state=0)
+        self.student.fit(X, model.predict(X))
+        self.explainer = shap.TreeExplainer(self.student)
+        self.base_value = float(np.ravel(self.explainer.expected_value)[0])
+
+        tree = self.student.tree_
+        internal = tree.children_left != -1
+        self._split_features = tree.feature[internal]
+        self._thresholds = tree.threshold[internal]
+        self._memo = {}
+        self.explain(X.to_numpy())
+
+    def _signatures(self, X):
+        # scikit-learn compares float32 features against the thresholds
+        decisions = X.astype(np.float32)[:, self._split_features] <= self._thresholds
+        return [row.tobytes() for row in np.packbits(decisions, axis=1)]
+
+    def explain(self, X):
+        X = np.asarray(X, dtype=float).reshape(-1, len(self.feature_names))
+        keys = self._signatures(X)
+
+        missing = {}
+        for i, key in enumerate(keys):
+            if key not in self._memo:
+                missing.setdefault(key, i)
+
+        fresh = {}
+        if missing:
+            rows = pd.DataFrame(X[list(missing.values())], columns=self.feature_names)
+            shap_values = np.asarray(self.explainer.shap_values(rows)).reshape(len(rows), -1)
+            predictions = self.student.predict(rows)
+            fresh = {key: (predictions[j], shap_values[j]) for j, key in enumerate(missing)}
+            if len(self._memo) < self.MAX_MEMO_ENTRIES:
+                self._memo.update(fresh)
+
+        entries = [self._memo.get(key) or fresh[key] for key in keys]
+        predictions = np.array([entry[0] for entry in entries])
+        shap_values = np.array([entry[1] for entry in entries]).reshape(len(X), -1)
+        return predictions, shap_values, self.base_value
+
+
+class CompactSHAPBackend(ExplainerBackend):
+    """Pure-NumPy TreeSHAP over a CompactForest export
+
+    Gives the same attributions as 'tree' but needs neither shap nor a
+    pickled model, so worker processes can serve from one memory-mapped
+    export.
+    """
+
+    name = 'compact'
+
+    def __init__(self, forest, source_model=None):
+        super().__init__(forest.feature_names)
+        self.forest = forest
+        self.source_model = source_model if source_model is not None else forest
+
+    def explain(self, X):
+        return self.forest.explain(X)
+
+
+class AnalyticSHAPBackend(ExplainerBackend):
+    """Exact SHAP values for the Mifflin-St Jeor calorie target
+
+    The training target is ``BMR * activity_level + goal`` with
+    ``BMR = 10*weight + 6.25*height - 5*age + 166*gender - 161``. With
+    independent features and background means ``mu``, writing
+    ``b0 = BMR(mu)`` and ``k = activity_level``, the Shapley values are::
+
+        phi_j    = beta_j * (x_j - mu_j) * (k + mu_k) / 2    for the BMR terms
+        phi_k    = (k - mu_k) * (BMR(x) + b0) / 2
+        phi_goal = goal - mu_goal
+        phi_bmi  = 0
+
+    The interaction between each BMR term and activity level is split evenly
+    between the two, so no model evaluation is needed at all.
+    """
+
+    name = 'analytic'
+
+    BMR_COEFFICIENTS = {'weight': 10.0, 'height': 6.25, 'age': -5.0, 'gender': 166.0}
+    BMR_INTERCEPT = -161.0
+
+    # Means of the synthetic training distribution in generate_training_data
+    DEFAULT_MEANS = {
+        'age': 43.5,
+        'weight': 85.0,
+        'height': 175.0,
+        'bmi': 85.0 / 3,
+        'gender': 0.5,
+        'activity_level': 1.55,
+        'goal': -200.0 / 3
+    }
+
+    def __init__(self, feature_names, means=None):
+        super().__init__(feature_names)
+        means = {**self.DEFAULT_MEANS, **(means or {})}
+        self.means = np.array([means[f] for f in self.feature_names], dtype=float)
+
+        self._beta = np.array([self.BMR_COEFFICIENTS.get(f, 0.0) for f in self.feature_names])
+        self._activity = self.feature_names.index('activity_level')
+        self._goal = self.feature_names.index('goal')
+
+        self.base_bmr = self.BMR_INTERCEPT + float(self._beta @ self.means)
+        self.base_value = self.base_bmr * self.means[self._activity] + self.means[self._goal]
+
+    @classmethod
+    def from_training_data(cls, df, feature_names):
+        """Use the feature means of a training DataFrame as the background"""
+        return cls(feature_names, means=df[list(feature_names)].mean().to_dict())
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=float).reshape(-1, len(self.feature_names))
+        bmr = self.BMR_INTERCEPT + X @ self._beta
+        return bmr * X[:, self._activity] + X[:, self._goal]
+
+    def explain(self, X):
+        X = np.asarray(X, dtype=float).reshape(-1, len(self.feature_names))
+        activity = X[:, self._activity]
+        mu_activity = self.means[self._activity]
+        bmr = self.BMR_INTERCEPT + X @ self._beta
+
+        shap_values = (X - self.means) * self._beta * ((activity + mu_activity) / 2)[:, None]
+        shap_values[:, self._activity] = (activity - mu_activity) * (bmr + self.base_bmr) / 2
+        shap_values[:, self._goal] = X[:, self._goal] - self.means[self._goal]
+
+        predictions = bmr * activity + X[:, self._goal]
+        return predictions, shap_values, float(self.base_value)
+
+
+def attribution_error(reference, candidate):
+    """
+    Error of one backend's output against a reference backend's output
+
+    Both arguments are ``explain`` results for the same rows.
+
+    Returns:
+        dict: Mean absolute SHAP error, error relative to the reference
+        attribution mass, prediction MAE and top-feature agreement
+    """
+    ref_predictions, ref_shap, _ = reference
+    predictions, shap_values, _ = candidate
+    abs_error = np.abs(shap_values - ref_shap)
+    return {
+        'shap_mae': float(abs_error.mean()),
+        'relative_error': float(abs_error.sum() / max(np.abs(ref_shap).sum(), 1e-12)),
+        'prediction_mae': float(np.mean(np.abs(predictions - ref_predictions))),
+        'top_feature_agreement': float(np.mean(
+            np.argmax(np.abs(shap_values), axis=1) == np.argmax(np.abs(ref_shap), axis=1)
+        ))
+    }
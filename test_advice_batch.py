@@ -0,0 +1,150 @@
+"""
+Test script to verify batch AI advice generation against a stub model
+Runs offline: no API key or network access is needed
+"""
+import sys
+import os
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from advice_cache import AdviceCache
+from llm_resilience import TokenBucket
+from llm_service import GeminiService
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Counts calls and optionally fails the first attempts for each prompt"""
+
+    def __init__(self, failures_per_prompt=0, delay=0.0):
+        self.failures_per_prompt = failures_per_prompt
+        self.delay = delay
+        self.calls = 0
+        self.attempts = {}
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            attempt = self.attempts.get(prompt, 0)
+            self.attempts[prompt] = attempt + 1
+        try:
+            time.sleep(self.delay)
+            if attempt < self.failures_per_prompt:
+                raise RuntimeError("503 Service Unavailable")
+            return StubResponse(f"advice #{len(self.attempts)}")
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def make_profiles():
+    profiles = [
+        {'age': 25, 'goal': 'weight_loss', 'activity_level': 'sedentary'},
+        {'age': 40, 'goal': 'muscle_gain', 'activity_level': 'very_active'},
+        {'age': 25, 'goal': 'weight_loss', 'activity_level': 'sedentary'},
+        {'age': 33, 'goal': 'maintenance', 'activity_level': 'lightly_active'},
+    ]
+    return profiles, "Current plan: 2000 calories"
+
+
+def test_batch_dedups_identical_prompts():
+    """Duplicate profiles should share one model call and get the same advice"""
+    model = StubModel()
+    gemini = GeminiService(model=model, cache=AdviceCache())
+    profiles, context = make_profiles()
+
+    advice = gemini.generate_batch(profiles, context, requests_per_second=100)
+
+    assert len(advice) == 4
+    assert advice[0] == advice[2]
+    assert model.calls == 3
+    assert gemini.last_batch_stats['unique_prompts'] == 3
+    print(f"[OK] {len(profiles)} profiles, {model.calls} model calls")
+
+
+def test_batch_uses_and_fills_cache():
+    """A second batch over the same profiles should not call the model"""
+    model = StubModel()
+    gemini = GeminiService(model=model, cache=AdviceCache())
+    profiles, context = make_profiles()
+
+    first = gemini.generate_batch(profiles, context, requests_per_second=100)
+    calls = model.calls
+    second = gemini.generate_batch(profiles, context, requests_per_second=100)
+
+    assert first == second
+    assert model.calls == calls
+    assert gemini.last_batch_stats['cache_hits'] == 3
+    print("[OK] Second batch served from cache")
+
+
+def test_batch_retries_transient_failures():
+    """Prompts that fail transiently should succeed after retrying"""
+    model = StubModel(failures_per_prompt=2)
+    gemini = GeminiService(model=model, cache=AdviceCache())
+    profiles, context = make_profiles()
+
+    advice = gemini.generate_batch(profiles, context, requests_per_second=100,
+                                   max_retries=3, retry_base_delay=0.01)
+
+    assert all(a.startswith("advice") for a in advice)
+    assert gemini.last_batch_stats['failed'] == 0
+    print(f"[OK] Recovered after retries ({model.calls} attempts)")
+
+
+def test_batch_falls_back_after_retries():
+    """Prompts that keep failing should get the fallback advice and stay uncached"""
+    model = StubModel(failures_per_prompt=10)
+    gemini = GeminiService(model=model, cache=AdviceCache())
+    profiles, context = make_profiles()
+
+    advice = gemini.generate_batch(profiles, context, requests_per_second=100,
+                                   max_retries=1, retry_base_delay=0.01)
+
+    assert all("general advice" in a for a in advice)
+    assert gemini.last_batch_stats['failed'] == 3
+    assert gemini.get_cached_advice(profiles[0], context) is None
+    print("[OK] Fallback advice after exhausting retries")
+
+
+def test_batch_respects_concurrency_and_rate():
+    """Concurrency and request rate should stay within the configured limits"""
+    model = StubModel(delay=0.05)
+    gemini = GeminiService(model=model, cache=AdviceCache())
+    profiles = [{'age': 20 + i, 'goal': 'maintenance'} for i in range(10)]
+
+    start = time.perf_counter()
+    gemini.generate_batch(profiles, "ctx", max_concurrency=2, requests_per_second=20)
+    elapsed = time.perf_counter() - start
+
+    assert model.max_active <= 2
+    # Bucket starts with 2 tokens, the remaining 8 calls need 8 / 20 s
+    assert elapsed >= 0.35
+    print(f"[OK] Max {model.max_active} concurrent calls, {elapsed:.2f}s for 10 prompts")
+
+
+def test_token_bucket():
+    """The bucket should allow a burst up to capacity, then refuse"""
+    bucket = TokenBucket(rate=1, capacity=3)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    print("[OK] Token bucket burst limit")
+
+
+if __name__ == "__main__":
+    test_batch_dedups_identical_prompts()
+    test_batch_uses_and_fills_cache()
+    test_batch_retries_transient_failures()
+    test_batch_falls_back_after_retries()
+    test_batch_respects_concurrency_and_rate()
+    test_token_bucket()
@@ -0,0 +1,90 @@
+"""
+Test script to verify the two-tier advice cache
+Runs offline: the disk tier uses a temporary SQLite file
+"""
+import sys
+import os
+import sqlite3
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from advice_cache import AdviceCache
+
+
+def disk_keys(path):
+    with sqlite3.connect(path) as conn:
+        return {key for (key,) in conn.execute('SELECT key FROM advice_cache')}
+
+
+def test_entries_expire_after_ttl():
+    """Neither tier should serve an entry older than ttl_seconds"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'advice.sqlite3')
+        cache = AdviceCache(ttl_seconds=0.2, disk_path=path)
+        cache.set('k', 'advice')
+        assert cache.get('k') == 'advice'
+
+        time.sleep(0.3)
+        assert cache.get('k') is None
+        assert AdviceCache(ttl_seconds=0.2, disk_path=path).get('k') is None
+        assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+    print("[OK] Expired entries missed in both tiers")
+
+
+def test_memory_tier_evicts_least_recently_used():
+    """The memory tier keeps max_entries items and drops the least recently read"""
+    cache = AdviceCache(max_entries=2)
+    cache.set('a', 'A')
+    cache.set('b', 'B')
+    assert cache.get('a') == 'A'
+    cache.set('c', 'C')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A' and cache.get('c') == 'C'
+    stats = cache.stats()
+    assert stats['evictions'] == 1 and stats['memory_size'] == 2
+    print("[OK] Least recently used entry evicted from memory")
+
+
+def test_disk_tier_is_read_and_pruned():
+    """A new cache on the same file reads the disk tier, which keeps the newest rows"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'advice.sqlite3')
+        cache = AdviceCache(disk_path=path, max_disk_entries=3)
+        for i in range(5):
+            cache.set(f'k{i}', f'advice {i}')
+        assert disk_keys(path) == {'k2', 'k3', 'k4'}
+        assert cache.stats()['disk_size'] == 3
+
+        # Another worker starts with an empty memory tier
+        other = AdviceCache(disk_path=path, max_disk_entries=3)
+        assert other.get('k0') is None
+        assert other.get('k4') == 'advice 4'
+        assert other.get('k4') == 'advice 4'
+        stats = other.stats()
+        assert stats['disk_hits'] == 1 and stats['memory_hits'] == 1
+    print("[OK] Disk tier shared across caches and pruned to the newest rows")
+
+
+def test_disk_prune_drops_expired_rows():
+    """Pruning removes expired rows before trimming by age"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'advice.sqlite3')
+        cache = AdviceCache(ttl_seconds=0.2, disk_path=path, max_disk_entries=2)
+        cache.set('old1', 'x')
+        cache.set('old2', 'x')
+        time.sleep(0.3)
+        cache.set('new', 'y')
+
+        assert disk_keys(path) == {'new'}
+        assert cache.stats()['disk_size'] == 1
+    print("[OK] Expired rows pruned from disk")
+
+
+if __name__ == "__main__":
+    test_entries_expire_after_ttl()
+    test_memory_tier_evicts_least_recently_used()
+    test_disk_tier_is_read_and_pruned()
+    test_disk_prune_drops_expired_rows()
@@ -0,0 +1,103 @@
+"""
+Test script to verify the background advice job queue against a stub service
+Runs offline: no API key or network access is needed
+"""
+import sys
+import os
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from advice_jobs import AdviceJobManager, AdviceQueueFull
+
+
+class BlockingService:
+    """Stands in for GeminiService; every call waits until release() is called"""
+
+    def __init__(self):
+        self.calls = 0
+        self._release = threading.Event()
+
+    def get_personalized_advice(self, user_profile, context):
+        self.calls += 1
+        self._release.wait(5)
+        return f"advice for {user_profile['name']}"
+
+    def release(self):
+        self._release.set()
+
+
+def wait_for(manager, job_id, status='done'):
+    deadline = time.time() + 5
+    while manager.get(job_id)['status'] != status:
+        assert time.time() < deadline, f"job {job_id} never reached {status}"
+        time.sleep(0.01)
+    return manager.get(job_id)
+
+
+def test_identical_jobs_are_deduplicated():
+    """Submitting again while a user's job is in flight returns the same job"""
+    service = BlockingService()
+    manager = AdviceJobManager(lambda: service, max_workers=2)
+    try:
+        first = manager.submit('a@example.com', {'name': 'A'}, 'plan')
+        again = manager.submit('a@example.com', {'name': 'A'}, 'plan')
+        assert again['id'] == first['id']
+        assert manager.stats()['in_flight'] == 1
+
+        service.release()
+        job = wait_for(manager, first['id'])
+        assert job['advice'] == 'advice for A'
+        assert service.calls == 1
+
+        # Once finished, a new request starts a new job
+        assert manager.submit('a@example.com', {'name': 'A'}, 'plan')['id'] != first['id']
+    finally:
+        service.release()
+        manager.shutdown()
+    print("[OK] In-flight job reused for a repeated request")
+
+
+def test_full_queue_rejects_jobs():
+    """Beyond max_pending in-flight jobs new users are turned away"""
+    service = BlockingService()
+    manager = AdviceJobManager(lambda: service, max_workers=1, max_pending=2)
+    try:
+        manager.submit('a@example.com', {'name': 'A'}, 'plan')
+        manager.submit('b@example.com', {'name': 'B'}, 'plan')
+        try:
+            manager.submit('c@example.com', {'name': 'C'}, 'plan')
+            raise AssertionError("a third job should not fit in the queue")
+        except AdviceQueueFull:
+            pass
+        # A user already in the queue still gets their job back
+        assert manager.submit('a@example.com', {'name': 'A'}, 'plan')['status'] in ('pending', 'running')
+    finally:
+        service.release()
+        manager.shutdown()
+    print("[OK] Full queue rejected a new job")
+
+
+def test_results_expire_after_ttl():
+    """Finished jobs can be polled until result_ttl has passed"""
+    service = BlockingService()
+    service.release()
+    manager = AdviceJobManager(lambda: service, result_ttl=0.2)
+    try:
+        job = manager.submit('a@example.com', {'name': 'A'}, 'plan')
+        wait_for(manager, job['id'])
+        assert manager.get(job['id'])['advice'] == 'advice for A'
+
+        time.sleep(0.3)
+        assert manager.get(job['id']) is None
+        assert manager.stats()['retained'] == 0
+    finally:
+        manager.shutdown()
+    print("[OK] Finished job expired after the TTL")
+
+
+if __name__ == "__main__":
+    test_identical_jobs_are_deduplicated()
+    test_full_queue_rejects_jobs()
+    test_results_expire_after_ttl()
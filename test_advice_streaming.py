@@ -0,0 +1,152 @@
+"""
+Test script to verify streaming AI advice against a local fake model
+Runs offline: no API key or network access is needed
+"""
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from advice_cache import AdviceCache
+from llm_resilience import CircuitBreaker
+from llm_service import GeminiService
+
+
+class FakeChunk:
+    """Mimics one streamed response chunk"""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeStreamingModel:
+    """Local stand-in for GenerativeModel that emits chunks with a delay"""
+
+    def __init__(self, chunks, delay=0.05, fail_after=None):
+        self.chunks = chunks
+        self.delay = delay
+        self.fail_after = fail_after
+
+    def generate_content(self, prompt, stream=False):
+        if not stream:
+            time.sleep(self.delay * len(self.chunks))
+            return FakeChunk(''.join(self.chunks))
+        return self._stream()
+
+    def _stream(self):
+        for i, text in enumerate(self.chunks):
+            if self.fail_after is not None and i >= self.fail_after:
+                raise RuntimeError("connection reset")
+            time.sleep(self.delay)
+            yield FakeChunk(text)
+
+
+TEST_PROFILE = {
+    'age': 28,
+    'goal': 'weight_loss',
+    'activity_level': 'moderately_active',
+    'dietary_restrictions': ['lactose']
+}
+TEST_CONTEXT = "Current plan: 1800 calories, 4x weekly workouts"
+CHUNKS = ["🎯 **Key Priorities**\n", "- Eat protein\n", "- Sleep 8 hours\n", "✅ Done"]
+
+
+def test_stream_yields_chunks_incrementally():
+    """First chunk should arrive long before the full answer"""
+    gemini = GeminiService(model=FakeStreamingModel(CHUNKS, delay=0.1))
+
+    start = time.perf_counter()
+    stream = gemini.stream_personalized_advice(TEST_PROFILE, TEST_CONTEXT)
+    first = next(stream)
+    first_chunk_at = time.perf_counter() - start
+    rest = list(stream)
+    total = time.perf_counter() - start
+
+    assert [first] + rest == CHUNKS
+    assert first_chunk_at < total / 2
+    print(f"[OK] First chunk after {first_chunk_at * 1000:.0f} ms, full answer after {total * 1000:.0f} ms")
+
+
+def test_stream_fills_cache():
+    """A completed stream should be served from the cache afterwards"""
+    cache = AdviceCache()
+    gemini = GeminiService(model=FakeStreamingModel(CHUNKS, delay=0), cache=cache)
+
+    streamed = ''.join(gemini.stream_personalized_advice(TEST_PROFILE, TEST_CONTEXT))
+    cached = gemini.get_cached_advice(TEST_PROFILE, TEST_CONTEXT)
+
+    assert cached == streamed.strip()
+    print("[OK] Streamed advice stored in cache")
+
+
+def test_stream_falls_back_on_error():
+    """A model that fails before any output should yield the fallback advice"""
+    cache = AdviceCache()
+    gemini = GeminiService(model=FakeStreamingModel(CHUNKS, delay=0, fail_after=0), cache=cache)
+
+    chunks = list(gemini.stream_personalized_advice(TEST_PROFILE, TEST_CONTEXT))
+
+    assert len(chunks) == 1 and "general advice" in chunks[0]
+    assert gemini.get_cached_advice(TEST_PROFILE, TEST_CONTEXT) is None
+    print("[OK] Fallback advice streamed and not cached")
+
+
+def test_stream_stops_on_midstream_error():
+    """A failure mid-stream raises after the chunks already sent and caches nothing"""
+    cache = AdviceCache()
+    gemini = GeminiService(model=FakeStreamingModel(CHUNKS, delay=0, fail_after=2), cache=cache)
+
+    chunks = []
+    try:
+        for chunk in gemini.stream_personalized_advice(TEST_PROFILE, TEST_CONTEXT):
+            chunks.append(chunk)
+        raise AssertionError("a partial stream must not end like a complete one")
+    except RuntimeError as e:
+        assert str(e) == "connection reset"
+
+    assert chunks == CHUNKS[:2]
+    assert gemini.get_cached_advice(TEST_PROFILE, TEST_CONTEXT) is None
+    print("[OK] Partial stream raised after the chunks already sent")
+
+
+def test_closed_stream_ends_half_open_trial():
+    """A client disconnecting mid-stream must not leave the breaker stuck half-open"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    gemini = GeminiService(model=FakeStreamingModel(CHUNKS, delay=0), breaker=breaker)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    stream = gemini.stream_personalized_advice(TEST_PROFILE, TEST_CONTEXT)
+    next(stream)
+    stream.close()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+    print("[OK] Closed stream released the half-open trial")
+
+
+def test_stalled_stream_times_out():
+    """A stream that stops producing chunks should fail at the call deadline"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    gemini = GeminiService(model=FakeStreamingModel(CHUNKS, delay=0.5), breaker=breaker, timeout=0.1)
+
+    start = time.perf_counter()
+    chunks = list(gemini.stream_personalized_advice(TEST_PROFILE, TEST_CONTEXT))
+    elapsed = time.perf_counter() - start
+
+    assert len(chunks) == 1 and "general advice" in chunks[0]
+    assert elapsed < 0.4
+    assert breaker.state == CircuitBreaker.OPEN
+    assert gemini.metrics()['calls']['timeouts'] == 1
+    print(f"[OK] Stalled stream failed after {elapsed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    test_stream_yields_chunks_incrementally()
+    test_stream_fills_cache()
+    test_stream_falls_back_on_error()
+    test_stream_stops_on_midstream_error()
+    test_closed_stream_ends_half_open_trial()
+    test_stalled_stream_times_out()
@@ -0,0 +1,99 @@
+"""
+Test script to verify the compact forest export against scikit-learn and SHAP
+Runs offline on a small synthetic forest
+"""
+import sys
+import os
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import json
+import numpy as np
+import shap
+from sklearn.ensemble import RandomForestRegressor
+
+from compact_forest import CompactForest, SHAP_ARRAYS
+from ml_shap_explainer import SHAPMLExplainer
+
+
+def build_forest():
+    """Small forest on the explainer's synthetic data"""
+    explainer = SHAPMLExplainer()
+    df = explainer.generate_training_data(500)
+    X = df[explainer.feature_names]
+    model = RandomForestRegressor(n_estimators=10, max_depth=6, random_state=0)
+    model.fit(X, df['target_calories'])
+
+    rows = explainer.generate_training_data(50, rng=np.random.default_rng(1))[explainer.feature_names]
+    return model, explainer.feature_names, rows
+
+
+def test_predictions_match_sklearn():
+    """The NumPy predictor should reproduce RandomForestRegressor.predict"""
+    model, feature_names, rows = build_forest()
+    forest = CompactForest.from_sklearn(model, feature_names)
+
+    assert np.allclose(forest.predict(rows.to_numpy()), model.predict(rows))
+    print("[OK] Predictions match scikit-learn")
+
+
+def test_shap_values_match_tree_explainer():
+    """Attributions and base value should match shap.TreeExplainer"""
+    model, feature_names, rows = build_forest()
+    forest = CompactForest.from_sklearn(model, feature_names)
+    explainer = shap.TreeExplainer(model)
+
+    expected = np.asarray(explainer.shap_values(rows)).reshape(len(rows), -1)
+    assert np.allclose(forest.shap_values(rows.to_numpy()), expected, atol=1e-6)
+    # Single rows take the row-by-row path, batches the blocked one
+    assert np.allclose(forest.shap_values(rows.to_numpy()[:1]), expected[:1], atol=1e-6)
+    assert np.isclose(forest.base_value, np.ravel(explainer.expected_value)[0])
+    print("[OK] SHAP values match TreeExplainer")
+
+
+def test_mmap_round_trip():
+    """A saved forest should load memory-mapped and give identical results"""
+    model, feature_names, rows = build_forest()
+    forest = CompactForest.from_sklearn(model, feature_names)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.forest')
+        forest.save(path)
+        loaded = CompactForest.load(path)
+
+        assert isinstance(loaded.leaf_value, np.memmap)
+        assert isinstance(loaded.shap_inv_out, np.memmap)
+        predictions, shap_values, base_value = loaded.explain(rows.to_numpy())
+        assert np.array_equal(predictions, forest.predict(rows.to_numpy()))
+        assert np.allclose(shap_values, forest.shap_values(rows.to_numpy()))
+        assert base_value == forest.base_value
+    print("[OK] Memory-mapped round trip")
+
+
+def test_reads_v1_export():
+    """Exports written before the SHAP tables existed should still load"""
+    model, feature_names, rows = build_forest()
+    forest = CompactForest.from_sklearn(model, feature_names)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'model.forest')
+        forest.save(path)
+        for name in SHAP_ARRAYS:
+            os.remove(os.path.join(path, name + '.npy'))
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        meta['format'] = 'compact-forest-v1'
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+        loaded = CompactForest.load(path)
+        assert np.allclose(loaded.shap_values(rows.to_numpy()), forest.shap_values(rows.to_numpy()))
+    print("[OK] v1 export loaded with rebuilt SHAP tables")
+
+
+if __name__ == "__main__":
+    test_predictions_match_sklearn()
+    test_shap_values_match_tree_explainer()
+    test_mmap_round_trip()
+    test_reads_v1_export()
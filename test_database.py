@@ -0,0 +1,302 @@
+"""
+Test script to verify the journal and SQLite user database backends
+Runs in a temporary directory so the real databases are not touched
+"""
+import sys
+import os
+import json
+import threading
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import in_temp_dir, skip
+from database import FeedbackStats, JournalStorage, SQLiteUserDatabase, UserDatabase, open_database
+
+
+PROFILE = {
+    'user_id': 'user_a', 'name': 'A', 'age': 30, 'gender': 'female', 'weight': 60, 'height': 165,
+    'activity_level': 'moderately_active', 'sleep_hours': 7, 'medical_conditions': [],
+    'dietary_restrictions': [], 'fitness_goals': ['maintenance']
+}
+LEGACY_USERS = {
+    'a@example.com': {
+        'password': 'x', 'name': 'A', 'created_at': '2025-01-01T00:00:00',
+        'profile': PROFILE
+    },
+    'b@example.com': {'password': 'y', 'name': 'B', 'created_at': '2025-01-02T00:00:00', 'profile': None}
+}
+LEGACY_FEEDBACK = [
+    {'user_email': 'a@example.com', 'feedback_type': 'helpful', 'advice_text': 'tip',
+     'detailed_comment': None, 'timestamp': '2025-01-01T10:00:00'},
+    {'user_email': 'a@example.com', 'feedback_type': 'not-helpful', 'advice_text': 'tip',
+     'detailed_comment': 'meh', 'timestamp': '2025-01-02T10:00:00'},
+    {'user_email': 'b@example.com', 'feedback_type': 'helpful', 'advice_text': 'tip',
+     'detailed_comment': None, 'timestamp': '2025-01-02T11:00:00'}
+]
+
+
+def write_legacy_files():
+    with open('users_db.json', 'w') as f:
+        json.dump(LEGACY_USERS, f)
+    with open('feedback_db.json', 'w') as f:
+        json.dump(LEGACY_FEEDBACK, f)
+
+
+def open_journal(**options):
+    return UserDatabase(storage=JournalStorage(**options))
+
+
+def journal_state(db):
+    return db.get_all_users(), db.feedback, db.get_feedback_stats()
+
+
+@in_temp_dir
+def test_journal_replay():
+    """A reopened journal database should replay every change on top of the snapshot"""
+    write_legacy_files()
+    db = open_journal()
+    db.register_user('c@example.com', 'pw', 'C')
+    db.update_user_profile('c@example.com', {**PROFILE, 'user_id': 'user_c'})
+    db.store_feedback('c@example.com', 'neutral', 'advice')
+    db.storage.close()
+
+    with open('users_db.journal') as f:
+        assert len(f.readlines()) == 3
+    reopened = open_journal()
+    assert journal_state(reopened) == journal_state(db)
+    assert reopened.find_profile('user_c')['user_id'] == 'user_c'
+    assert reopened.get_feedback_stats()['total'] == 4
+    reopened.storage.close()
+    print("[OK] Journal replayed on reopen")
+
+
+@in_temp_dir
+def test_journal_torn_tail():
+    """A half-written last record should be dropped and cut off the journal"""
+    write_legacy_files()
+    db = open_journal()
+    db.register_user('c@example.com', 'pw', 'C')
+    db.register_user('d@example.com', 'pw', 'D')
+    db.storage.close()
+
+    valid_size = os.path.getsize('users_db.journal')
+    with open('users_db.journal', 'a') as f:
+        f.write('{"op":"user","email":"e@exa')
+
+    reopened = open_journal()
+    assert os.path.getsize('users_db.journal') == valid_size
+    assert journal_state(reopened) == journal_state(db)
+    reopened.register_user('e@example.com', 'pw', 'E')
+    reopened.storage.close()
+    assert 'e@example.com' in open_journal().get_all_users()
+    print("[OK] Torn journal record truncated")
+
+
+@in_temp_dir
+def test_journal_missing_newline():
+    """A last record that lost only its newline should be kept and new records appended after it"""
+    write_legacy_files()
+    db = open_journal()
+    for name in ('c', 'd', 'e'):
+        db.register_user(f'{name}@example.com', 'pw', name.upper())
+    db.storage.close()
+
+    with open('users_db.journal', 'rb+') as f:
+        f.truncate(os.path.getsize('users_db.journal') - 1)
+
+    reopened = open_journal()
+    assert 'e@example.com' in reopened.get_all_users()
+    reopened.register_user('f@example.com', 'pw', 'F')
+    reopened.storage.close()
+
+    users = open_journal().get_all_users()
+    assert all(f'{name}@example.com' in users for name in 'cdef')
+    print("[OK] Record without its newline kept")
+
+
+@in_temp_dir
+def test_journal_compaction():
+    """Every compact_every records the journal should fold into the snapshot"""
+    write_legacy_files()
+    db = open_journal(compact_every=5)
+    for i in range(12):
+        db.store_feedback('a@example.com', 'helpful', f'advice {i}')
+    db.storage.close()
+
+    with open('users_db.journal') as f:
+        assert len(f.readlines()) == 2
+    with open('users_db.snapshot.json') as f:
+        assert json.load(f)['seq'] == 10
+    reopened = open_journal(compact_every=5)
+    assert journal_state(reopened) == journal_state(db)
+    assert reopened.get_feedback_stats()['total'] == 15
+    reopened.storage.close()
+    print("[OK] Journal compacted into the snapshot")
+
+
+@in_temp_dir
+def test_journal_compaction_under_load():
+    """Snapshots taken while other threads write should stay consistent"""
+    write_legacy_files()
+    db = open_journal(compact_every=20)
+    errors = []
+
+    def writer(n):
+        try:
+            for i in range(150):
+                db.register_user(f'user{n}_{i}@example.com', 'pw', 'U')
+                db.store_feedback(f'user{n}_{i}@example.com', 'helpful', 'advice')
+        except Exception as e:
+            errors.append(e)
+
+    # Switch threads often so writes land in the middle of a snapshot
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    db.storage.close()
+
+    assert not errors, errors
+    reopened = open_journal(compact_every=20)
+    assert len(reopened.get_all_users()) == len(LEGACY_USERS) + 600
+    assert reopened.get_feedback_stats()['total'] == len(LEGACY_FEEDBACK) + 600
+    reopened.storage.close()
+    print("[OK] Concurrent writes survive compaction")
+
+
+def test_feedback_stats_reads_during_writes():
+    """Range and per-day reads should not trip over days being added"""
+    stats = FeedbackStats()
+    start = date(2025, 1, 1)
+    errors = []
+    done = threading.Event()
+
+    def writer():
+        try:
+            for offset in range(3000):
+                stats.add({'user_email': f'user{offset % 50}@example.com', 'feedback_type': 'helpful',
+                           'timestamp': (start + timedelta(days=offset)).isoformat()})
+        finally:
+            done.set()
+
+    def reader():
+        try:
+            while not done.is_set():
+                stats.window(since='2025-06-01')
+                stats.daily(until='2030-01-01')
+                stats.user('user1@example.com')
+        except Exception as e:
+            errors.append(e)
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    assert not errors, errors
+    assert stats.window() == {'helpful': 3000}
+    assert sum(stats.window(since='2025-01-01').values()) == 3000
+    assert len(stats.daily()) == 3000 and stats.user('user1@example.com') == {'helpful': 60}
+    print("[OK] Feedback stats read safely while days are added")
+
+
+@in_temp_dir
+def test_sqlite_starts_empty():
+    """open_database('sqlite') should work without any legacy files"""
+    db = open_database('sqlite')
+
+    assert db.get_all_users() == {}
+    assert db.get_feedback_stats()['total'] == 0
+    print("[OK] SQLite backend opens on an empty directory")
+
+
+@in_temp_dir
+def test_import_json():
+    """An empty database should be populated from the legacy JSON files"""
+    write_legacy_files()
+    db = SQLiteUserDatabase()
+
+    assert db.get_all_users() == LEGACY_USERS
+    assert db.find_profile('user_a') == PROFILE
+    assert db.get_feedback_stats() == {'total': 3, 'helpful': 2, 'not_helpful': 1, 'neutral': 0}
+    assert db.get_user_feedback_stats('a@example.com')['not_helpful'] == 1
+
+    # A second start must not import the files again
+    assert SQLiteUserDatabase().get_feedback_stats()['total'] == 3
+    print("[OK] Legacy JSON imported once")
+
+
+@in_temp_dir
+def test_trigger_counters():
+    """Counters maintained by the trigger should match a rebuild from the rows"""
+    write_legacy_files()
+    db = SQLiteUserDatabase()
+    db.store_feedback('b@example.com', 'neutral', 'advice')
+    db.store_feedback('b@example.com', 'helpful', 'advice')
+
+    today = datetime.now().date().isoformat()
+    maintained = (db.get_feedback_stats(), db.get_daily_feedback_stats(), db.get_user_feedback_stats('b@example.com'))
+    assert maintained[0] == {'total': 5, 'helpful': 3, 'not_helpful': 1, 'neutral': 1}
+    assert maintained[1][today] == {'total': 2, 'helpful': 1, 'not_helpful': 0, 'neutral': 1}
+    assert db.get_feedback_stats(since='2025-01-02', until='2025-01-03')['total'] == 2
+
+    db.rebuild_counters()
+    assert (db.get_feedback_stats(), db.get_daily_feedback_stats(),
+            db.get_user_feedback_stats('b@example.com')) == maintained
+    print("[OK] Trigger counters match a rebuild")
+
+
+@in_temp_dir
+def test_feedback_stats_endpoint():
+    """/feedback-stats?days=N should report only the last N days"""
+    write_legacy_files()
+    os.environ['DB_BACKEND'] = 'sqlite'
+    os.environ.setdefault('SHAP_PRELOAD', '0')
+    try:
+        import app as app_module
+    except ImportError as e:
+        skip(f"Flask app not importable here: {e}")
+        return
+    finally:
+        os.environ.pop('DB_BACKEND')
+
+    assert isinstance(app_module.db, SQLiteUserDatabase)
+    app_module.db.store_feedback('a@example.com', 'helpful', 'advice')
+
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['user_email'] = 'admin@123.com'
+
+    recent = client.get('/feedback-stats?days=7').get_json()
+    assert recent['stats'] == {'total': 1, 'helpful': 1, 'not_helpful': 0, 'neutral': 0}
+    assert list(recent['daily']) == [datetime.now().date().isoformat()]
+
+    everything = client.get('/feedback-stats').get_json()
+    assert everything['stats']['total'] == 4
+    print("[OK] /feedback-stats?days reads the daily counters")
+
+
+if __name__ == "__main__":
+    test_journal_replay()
+    test_journal_torn_tail()
+    test_journal_missing_newline()
+    test_journal_compaction()
+    test_journal_compaction_under_load()
+    test_feedback_stats_reads_during_writes()
+    test_sqlite_starts_empty()
+    test_import_json()
+    test_trigger_counters()
+    test_feedback_stats_endpoint()
@@ -0,0 +1,137 @@
+"""
+Test script to verify deadlines, circuit breaking and hedging in GeminiService
+Runs offline: no API key or network access is needed
+"""
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from advice_cache import AdviceCache
+from llm_resilience import CircuitBreaker
+from llm_service import GeminiService
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Model stub with a configurable delay and failure switch"""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("503 Service Unavailable")
+        return StubResponse("personalized advice")
+
+
+TEST_PROFILE = {'age': 30, 'goal': 'weight_loss'}
+TEST_CONTEXT = "Current plan: 1800 calories"
+
+
+def test_deadline_returns_fallback():
+    """A call slower than the deadline should return the fallback on time"""
+    gemini = GeminiService(model=StubModel(delay=0.5), cache=AdviceCache(), timeout=0.1)
+
+    start = time.perf_counter()
+    advice = gemini.get_personalized_advice(TEST_PROFILE, TEST_CONTEXT)
+    elapsed = time.perf_counter() - start
+
+    assert "general advice" in advice
+    assert elapsed < 0.3
+    assert gemini.metrics()['calls']['timeouts'] == 1
+    print(f"[OK] Fallback served after {elapsed * 1000:.0f} ms")
+
+    # The late answer still lands in the cache for the next request
+    time.sleep(0.5)
+    assert gemini.get_cached_advice(TEST_PROFILE, TEST_CONTEXT) == "personalized advice"
+    print("[OK] Late answer cached")
+
+
+def test_breaker_opens_and_recovers():
+    """Consecutive failures should open the circuit; a success after the reset closes it"""
+    model = StubModel(fail=True)
+    gemini = GeminiService(model=model, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.2))
+
+    for _ in range(5):
+        gemini.get_personalized_advice(TEST_PROFILE, TEST_CONTEXT)
+
+    assert model.calls == 2
+    assert gemini.breaker.state == CircuitBreaker.OPEN
+    assert gemini.health_check()['status'] == 'degraded'
+    print("[OK] Circuit opened after 2 failures, 3 calls short-circuited")
+
+    time.sleep(0.25)
+    model.fail = False
+    advice = gemini.get_personalized_advice(TEST_PROFILE, TEST_CONTEXT)
+
+    assert advice == "personalized advice"
+    assert gemini.breaker.state == CircuitBreaker.CLOSED
+    print("[OK] Circuit closed after successful trial call")
+
+
+def test_hedge_serves_fallback_within_budget():
+    """With hedging on, a slow call should be answered within the latency budget"""
+    model = StubModel(delay=0.3)
+    gemini = GeminiService(model=model, cache=AdviceCache(), hedge_after=0.05)
+
+    start = time.perf_counter()
+    advice = gemini.get_personalized_advice(TEST_PROFILE, TEST_CONTEXT)
+    elapsed = time.perf_counter() - start
+
+    assert "general advice" in advice
+    assert elapsed < 0.2
+    print(f"[OK] Hedged after {elapsed * 1000:.0f} ms")
+
+    time.sleep(0.35)
+    assert gemini.get_personalized_advice(TEST_PROFILE, TEST_CONTEXT) == "personalized advice"
+    assert model.calls == 1
+    print("[OK] Background answer served on the next request")
+
+
+def test_hedged_call_keeps_deadline():
+    """A hedged call that hangs past the full deadline should count as a failure"""
+    model = StubModel(delay=0.5)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    gemini = GeminiService(model=model, cache=AdviceCache(), timeout=0.15, hedge_after=0.05,
+                           breaker=breaker)
+
+    advice = gemini.get_personalized_advice(TEST_PROFILE, TEST_CONTEXT)
+    assert "general advice" in advice
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    time.sleep(0.2)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert gemini.metrics()['calls']['timeouts'] == 1
+    print("[OK] Hung hedged call tripped the breaker at the deadline")
+
+
+def test_timed_out_calls_release_the_pool():
+    """Calls still queued when their deadline passes should be cancelled"""
+    model = StubModel(delay=0.3)
+    gemini = GeminiService(model=model, timeout=0.05, max_concurrency=1,
+                           breaker=CircuitBreaker(failure_threshold=100))
+
+    for _ in range(3):
+        gemini.get_personalized_advice(TEST_PROFILE, TEST_CONTEXT)
+    time.sleep(0.4)
+
+    assert model.calls == 1
+    print("[OK] Queued calls cancelled at their deadline")
+
+
+if __name__ == "__main__":
+    test_deadline_returns_fallback()
+    test_breaker_opens_and_recovers()
+    test_hedge_serves_fallback_within_budget()
+    test_hedged_call_keeps_deadline()
+    test_timed_out_calls_release_the_pool()
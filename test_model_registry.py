@@ -0,0 +1,101 @@
+"""
+Test script to verify the versioned model registry and explainer startup
+Runs offline in temporary registry directories
+"""
+import sys
+import os
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ml_shap_explainer import SHAPMLExplainer
+from model_registry import ArtifactValidationError, ModelRegistry
+
+
+SMALL_CONFIG = {'n_samples': 2000, 'chunk_size': 500, 'n_estimators': 8, 'max_depth': 6}
+
+
+def expect_validation_error(load, message):
+    try:
+        load()
+        assert False, "invalid artifact accepted"
+    except ArtifactValidationError as e:
+        assert message in str(e), e
+
+
+def test_concurrent_saves_get_distinct_versions():
+    """Writers saving at the same time should each get their own complete version"""
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ModelRegistry(tmp)
+        versions = {}
+
+        def save(i):
+            versions[i] = ModelRegistry(tmp).save({'model': i, 'weights': list(range(20000))}, {})
+
+        # Switch threads often so the saves overlap
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=save, args=(i,)) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        assert sorted(versions.values()) == list(range(1, 9))
+        for i, version in versions.items():
+            payload, metadata = registry.load(version)
+            assert payload['model'] == i and metadata['version'] == version
+        assert not [name for name in os.listdir(tmp) if name.endswith(('.reserved', '.tmp'))]
+    print("[OK] Concurrent saves got versions 1-8")
+
+
+def test_rejects_bad_artifacts():
+    """A corrupt pickle, a missing one or other features should fail validation"""
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ModelRegistry(tmp)
+        version = registry.save({'model': 1}, {'feature_names': ['age', 'weight']})
+        assert registry.load(expected_features=['age', 'weight'])[0] == {'model': 1}
+
+        expect_validation_error(lambda: registry.load(expected_features=['age']), 'was trained on')
+
+        artifact_path, _ = registry._paths(version)
+        with open(artifact_path, 'ab') as f:
+            f.write(b'tampered')
+        expect_validation_error(registry.load, 'Checksum mismatch')
+
+        os.remove(artifact_path)
+        expect_validation_error(registry.load, 'Artifact file missing')
+    print("[OK] Corrupt, missing and mismatched artifacts rejected")
+
+
+def test_startup_paths():
+    """startup() should train when empty, reuse a fresh artifact, retrain a stale one and reject a broken one"""
+    with tempfile.TemporaryDirectory() as tmp:
+        explainer = SHAPMLExplainer(registry=ModelRegistry(tmp), training_config=SMALL_CONFIG)
+        explainer.startup(background=False)
+        assert explainer.registry.versions() == [1]
+
+        reused = SHAPMLExplainer(registry=ModelRegistry(tmp), training_config=SMALL_CONFIG)
+        reused.startup(background=False)
+        assert reused.model_version == 1 and reused.registry.versions() == [1]
+
+        # A different training configuration makes the artifact stale
+        retrained = SHAPMLExplainer(registry=ModelRegistry(tmp), training_config={**SMALL_CONFIG, 'n_estimators': 4})
+        retrained.startup(background=False)
+        assert retrained.model_version == 2 and len(retrained.model.estimators_) == 4
+
+        artifact_path, _ = retrained.registry._paths(2)
+        os.remove(artifact_path)
+        broken = SHAPMLExplainer(registry=ModelRegistry(tmp), training_config=SMALL_CONFIG)
+        expect_validation_error(lambda: broken.startup(background=False), 'Artifact file missing')
+    print("[OK] startup() trains, reuses, retrains and rejects as expected")
+
+
+if __name__ == "__main__":
+    test_concurrent_saves_get_distinct_versions()
+    test_rejects_bad_artifacts()
+    test_startup_paths()
@@ -0,0 +1,73 @@
+"""
+Test script to verify the streaming plan export formats
+Runs offline: no Flask app or user data is needed
+"""
+import sys
+import os
+import io
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import plan_export
+from plan_export import read_packed, resolve_format, stream_records
+
+
+TEST_RECORDS = [
+    {
+        'user_id': f'user_{i}',
+        'plan': {
+            'diet_plan': {'calorie_target': 1800 + i, 'ratio': 0.25, 'vegetarian': i % 2 == 0},
+            'exercise_plan': {'days': ['monday', 'wednesday'], 'notes': None},
+            'overall_summary': {'overview': 'Personalized plan ✓', 'big': 2 ** 40}
+        }
+    }
+    for i in range(500)
+]
+
+
+def test_ndjson_round_trip():
+    """Every record should come back as one JSON line"""
+    data = b''.join(stream_records(iter(TEST_RECORDS), 'ndjson'))
+    lines = data.decode('utf-8').splitlines()
+
+    assert [json.loads(line) for line in lines] == TEST_RECORDS
+    print(f"[OK] NDJSON round trip ({len(data)} bytes)")
+
+
+def test_packed_round_trip():
+    """The struct-packed format should decode to the original records"""
+    data = b''.join(stream_records(iter(TEST_RECORDS), 'packed'))
+
+    assert list(read_packed(io.BytesIO(data))) == TEST_RECORDS
+    print(f"[OK] Packed round trip ({len(data)} bytes)")
+
+
+def test_stream_is_chunked():
+    """Large exports should be emitted as bounded chunks, not one blob"""
+    chunks = list(stream_records(iter(TEST_RECORDS * 4), 'packed'))
+
+    assert len(chunks) > 1
+    assert all(len(chunk) < plan_export.CHUNK_SIZE * 2 for chunk in chunks)
+    print(f"[OK] Export streamed in {len(chunks)} chunks")
+
+
+def test_format_resolution():
+    """msgpack should fall back to the packed format when not installed"""
+    fmt, mimetype = resolve_format('msgpack')
+    expected = 'msgpack' if plan_export.msgpack is not None else 'packed'
+    assert fmt == expected and mimetype == plan_export.FORMATS[expected]
+
+    try:
+        resolve_format('xml')
+        assert False, "unknown format accepted"
+    except ValueError:
+        pass
+    print(f"[OK] msgpack resolves to '{fmt}'")
+
+
+if __name__ == "__main__":
+    test_ndjson_round_trip()
+    test_packed_round_trip()
+    test_stream_is_chunked()
+    test_format_resolution()
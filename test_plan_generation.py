@@ -0,0 +1,86 @@
+"""
+Test script to verify bulk plan generation and the plan cache
+Needs the models and engines packages; skipped where they are missing
+"""
+import sys
+import os
+import sqlite3
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import requires
+
+IMPORT_ERROR = None
+try:
+    from main import HealthFitnessXAISystem
+except ImportError as e:
+    IMPORT_ERROR = e
+
+# main.py needs the models and engines packages
+requires_system = requires(IMPORT_ERROR)
+
+
+def make_profile(i):
+    return {
+        'user_id': f'user_{i}', 'name': f'User {i}', 'age': 20 + i % 40,
+        'gender': 'male' if i % 2 else 'female', 'weight': 55 + i % 30, 'height': 160 + i % 25,
+        'activity_level': 'moderately_active', 'sleep_hours': 7, 'medical_conditions': [],
+        'dietary_restrictions': [], 'fitness_goals': ['weight_loss' if i % 3 else 'muscle_gain']
+    }
+
+
+@requires_system
+def test_generate_plans_with_workers():
+    """Worker processes should build the same plans without pickling the system"""
+    system = HealthFitnessXAISystem()
+    # Neither a lock nor a database connection can be pickled
+    system.connection = sqlite3.connect(':memory:')
+    for i in range(40):
+        system.create_user(make_profile(i))
+    user_ids = [f'user_{i}' for i in range(40)] + ['missing']
+
+    expected = list(system.generate_plans(user_ids))
+    results = list(system.generate_plans(user_ids, workers=2, chunksize=8))
+
+    assert [user_id for user_id, _ in results] == user_ids
+    assert results == expected
+    assert results[-1] == ('missing', None)
+    assert system.bulk_stats['generated'] == 40 and system.bulk_stats['failed'] == 1
+    assert system.bulk_stats['workers'] == 2
+    print(f"[OK] 40 plans generated by 2 workers ({system.bulk_stats['plans_per_second']} plans/s)")
+
+
+
+@requires_system
+def test_plan_cache():
+    """Unchanged profiles hit the cache, updates invalidate, and the LRU stays bounded"""
+    system = HealthFitnessXAISystem(max_cached_plans=3)
+    for i in range(4):
+        system.create_user(make_profile(i))
+
+    first = system.generate_complete_plan('user_0')
+    assert system.generate_complete_plan('user_0') == first
+    assert system.plan_cache_stats()['hits'] == 1 and system.plan_cache_stats()['misses'] == 1
+
+    system.update_user('user_0', {'weight': 90})
+    assert 'user_0' not in system._plan_cache
+    updated = system.generate_complete_plan('user_0')
+    assert updated['user_profile']['weight'] == 90
+    assert system.plan_cache_stats()['misses'] == 2
+
+    # Changing a stored profile behind the system's back drops the stale plan on the next read
+    system.get_user('user_0').weight = 95
+    system.generate_complete_plan('user_0')
+    assert system.plan_cache_stats()['misses'] == 3 and len(system._plan_cache) == 1
+
+    for i in (1, 2, 3):
+        system.generate_complete_plan(f'user_{i}')
+    stats = system.plan_cache_stats()
+    assert stats['size'] == 3 and stats['evictions'] == 1
+    assert list(system._plan_cache) == ['user_1', 'user_2', 'user_3']
+    print(f"[OK] Plan cache hits, invalidation and LRU eviction ({stats})")
+
+
+if __name__ == "__main__":
+    test_generate_plans_with_workers()
+    test_plan_cache()
@@ -0,0 +1,92 @@
+"""
+Test script to verify the analytic Mifflin-St Jeor SHAP backend
+Checks it against the training formula and brute-force Shapley values
+"""
+import sys
+import os
+import tempfile
+from itertools import combinations
+from math import factorial
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ml_shap_explainer import SHAPMLExplainer
+from model_registry import ModelRegistry
+from shap_backends import AnalyticSHAPBackend
+
+
+def training_data(n_samples):
+    with tempfile.TemporaryDirectory() as tmp:
+        explainer = SHAPMLExplainer(registry=ModelRegistry(tmp))
+        return explainer.feature_names, explainer.generate_training_data(n_samples)
+
+
+def exact_shapley(predict, x, background):
+    """Shapley values of one row by enumerating every coalition of features"""
+    n = len(x)
+    phi = np.zeros(n)
+    for j in range(n):
+        others = [k for k in range(n) if k != j]
+        for size in range(n):
+            weight = factorial(size) * factorial(n - size - 1) / factorial(n)
+            for coalition in combinations(others, size):
+                z = background.copy()
+                z[list(coalition)] = x[list(coalition)]
+                without = predict(z)[0]
+                z[j] = x[j]
+                phi[j] += weight * (predict(z)[0] - without)
+    return phi
+
+
+def test_analytic_is_additive():
+    """Base value plus attributions should give the prediction, which is the training target"""
+    feature_names, df = training_data(500)
+    backend = AnalyticSHAPBackend(feature_names)
+
+    predictions, shap_values, base_value = backend.explain(df[feature_names].values)
+    assert np.allclose(predictions, df['target_calories'])
+    assert np.allclose(base_value + shap_values.sum(axis=1), predictions)
+    assert np.all(shap_values[:, feature_names.index('bmi')] == 0)
+
+    # At the background means nothing is attributed
+    at_means, zero, _ = backend.explain(backend.means)
+    assert np.allclose(zero, 0) and np.isclose(at_means[0], base_value)
+    print("[OK] Analytic attributions add up to the prediction")
+
+
+def test_analytic_matches_exact_shapley():
+    """The closed form should equal brute-force Shapley values with the means as background"""
+    feature_names, df = training_data(5)
+    backend = AnalyticSHAPBackend(feature_names)
+    X = df[feature_names].values
+
+    _, shap_values, base_value = backend.explain(X)
+    for x, row in zip(X, shap_values):
+        assert np.allclose(exact_shapley(backend.predict, x, backend.means), row)
+    assert np.isclose(backend.predict(backend.means)[0], base_value)
+    print("[OK] Analytic values match exact Shapley values")
+
+
+def test_expected_value_means():
+    """Default means should be those of the training distribution, and from_training_data its sample means"""
+    feature_names, df = training_data(200000)
+    sample_means = df[feature_names].mean()
+
+    # Within four standard errors of the sample mean
+    tolerance = 4 * df[feature_names].std() / np.sqrt(len(df))
+    default = AnalyticSHAPBackend(feature_names)
+    for i, feature in enumerate(feature_names):
+        assert abs(default.means[i] - sample_means[feature]) < tolerance[feature], feature
+
+    fitted = AnalyticSHAPBackend.from_training_data(df, feature_names)
+    assert np.allclose(fitted.means, sample_means[feature_names].values)
+    # Activity level is independent of the BMR terms, so the base value is the mean prediction
+    assert abs(fitted.base_value - fitted.predict(df[feature_names].values).mean()) < 0.001 * fitted.base_value
+    print(f"[OK] Expected value {default.base_value:.1f} kcal from the training means")
+
+
+if __name__ == "__main__":
+    test_analytic_is_additive()
+    test_analytic_matches_exact_shapley()
+    test_expected_value_means()
@@ -0,0 +1,214 @@
+"""
+Test script to verify SHAPMLExplainer training, backends and caching
+Runs offline on small synthetic models in a temporary model registry
+"""
+import sys
+import os
+import tempfile
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ml_shap_explainer import ExplanationCache, SHAPMLExplainer
+from model_registry import ModelRegistry
+
+
+SMALL_CONFIG = {'n_samples': 2000, 'chunk_size': 500, 'n_estimators': 8, 'max_depth': 6}
+
+# Encoded features of one user, as get_shap_values expects them
+FEATURES = {'age': 30, 'weight': 70, 'height': 175, 'bmi': 22.9, 'gender': 1, 'activity_level': 1.55, 'goal': 0}
+
+
+def make_profile(i):
+    """Just the UserProfile attributes encode_profile and the explanations read"""
+    weight, height = 55 + 7 * i, 160 + 4 * i
+    return SimpleNamespace(
+        age=22 + 5 * i, weight=weight, height=height, bmi=weight / (height / 100) ** 2,
+        gender='male' if i % 2 else 'female',
+        activity_level=['sedentary', 'moderately_active', 'very_active'][i % 3],
+        fitness_goals=[['weight_loss', 'maintenance', 'muscle_gain'][i % 3]]
+    )
+
+
+def test_partial_training_is_stale():
+    """A forest cut short by the time budget should be recorded and retrained as partial"""
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ModelRegistry(tmp)
+        explainer = SHAPMLExplainer(registry=registry, training_config=SMALL_CONFIG)
+
+        explainer.train_model(time_budget=0)
+        stats = explainer.last_training_stats
+        assert stats['chunks'] == 1 and stats['planned_chunks'] == 4 and stats['partial']
+        assert stats['rows'] == 500 and stats['n_estimators'] == 2
+
+        explainer.save_model()
+        metadata = registry.read_metadata(explainer.model_version)
+        assert metadata['partial'] and metadata['rows'] == 500 and metadata['n_estimators'] == 2
+        assert registry.is_stale(metadata, explainer.training_config)
+
+        explainer.train_model()
+        assert explainer.last_training_stats['chunks'] == 4
+        explainer.save_model()
+        metadata = registry.read_metadata(explainer.model_version)
+        assert not metadata['partial'] and metadata['n_estimators'] == 8
+        assert not registry.is_stale(metadata, explainer.training_config)
+    print("[OK] Partial model recorded with its real size and marked stale")
+
+
+
+def test_set_backend_validates_before_swapping():
+    """Bad backend options should be rejected without touching the running engine"""
+    with tempfile.TemporaryDirectory() as tmp:
+        explainer = SHAPMLExplainer(registry=ModelRegistry(tmp), training_config=SMALL_CONFIG)
+        explainer.train_model()
+        explainer.get_shap_values(FEATURES)
+        tree_backend = explainer.get_backend()
+
+        for options in ({'truncated_trees': 0}, {'distilled_depth': 'abc'},
+                        {'distill_samples': True}, {'max_trees': 3}):
+            try:
+                explainer.set_backend('truncated', **options)
+                assert False, f"{options} should be rejected"
+            except ValueError:
+                pass
+            assert explainer.backend_name == 'tree' and explainer.get_backend() is tree_backend
+            assert explainer.backend_options == SHAPMLExplainer.BACKEND_OPTIONS
+
+        explainer.set_backend('truncated', truncated_trees=3)
+        backend = explainer._backend
+        assert backend is not None and backend.n_trees == 3
+        assert explainer.get_backend() is backend
+        assert explainer.cache_stats()['size'] == 0
+        result = explainer.get_shap_values(FEATURES)
+        assert abs(sum(result['shap_values'].values()) + result['base_value'] - result['prediction']) < 1e-6
+    print("[OK] Invalid backend options rejected, valid backend built eagerly")
+
+
+def test_set_backend_before_model_is_deferred():
+    """Choosing a backend at startup should not train a model"""
+    with tempfile.TemporaryDirectory() as tmp:
+        explainer = SHAPMLExplainer(registry=ModelRegistry(tmp), training_config=SMALL_CONFIG)
+        explainer.set_backend('compact')
+        assert explainer.backend_name == 'compact' and explainer._backend is None
+        assert explainer.model is None
+    print("[OK] Backend build deferred until a model is loaded")
+
+
+
+def test_compact_boot_loads_saved_model():
+    """After a compact-only startup, other backends should load the saved model, not retrain"""
+    with tempfile.TemporaryDirectory() as tmp:
+        trainer = SHAPMLExplainer(registry=ModelRegistry(tmp), training_config=SMALL_CONFIG)
+        trainer.train_model()
+        trainer.save_model()
+
+        explainer = SHAPMLExplainer(registry=ModelRegistry(tmp), backend='compact', training_config=SMALL_CONFIG)
+        explainer.startup(background=False)
+        assert explainer.model is None and explainer.compact_forest is not None
+
+        def no_training(*args, **kwargs):
+            raise AssertionError("a saved model exists, training is not needed")
+        explainer.train_model = no_training
+        explainer.set_backend('truncated', truncated_trees=2)
+        explainer.get_shap_values(FEATURES)
+        assert explainer.model is not None and explainer.model_version == trainer.model_version
+        assert explainer.registry.latest_version() == trainer.model_version
+
+        # With an empty registry the model is trained once and published
+        fresh = SHAPMLExplainer(registry=ModelRegistry(os.path.join(tmp, 'empty')), training_config=SMALL_CONFIG)
+        fresh.get_shap_values(FEATURES)
+        assert fresh.registry.latest_version() == fresh.model_version == 1
+    print("[OK] Saved model loaded instead of retraining")
+
+
+def test_explain_batch_matches_single_rows():
+    """One batched call should give exactly what explaining each profile alone gives"""
+    with tempfile.TemporaryDirectory() as tmp:
+        explainer = SHAPMLExplainer(registry=ModelRegistry(tmp), training_config=SMALL_CONFIG, cache_size=0)
+        profiles = [make_profile(i) for i in range(6)] + [make_profile(2)]
+
+        batch = explainer.explain_batch(profiles)
+        single = [explainer.explain_recommendation(profile) for profile in profiles]
+        assert len(batch) == len(profiles)
+        for batched, alone in zip(batch, single):
+            assert batched['explanation'] == alone['explanation']
+            assert batched['feature_importance'] == alone['feature_importance']
+            assert np.isclose(batched['ml_prediction'], alone['ml_prediction'])
+            assert np.isclose(batched['base_value'], alone['base_value'])
+            assert np.allclose(list(batched['shap_values'].values()), list(alone['shap_values'].values()))
+
+        # And what the backend gives for each encoded row on its own
+        backend = explainer.get_backend()
+        for profile, batched in zip(profiles, batch):
+            predictions, shap_values, _ = backend.explain(explainer.encode_profiles([profile]))
+            assert np.isclose(batched['ml_prediction'], predictions[0])
+            assert np.allclose(list(batched['shap_values'].values()), shap_values[0])
+        assert explainer.explain_batch([]) == []
+    print(f"[OK] explain_batch matches per-row explanations for {len(profiles)} profiles")
+
+
+def test_cache_hits_quantized_rows():
+    """Profiles within one bucket of each other should share a cached explanation"""
+    with tempfile.TemporaryDirectory() as tmp:
+        explainer = SHAPMLExplainer(registry=ModelRegistry(tmp), training_config=SMALL_CONFIG)
+        first = explainer.get_shap_values(FEATURES)
+        nearby = explainer.get_shap_values({**FEATURES, 'age': 30.3, 'weight': 69.8, 'bmi': 22.94})
+        assert nearby == first
+        assert explainer.cache_stats()['hits'] == 1 and explainer.cache_stats()['misses'] == 1
+
+        explainer.get_shap_values({**FEATURES, 'weight': 72})
+        explainer.get_shap_values({**FEATURES, 'goal': 300})
+        stats = explainer.cache_stats()
+        assert stats['misses'] == 3 and stats['size'] == 3
+    print("[OK] Quantized rows hit the explanation cache")
+
+
+def test_cache_evicts_least_recently_used():
+    """A full cache should drop the entry that was used longest ago"""
+    cache = ExplanationCache(['age', 'weight'], max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats() == {'hits': 3, 'misses': 1, 'evictions': 1, 'hit_rate': 0.75, 'size': 2}
+    print("[OK] Explanation cache evicts least recently used")
+
+
+def test_cache_invalidated_by_new_model():
+    """Explanations from a replaced model should never be served"""
+    with tempfile.TemporaryDirectory() as tmp:
+        explainer = SHAPMLExplainer(registry=ModelRegistry(tmp), training_config=SMALL_CONFIG)
+        explainer.get_shap_values(FEATURES)
+        explainer.save_model()
+        generation = explainer._model_generation
+
+        explainer.train_model(n_samples=1000)
+        retrained = explainer.get_shap_values(FEATURES)
+        assert explainer._model_generation == generation + 1
+        assert explainer.cache_stats()['hits'] == 0 and explainer.cache_stats()['size'] == 1
+
+        row = explainer.explanation_cache.quantize([[FEATURES[f] for f in explainer.feature_names]])
+        prediction = explainer.model.predict(pd.DataFrame(row, columns=explainer.feature_names))[0]
+        assert abs(retrained['prediction'] - prediction) < 1e-6
+
+        explainer.load_model()
+        reloaded = explainer.get_shap_values(FEATURES)
+        assert explainer._model_generation == generation + 2
+        assert explainer.cache_stats()['hits'] == 0 and reloaded != retrained
+    print("[OK] Explanation cache invalidated on model reload")
+
+
+if __name__ == "__main__":
+    test_partial_training_is_stale()
+    test_set_backend_validates_before_swapping()
+    test_set_backend_before_model_is_deferred()
+    test_compact_boot_loads_saved_model()
+    test_explain_batch_matches_single_rows()
+    test_cache_hits_quantized_rows()
+    test_cache_evicts_least_recently_used()
+    test_cache_invalidated_by_new_model()
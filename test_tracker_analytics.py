@@ -0,0 +1,94 @@
+"""
+Test script to verify the columnar tracker analytics
+Runs in a temporary directory on synthetic tracker files
+"""
+import sys
+import os
+import json
+import tempfile
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import working_directory
+from tracker import DailyTracker, migrate_to_monthly
+from tracker_analytics import TrackerAnalytics
+
+
+class FakeDatabase:
+    """Just enough of UserDatabase for the goal join"""
+
+    def __init__(self, goals):
+        self.goals = goals
+
+    def get_all_users(self):
+        return {
+            email: {'profile': {'fitness_goals': [goal]}}
+            for email, goal in self.goals.items()
+        }
+
+
+def write_history(tmp, email, steps, days=120):
+    history = {
+        (date.today() - timedelta(days=offset)).isoformat(): {
+            'steps': steps, 'water_ml': 1000, 'sleep_hours': 7,
+            'meals_completed': ['breakfast', 'lunch'], 'exercises_completed': []
+        }
+        for offset in range(days)
+    }
+    path = os.path.join(tmp, 'tracker_data', f'{email.replace("@", "_").replace(".", "_")}.json')
+    with open(path, 'w') as f:
+        json.dump(history, f)
+    return path
+
+
+def test_ingest_and_cohorts():
+    """Both layouts should be ingested and grouped by fitness goal"""
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, 'tracker_data'))
+        write_history(tmp, 'a@example.com', 8000)
+        write_history(tmp, 'b@example.com', 4000)
+        path = write_history(tmp, 'c@example.com', 6000)
+        migrate_to_monthly(path, path[:-5])
+
+        analytics = TrackerAnalytics(os.path.join(tmp, 'tracker_data'))
+        frame = analytics.refresh()
+        assert len(frame) == 360
+        assert frame['meals_completed'].eq(2).all()
+
+        db = FakeDatabase({'a@example.com': 'muscle_gain', 'b@example.com': 'weight_loss',
+                           'c@example.com': 'weight_loss'})
+        report = analytics.cohort_report(db, days=90)
+        assert report.loc['muscle_gain', 'steps'] == 8000
+        assert report.loc['weight_loss', 'steps'] == 5000
+        assert report.loc['weight_loss', 'users'] == 2
+
+        weekly = analytics.resample('steps', 'W', users=['a@example.com'])
+        assert (weekly == 8000).all()
+    print("[OK] Ingest and cohort report")
+
+
+def test_snapshot_is_incremental():
+    """A refresh should reuse the snapshot and only re-parse changed files"""
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, 'tracker_data'))
+        for i in range(5):
+            write_history(tmp, f'user{i}@example.com', 1000 * i)
+
+        TrackerAnalytics(os.path.join(tmp, 'tracker_data')).refresh()
+
+        with working_directory(tmp):
+            DailyTracker('user0@example.com').update_steps(12345)
+
+        analytics = TrackerAnalytics(os.path.join(tmp, 'tracker_data'))
+        frame = analytics.refresh()
+        assert analytics.last_refresh['parsed'] == 1
+        assert analytics.last_refresh['reused'] == 4
+        today = frame[(frame['user'] == 'user0_example_com') & (frame['date'] == str(date.today()))]
+        assert today['steps'].iloc[0] == 12345
+    print("[OK] Snapshot refreshed incrementally")
+
+
+if __name__ == "__main__":
+    test_ingest_and_cohorts()
+    test_snapshot_is_incremental()
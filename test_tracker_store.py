@@ -0,0 +1,399 @@
+"""
+Test script to verify write-back caching of daily trackers
+Runs in a temporary directory so no real tracker data is touched
+"""
+import sys
+import os
+import json
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import in_temp_dir
+from migrate_tracker_data import main as migrate_main
+from tracker import DailyTracker, TrackerStore, RollingTotals, merge_day, migrate_to_monthly
+
+
+def saved_water(email):
+    path = f'tracker_data/{email.replace("@", "_").replace(".", "_")}.json'
+    with open(path) as f:
+        return json.load(f)[date.today().isoformat()]['water_ml']
+
+
+@in_temp_dir
+def test_writes_are_coalesced():
+    """Five changes between flushes should cost one file write"""
+    store = TrackerStore(flush_interval=60)
+    for _ in range(5):
+        with store.open('user@example.com') as tracker:
+            tracker.add_water(250)
+
+    assert store.stats()['writes'] == 0
+    assert store.flush() == 1
+    assert saved_water('user@example.com') == 1250
+    assert store.flush() == 0
+    store.close()
+    print("[OK] Five updates, one write")
+
+
+@in_temp_dir
+def test_eviction_flushes():
+    """Trackers dropped from the cache should be written first"""
+    store = TrackerStore(max_trackers=1, flush_interval=60)
+    with store.open('a@example.com') as tracker:
+        tracker.add_water(500)
+    with store.open('b@example.com') as tracker:
+        tracker.add_water(250)
+
+    assert store.stats()['evictions'] == 1
+    assert saved_water('a@example.com') == 500
+    store.close()
+    assert saved_water('b@example.com') == 250
+    print("[OK] Evicted tracker flushed")
+
+
+@in_temp_dir
+def test_reloads_external_changes():
+    """A write by another process should be picked up on the next open"""
+    store = TrackerStore(flush_interval=0)
+    with store.open('user@example.com') as tracker:
+        tracker.add_water(250)
+
+    DailyTracker('user@example.com').add_water(1000)
+
+    with store.open('user@example.com') as tracker:
+        assert tracker.get_today_data()['water_ml'] == 1250
+    store.close()
+    print("[OK] External write reloaded")
+
+
+@in_temp_dir
+def test_reload_merges_unflushed_changes():
+    """Another process's write should be merged with changes not flushed yet"""
+    store = TrackerStore(flush_interval=60)
+    with store.open('user@example.com') as tracker:
+        tracker.add_water(250)
+
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    other = DailyTracker('user@example.com')
+    other.data[yesterday] = {'steps': 8000}
+    other._save_tracker_data(yesterday)
+
+    with store.open('user@example.com') as tracker:
+        assert tracker.data[yesterday]['steps'] == 8000
+        assert tracker.get_today_data()['water_ml'] == 250
+        assert tracker.get_window_stats(2)['days_tracked'] == 2
+    store.close()
+
+    reloaded = DailyTracker('user@example.com')
+    assert reloaded.data[yesterday]['steps'] == 8000 and saved_water('user@example.com') == 250
+    print("[OK] Unflushed changes merged with an external write")
+
+
+@in_temp_dir
+def test_flush_merges_other_workers():
+    """Two workers changing the same day between flushes should both keep their changes"""
+    first = TrackerStore(flush_interval=60)
+    second = TrackerStore(flush_interval=60)
+    with first.open('user@example.com') as tracker:
+        tracker.add_water(250)
+        tracker.complete_meal('breakfast')
+    with second.open('user@example.com') as tracker:
+        tracker.update_steps(5000)
+        tracker.add_water(500)
+        tracker.complete_meal('lunch')
+
+    assert first.flush() == 1 and second.flush() == 1
+    first.close()
+    second.close()
+
+    today = DailyTracker('user@example.com').get_today_data()
+    assert today['water_ml'] == 750 and today['steps'] == 5000
+    assert sorted(today['meals_completed']) == ['breakfast', 'lunch']
+    assert DailyTracker('user@example.com').get_window_stats(1)['avg_water'] == 750
+
+    base = {'steps': 100, 'water_ml': 250, 'meals_completed': ['breakfast', 'lunch']}
+    local = {'steps': 100, 'water_ml': 500, 'meals_completed': ['lunch', 'dinner']}
+    disk = {'steps': 900, 'water_ml': 300, 'meals_completed': ['breakfast', 'lunch', 'snack']}
+    assert merge_day(base, local, disk) == {
+        'steps': 900, 'water_ml': 550, 'meals_completed': ['lunch', 'snack', 'dinner']
+    }
+    print("[OK] Flush merged another worker's changes")
+
+
+@in_temp_dir
+def test_reopen_waits_for_eviction_flush():
+    """Opening a user whose evicted tracker is still being written should see that write"""
+    store = TrackerStore(max_trackers=1, flush_interval=60)
+    with store.open('a@example.com') as tracker:
+        tracker.add_water(500)
+
+    evicted = store._trackers['a@example.com']
+    flush = evicted.flush
+    flushing = threading.Event()
+
+    def slow_flush():
+        flushing.set()
+        time.sleep(0.2)
+        return flush()
+    evicted.flush = slow_flush
+
+    evictor = threading.Thread(target=store._get, args=('b@example.com',))
+    evictor.start()
+    flushing.wait()
+    with store.open('a@example.com') as tracker:
+        assert tracker is not evicted
+        assert tracker.get_today_data()['water_ml'] == 500
+    evictor.join()
+    store.close()
+    print("[OK] Reopen waited for the eviction flush")
+
+
+@in_temp_dir
+def test_monthly_partitions():
+    """Recent reads should only load the months they need"""
+    history = {
+        (date.today() - timedelta(days=offset)).isoformat(): {'steps': offset, 'water_ml': 0}
+        for offset in range(1, 400)
+    }
+    os.makedirs('tracker_data')
+    with open('tracker_data/user_example_com.json', 'w') as f:
+        json.dump(history, f)
+
+    assert migrate_to_monthly('tracker_data/user_example_com.json', 'tracker_data/user_example_com') == 399
+    assert not os.path.exists('tracker_data/user_example_com.json')
+    months = os.listdir('tracker_data/user_example_com')
+    assert len(months) >= 13
+
+    tracker = DailyTracker('user@example.com', layout='monthly')
+    tracker.add_water(250)
+    summary = tracker.get_weekly_summary()
+    assert len(summary) == 7 and summary[0]['water_ml'] == 250
+    loaded = len(tracker.data.loaded_months)
+    assert loaded <= 2
+
+    with open(f'tracker_data/user_example_com/{date.today().isoformat()[:7]}.json') as f:
+        assert json.load(f)[date.today().isoformat()]['water_ml'] == 250
+    assert len(tracker.data) == 400
+    print(f"[OK] Weekly summary read {loaded} of {len(months)} partitions")
+
+
+def read_partitions(directory):
+    days = {}
+    for name in os.listdir(directory):
+        with open(os.path.join(directory, name)) as f:
+            days.update(json.load(f))
+    return days
+
+
+@in_temp_dir
+def test_migration_cli():
+    """migrate_tracker_data.py should partition every tracker file and be safe to run again"""
+    history = {
+        (date(2025, 1, 1) + timedelta(days=offset)).isoformat(): {'steps': offset, 'water_ml': 250}
+        for offset in range(90)
+    }
+    os.makedirs('tracker_data')
+    for user in ('a_example_com', 'b_example_com'):
+        with open(f'tracker_data/{user}.json', 'w') as f:
+            json.dump(history, f)
+    with open('tracker_data/broken_example_com.json', 'w') as f:
+        f.write('{"2025-01-01": ')
+
+    migrate_main(['--dry-run'])
+    assert sorted(os.listdir('tracker_data')) == ['a_example_com.json', 'b_example_com.json', 'broken_example_com.json']
+
+    migrate_main([])
+    for user in ('a_example_com', 'b_example_com'):
+        assert sorted(os.listdir(f'tracker_data/{user}')) == ['2025-01.json', '2025-02.json', '2025-03.json']
+        assert read_partitions(f'tracker_data/{user}') == history
+        assert os.path.exists(f'tracker_data/{user}.json.migrated')
+    # A file that cannot be read is reported and left where it is
+    assert os.path.exists('tracker_data/broken_example_com.json')
+
+    # A second run finds only the broken file and changes nothing
+    before = sorted(os.listdir('tracker_data'))
+    migrate_main([])
+    assert sorted(os.listdir('tracker_data')) == before
+    assert read_partitions('tracker_data/a_example_com') == history
+
+    # With --keep the originals stay, and running again copies no day twice
+    with open('tracker_data/c_example_com.json', 'w') as f:
+        json.dump(history, f)
+    migrate_main(['--keep'])
+    with open('tracker_data/c_example_com/2025-01.json', 'r+') as f:
+        january = json.load(f)
+        january['2025-01-01']['steps'] = 9999
+        f.seek(0)
+        json.dump(january, f)
+        f.truncate()
+    migrate_main(['--keep'])
+    assert os.path.exists('tracker_data/c_example_com.json')
+    assert read_partitions('tracker_data/c_example_com')['2025-01-01']['steps'] == 9999
+    assert len(read_partitions('tracker_data/c_example_com')) == 90
+    print("[OK] Migration CLI partitioned trackers and was safe to rerun")
+
+
+@in_temp_dir
+def test_rolling_totals():
+    """Window totals should match a scan of the history and survive a reload"""
+    history = {
+        (date.today() - timedelta(days=offset)).isoformat(): {
+            'steps': offset * 100, 'water_ml': 250 * (offset % 5), 'sleep_hours': 6 + offset % 3
+        }
+        for offset in range(1, 200, 2)
+    }
+    os.makedirs('tracker_data')
+    with open('tracker_data/user_example_com.json', 'w') as f:
+        json.dump(history, f)
+
+    tracker = DailyTracker('user@example.com')
+    tracker.update_steps(4000)
+    tracker.update_sleep(7.5)
+    history[date.today().isoformat()] = tracker.get_today_data()
+
+    for days in (7, 30, 90, 365):
+        window = [
+            history.get((date.today() - timedelta(days=offset)).isoformat(), {})
+            for offset in range(days)
+        ]
+        stats = tracker.get_window_stats(days)
+        assert stats['avg_steps'] == round(sum(d.get('steps', 0) for d in window) / days)
+        assert stats['avg_sleep'] == round(sum(d.get('sleep_hours', 0) for d in window) / days, 1)
+        assert stats['days_tracked'] == len([d for d in window if d])
+
+    # Saved totals are reused; an external change to the data forces a rebuild
+    reloaded = DailyTracker('user@example.com')
+    assert reloaded.totals.to_dict() == tracker.totals.to_dict()
+
+    with open('tracker_data/user_example_com.json', 'w') as f:
+        json.dump({date.today().isoformat(): {'steps': 700}}, f)
+    assert DailyTracker('user@example.com').get_window_stats(7)['avg_steps'] == 100
+
+    totals = RollingTotals.build({'2024-01-10': {'steps': 5}})
+    totals.record('2024-01-01', {'steps': 3})
+    assert totals.window(10, date(2024, 1, 10))['steps'] == 8
+    print("[OK] Rolling totals match a full scan")
+
+
+@in_temp_dir
+def test_totals_log_appends():
+    """A flush should append the changed day to the totals log, not rewrite the history"""
+    history = {
+        (date.today() - timedelta(days=offset)).isoformat(): {'steps': offset, 'sleep_hours': 7.3}
+        for offset in range(1, 366)
+    }
+    os.makedirs('tracker_data')
+    with open('tracker_data/user_example_com.json', 'w') as f:
+        json.dump(history, f)
+
+    # Creating today's entry saves once with the full log, then each change appends
+    tracker = DailyTracker('user@example.com')
+    tracker.get_today_data()
+    with open(tracker.totals_file) as f:
+        assert len(f.readlines()) == 368
+
+    size = os.path.getsize(tracker.totals_file)
+    for steps in (2000, 3000, 4000):
+        tracker.update_steps(steps)
+    assert os.path.getsize(tracker.totals_file) - size < 600
+    with open(tracker.totals_file) as f:
+        assert len(f.readlines()) == 374
+
+    reloaded = DailyTracker('user@example.com')
+    assert reloaded.totals.to_dict() == tracker.totals.to_dict()
+    assert reloaded.get_window_stats(1)['avg_steps'] == 4000
+
+    # A torn last line makes the next load rebuild from the data
+    with open(tracker.totals_file, 'a') as f:
+        f.write('{"day":"20')
+    rebuilt = DailyTracker('user@example.com')
+    assert rebuilt.get_window_stats(365) == reloaded.get_window_stats(365)
+    print("[OK] Totals log appended per flush")
+
+
+@in_temp_dir
+def test_batch_is_one_write():
+    """A batch should be applied in order and persisted once"""
+    tracker = DailyTracker('user@example.com')
+    writes = tracker.writes
+    result = tracker.apply_batch([
+        {'type': 'steps', 'steps': 6000},
+        {'type': 'water', 'ml': 250},
+        {'type': 'water', 'ml': 500},
+        {'type': 'meal', 'meal_type': 'lunch', 'action': 'complete'},
+        {'type': 'exercise', 'day': 'monday', 'exercise_name': 'squats', 'action': 'complete'},
+        {'type': 'sleep', 'hours': 7.5}
+    ])
+
+    assert tracker.writes == writes + 1
+    assert result['water_ml'] == 750 and result['meals_completed'] == ['lunch']
+    assert result['exercises_completed'] == ['monday_squats']
+    assert saved_water('user@example.com') == 750
+    print("[OK] Six operations, one write")
+
+
+@in_temp_dir
+def test_batch_rolls_back():
+    """A failing operation should leave today's data and totals untouched"""
+    tracker = DailyTracker('user@example.com')
+    tracker.add_water(250)
+    writes = tracker.writes
+
+    try:
+        tracker.apply_batch([
+            {'type': 'water', 'ml': 500},
+            {'type': 'meal', 'meal_type': 'lunch', 'action': 'eat'}
+        ])
+        assert False, "invalid operation accepted"
+    except ValueError as e:
+        assert str(e).startswith('Operation 1')
+
+    assert tracker.get_today_data()['water_ml'] == 250
+    assert tracker.get_window_stats(1)['avg_water'] == 250
+    assert tracker.writes == writes and saved_water('user@example.com') == 250
+    print("[OK] Failed batch rolled back")
+
+
+@in_temp_dir
+def test_batch_rejects_non_numbers():
+    """Steps, water and sleep that are not numbers should be rolled back, not stored"""
+    tracker = DailyTracker('user@example.com')
+    tracker.update_steps(5000)
+    writes = tracker.writes
+
+    for operation in ({'type': 'steps', 'steps': 'abc'}, {'type': 'water', 'ml': None},
+                      {'type': 'sleep', 'hours': True}, {'type': 'steps', 'steps': 'nan'}):
+        try:
+            tracker.apply_batch([{'type': 'water', 'ml': 250}, operation])
+            assert False, f"{operation} accepted"
+        except ValueError as e:
+            assert str(e).startswith('Operation 1') and 'must be a number' in str(e)
+        assert tracker.get_today_data()['steps'] == 5000
+        assert tracker.get_today_data()['water_ml'] == 0
+    assert tracker.writes == writes
+    with open('tracker_data/user_example_com.json') as f:
+        assert json.load(f)[date.today().isoformat()]['steps'] == 5000
+
+    result = tracker.apply_batch([{'type': 'steps', 'steps': '6000'}, {'type': 'sleep', 'hours': '7.5'}])
+    assert result['steps'] == 6000 and result['sleep_hours'] == 7.5
+    assert tracker.get_progress_stats()['weekly']['avg_steps'] > 0
+    print("[OK] Non-numeric batch values rejected")
+
+
+if __name__ == "__main__":
+    test_writes_are_coalesced()
+    test_eviction_flushes()
+    test_reloads_external_changes()
+    test_reload_merges_unflushed_changes()
+    test_flush_merges_other_workers()
+    test_reopen_waits_for_eviction_flush()
+    test_monthly_partitions()
+    test_migration_cli()
+    test_rolling_totals()
+    test_totals_log_appends()
+    test_batch_is_one_write()
+    test_batch_rolls_back()
+    test_batch_rejects_non_numbers()
@@ -0,0 +1,92 @@
+"""
+Test script to verify the shared SQLite user registry
+Two registry instances on one file stand in for two worker processes
+"""
+import sys
+import os
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import requires
+
+IMPORT_ERROR = None
+try:
+    from models.user_profile import UserProfile
+    from user_registry import SQLiteUserRegistry
+except ImportError as e:
+    IMPORT_ERROR = e
+
+requires_profiles = requires(IMPORT_ERROR)
+
+
+PROFILE = {
+    'user_id': 'user_a', 'name': 'A', 'age': 30, 'gender': 'female', 'weight': 60, 'height': 165,
+    'activity_level': 'moderately_active', 'sleep_hours': 7, 'medical_conditions': [],
+    'dietary_restrictions': [], 'fitness_goals': ['maintenance']
+}
+
+
+def make_user(user_id, weight=60):
+    return UserProfile.from_dict({**PROFILE, 'user_id': user_id, 'weight': weight})
+
+
+@requires_profiles
+def test_writes_invalidate_other_workers():
+    """A cached profile should be refreshed once another worker bumps its version"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'registry.sqlite3')
+        worker_a = SQLiteUserRegistry(path)
+        worker_b = SQLiteUserRegistry(path)
+
+        worker_a['user_a'] = make_user('user_a')
+        assert worker_b.get('user_a').weight == 60
+        assert worker_b.get('user_a').weight == 60
+        assert worker_b.stats()['hits'] == 1 and worker_b.stats()['misses'] == 1
+
+        worker_a['user_a'] = make_user('user_a', weight=58)
+        assert worker_b.get('user_a').weight == 58
+        assert worker_b.stats()['hits'] == 1 and worker_b.stats()['misses'] == 2
+        assert len(worker_b) == 1
+    print("[OK] Version check refreshes profiles written by another worker")
+
+
+@requires_profiles
+def test_lru_is_bounded():
+    """Only max_entries profiles stay cached; evicted ones are read back from the table"""
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = SQLiteUserRegistry(os.path.join(tmp, 'registry.sqlite3'), max_entries=2)
+        for user_id in ('u1', 'u2', 'u3'):
+            registry[user_id] = make_user(user_id)
+        assert registry.stats()['cached'] == 2
+
+        assert registry.get('u1').user_id == 'u1'
+        assert registry.stats()['misses'] == 1
+        assert registry.get('u3').user_id == 'u3'
+        assert registry.stats()['hits'] == 1
+    print("[OK] Registry LRU bounded at max_entries")
+
+
+@requires_profiles
+def test_loader_hydrates_missing_users():
+    """Users missing from the table should be loaded once and then stored"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'registry.sqlite3')
+        calls = []
+
+        def loader(user_id):
+            calls.append(user_id)
+            return {**PROFILE, 'user_id': user_id} if user_id == 'user_a' else None
+
+        registry = SQLiteUserRegistry(path, loader=loader)
+        assert registry.get('user_a').user_id == 'user_a'
+        assert registry.get('nobody') is None
+        assert SQLiteUserRegistry(path, loader=loader).get('user_a') is not None
+        assert calls == ['user_a', 'nobody'] and registry.stats()['hydrated'] == 1
+    print("[OK] Missing users hydrated from the loader once")
+
+
+if __name__ == "__main__":
+    test_writes_invalidate_other_workers()
+    test_lru_is_bounded()
+    test_loader_hydrates_missing_users()
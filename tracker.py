@@ -2,34 +2,560 @@
 Daily Health & Fitness Tracker
 Track steps, water intake, meals, exercises, and progress
 """
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
 from datetime import datetime, date
 from typing import Dict, List
+import atexit
+import copy
 import json
+import math
 import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: flushes are not locked against other processes
+    fcntl = None
+
+
+# Storage layouts: one JSON file per user, or one JSON file per user and month
+LAYOUTS = ('single', 'monthly')
+
+# Bumped whenever the totals log format changes; other files are rebuilt
+TOTALS_LOG_VERSION = 2
+
+
+def tracker_key(user_email):
+    """File name stem of a user's tracker data under tracker_data/"""
+    return user_email.replace("@", "_").replace(".", "_")
+
+
+def _atomic_write_text(path, text):
+    """Write text to a private temp file and rename it over ``path``"""
+    tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_file, 'w') as f:
+        f.write(text)
+    os.replace(tmp_file, path)
+
+
+def _atomic_write_json(path, data):
+    _atomic_write_text(path, json.dumps(data, separators=(',', ':')))
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock on ``path`` shared by every process (a no-op without fcntl)"""
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+# Day fields that are running totals: concurrent changes are added together
+ADDITIVE_FIELDS = ('water_ml',)
+
+
+def merge_day(base, local, disk):
+    """
+    Three-way merge of one day's data
+    
+    ``base`` is the day as this process last read or wrote it, ``local`` its
+    unsaved version and ``disk`` what another process has written since.
+    Fields left unchanged locally take the disk value; additive fields get
+    both changes; lists keep the disk items plus local additions, minus
+    local removals; other changed fields take the local value. A day that
+    did not exist at ``base`` (None) merges as if it had been empty.
+    """
+    if not isinstance(disk, dict):
+        return local
+    if not isinstance(base, dict):
+        base = {}
+    merged = dict(disk)
+    for key, value in local.items():
+        old = base.get(key)
+        if key not in disk or value == old:
+            merged.setdefault(key, value)
+        elif isinstance(value, dict):
+            merged[key] = merge_day(old if isinstance(old, dict) else {}, value, disk[key])
+        elif isinstance(value, list) and isinstance(disk[key], list):
+            old = old if isinstance(old, list) else []
+            removed = [item for item in old if item not in value]
+            merged[key] = [item for item in disk[key] if item not in removed]
+            merged[key] += [item for item in value if item not in old and item not in merged[key]]
+        elif (key in ADDITIVE_FIELDS and isinstance(value, (int, float))
+              and isinstance(disk[key], (int, float))):
+            merged[key] = disk[key] + value - (old if isinstance(old, (int, float)) else 0)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class MonthlyDays(MutableMapping):
+    """Day-keyed tracker data stored as ``<directory>/<YYYY-MM>.json`` files
+    
+    Behaves like the ``{'YYYY-MM-DD': day_data}`` dict of the single-file
+    layout, but a month's file is only read when one of its days is first
+    accessed, so today's data and the last week touch at most two files
+    however long the history is. ``save`` rewrites only the loaded months
+    whose contents changed.
+    """
+    
+    def __init__(self, directory):
+        self.directory = directory
+        self._months = {}
+        # JSON text and mtime of each loaded month as last read or written
+        self._saved = {}
+        self._mtimes = {}
+    
+    def _path(self, month):
+        return os.path.join(self.directory, f'{month}.json')
+    
+    def _month(self, day_key):
+        month = day_key[:7]
+        days = self._months.get(month)
+        if days is None:
+            path = self._path(month)
+            self._mtimes[month] = _mtime(path)
+            days = {}
+            if self._mtimes[month] is not None:
+                with open(path, 'r') as f:
+                    days = json.load(f)
+            self._months[month] = days
+            self._saved[month] = json.dumps(days, separators=(',', ':'))
+        return days
+    
+    def months(self):
+        """Months with a partition file or loaded data, oldest first"""
+        on_disk = set()
+        if os.path.isdir(self.directory):
+            on_disk = {name[:-5] for name in os.listdir(self.directory) if name.endswith('.json')}
+        return sorted(on_disk | {m for m, days in self._months.items() if days})
+    
+    @property
+    def loaded_months(self):
+        return sorted(self._months)
+    
+    def __getitem__(self, day_key):
+        return self._month(day_key)[day_key]
+    
+    def __setitem__(self, day_key, value):
+        self._month(day_key)[day_key] = value
+    
+    def __delitem__(self, day_key):
+        del self._month(day_key)[day_key]
+    
+    def __contains__(self, day_key):
+        return isinstance(day_key, str) and day_key in self._month(day_key)
+    
+    def __iter__(self):
+        # A full scan; the hot paths only look up individual days
+        for month in self.months():
+            yield from sorted(self._month(month + '-01'))
+    
+    def __len__(self):
+        return sum(len(self._month(month + '-01')) for month in self.months())
+    
+    def save(self):
+        """Write every loaded month that changed; returns the number written"""
+        os.makedirs(self.directory, exist_ok=True)
+        written = 0
+        for month, days in self._months.items():
+            text = json.dumps(days, separators=(',', ':'))
+            if text == self._saved.get(month):
+                continue
+            _atomic_write_text(self._path(month), text)
+            self._saved[month] = text
+            self._mtimes[month] = _mtime(self._path(month))
+            written += 1
+        return written
+    
+    def saved_day(self, day_key):
+        """The day as last read from or written to its partition, or None"""
+        text = self._saved.get(day_key[:7])
+        return json.loads(text).get(day_key) if text is not None else None
+    
+    def changed_on_disk(self):
+        """Whether another process has rewritten a loaded month"""
+        return any(_mtime(self._path(month)) != mtime for month, mtime in self._mtimes.items())
+
+
+def migrate_to_monthly(legacy_file, directory, keep=False):
+    """
+    Split a single-file tracker into monthly partitions
+    
+    Days already present in a partition are kept. The legacy file is renamed
+    to ``<file>.migrated`` unless ``keep`` is set.
+    
+    Returns:
+        int: Number of days copied
+    """
+    with open(legacy_file, 'r') as f:
+        legacy = json.load(f)
+    
+    partitions = MonthlyDays(directory)
+    copied = 0
+    for day_key, day_data in legacy.items():
+        if day_key not in partitions:
+            partitions[day_key] = day_data
+            copied += 1
+    partitions.save()
+    
+    if not keep:
+        os.replace(legacy_file, legacy_file + '.migrated')
+    return copied
+
+
+class RollingTotals:
+    """Prefix sums of the daily steps, water and sleep for O(1) window totals
+    
+    ``prefix[metric][i]`` is the metric summed over the ``i + 1`` days from
+    ``start`` (days without an entry count as 0) and ``tracked[i]`` is how
+    many of those days have an entry, so the total over any window is the
+    difference of two prefix values. Recording today's values only touches
+    the last entry; changing an older day shifts the entries after it.
+    
+    The per-day values are kept too, and the days recorded since the last
+    ``take_pending`` are what DailyTracker appends to its totals log.
+    """
+    
+    METRICS = ('steps', 'water_ml', 'sleep_hours')
+    
+    def __init__(self):
+        self.start = None
+        self.prefix = {metric: [] for metric in self.METRICS}
+        self.tracked = []
+        # 'YYYY-MM-DD' -> {metric: value} for every recorded day
+        self.values = {}
+        self.pending = set()
+    
+    @classmethod
+    def build(cls, days):
+        """Build the totals in one pass over a ``{'YYYY-MM-DD': day_data}`` mapping"""
+        totals = cls()
+        for day_key in sorted(days):
+            try:
+                totals.record(day_key, days[day_key])
+            except ValueError:
+                continue
+        return totals
+    
+    @staticmethod
+    def _value(day_data, metric):
+        try:
+            return float(day_data.get(metric) or 0)
+        except (TypeError, ValueError):
+            return 0.0
+    
+    def _index(self, ordinal):
+        """Position of a day in the prefix lists, growing them to cover it"""
+        if self.start is None:
+            self.start = ordinal
+        if ordinal < self.start:
+            padding = [0] * (self.start - ordinal)
+            for metric in self.METRICS:
+                self.prefix[metric][:0] = padding
+            self.tracked[:0] = padding
+            self.start = ordinal
+        
+        index = ordinal - self.start
+        missing = index + 1 - len(self.tracked)
+        if missing > 0:
+            for metric in self.METRICS:
+                values = self.prefix[metric]
+                values.extend([values[-1] if values else 0] * missing)
+            self.tracked.extend([self.tracked[-1] if self.tracked else 0] * missing)
+        return index
+    
+    @staticmethod
+    def _shift(values, index, delta):
+        for i in range(index, len(values)):
+            values[i] += delta
+    
+    def record(self, day_key, day_data):
+        """Set the values of one day from its tracker entry"""
+        index = self._index(date.fromisoformat(day_key).toordinal())
+        day_values = {metric: self._value(day_data, metric) for metric in self.METRICS}
+        old_values = self.values.get(day_key, {})
+        for metric, value in day_values.items():
+            delta = value - old_values.get(metric, 0)
+            if delta:
+                self._shift(self.prefix[metric], index, delta)
+        if day_key not in self.values:
+            self._shift(self.tracked, index, 1)
+        self.values[day_key] = day_values
+        self.pending.add(day_key)
+    
+    def take_pending(self):
+        """``(day_key, values)`` of the days recorded since the last call, oldest first"""
+        pending, self.pending = sorted(self.pending), set()
+        return [(day_key, self.values[day_key]) for day_key in pending]
+    
+    def _cumulative(self, values, ordinal):
+        """Sum of ``values`` over the days from ``start`` to ``ordinal``"""
+        if self.start is None or ordinal < self.start:
+            return 0
+        return values[min(ordinal - self.start, len(values) - 1)]
+    
+    def window(self, days, end=None):
+        """
+        Totals over the ``days`` days ending on ``end`` (default today)
+        
+        Returns:
+            dict: Sum and daily average of each metric, plus the number of
+                days in the window that have an entry
+        """
+        last = (end or date.today()).toordinal()
+        first = last - days
+        result = {'days': days}
+        for metric in self.METRICS:
+            values = self.prefix[metric]
+            total = self._cumulative(values, last) - self._cumulative(values, first)
+            result[metric] = total
+            result[f'avg_{metric}'] = total / days if days else 0
+        result['days_tracked'] = self._cumulative(self.tracked, last) - self._cumulative(self.tracked, first)
+        return result
+    
+    def to_dict(self):
+        return {
+            'start': date.fromordinal(self.start).isoformat() if self.start is not None else None,
+            'prefix': self.prefix,
+            'tracked': self.tracked
+        }
 
 
 class DailyTracker:
     """Track daily health and fitness activities"""
     
-    def __init__(self, user_email):
+    # Batch operation type -> (method, required fields, optional fields).
+    # 'meal' and 'exercise' also take an action of 'complete' or 'uncomplete'
+    BATCH_OPERATIONS = {
+        'steps': ('update_steps', ('steps',), ()),
+        'water': ('add_water', ('ml',), ()),
+        'sleep': ('update_sleep', ('hours',), ()),
+        'note': ('add_note', ('note',), ()),
+        'replace_food': ('replace_food', ('meal_type', 'original_food', 'replacement_food'), ()),
+        'meal': ('{action}_meal', ('meal_type',), ()),
+        'exercise': ('{action}_exercise', ('exercise_name',), ('day',))
+    }
+    
+    # Batch fields converted to numbers before they are applied
+    NUMERIC_FIELDS = {'steps': int, 'ml': int, 'hours': float}
+    
+    def __init__(self, user_email, autosave=True, layout='single'):
+        """
+        Args:
+            user_email: Owner of the tracker
+            autosave: Write every change to disk immediately. With False,
+                changes only mark the tracker dirty until flush() is called
+                (TrackerStore does this in the background)
+            layout: 'single' keeps all days in tracker_data/<user>.json;
+                'monthly' uses tracker_data/<user>/<YYYY-MM>.json partitions
+        """
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown tracker layout: {layout}")
         self.user_email = user_email
-        self.tracker_file = f'tracker_data/{user_email.replace("@", "_").replace(".", "_")}.json'
+        user_key = tracker_key(user_email)
+        self.tracker_file = f'tracker_data/{user_key}.json'
+        self.tracker_dir = f'tracker_data/{user_key}'
+        self.layout = layout
+        self.autosave = autosave
+        self.dirty = False
+        # Days changed since the last flush
+        self._dirty_days = set()
+        self.writes = 0
+        self.lock = threading.RLock()
+        # Set by TrackerStore once the tracker has been dropped from its cache
+        self.evicted = False
+        self._mtime = None
+        # Single layout: the file's JSON as last read or written
+        self._saved_text = None
         self.data = self._load_tracker_data()
+        self.totals_file = f'tracker_data/{user_key}.totals'
+        # Lines in the totals log, or None when it has to be rewritten in full
+        self._totals_lines = None
+        self.totals = self._load_totals()
+    
+    def _file_mtime(self):
+        return _mtime(self.tracker_file)
     
     def _load_tracker_data(self):
         """Load tracker data from file"""
         os.makedirs('tracker_data', exist_ok=True)
         
-        if os.path.exists(self.tracker_file):
+        if self.layout == 'monthly':
+            # Pick up history that has not been migrated yet
+            if os.path.exists(self.tracker_file):
+                migrate_to_monthly(self.tracker_file, self.tracker_dir)
+            return MonthlyDays(self.tracker_dir)
+        
+        self._mtime = self._file_mtime()
+        if self._mtime is not None:
             with open(self.tracker_file, 'r') as f:
-                return json.load(f)
+                self._saved_text = f.read()
+            return json.loads(self._saved_text)
         
+        self._saved_text = None
         return {}
     
-    def _save_tracker_data(self):
-        """Save tracker data to file"""
-        with open(self.tracker_file, 'w') as f:
-            json.dump(self.data, f, indent=2)
+    def _saved_day(self, day_key):
+        """A day as this process last read or wrote it (the base of a merge)"""
+        if self.layout == 'monthly':
+            return self.data.saved_day(day_key)
+        if self._saved_text is None:
+            return None
+        return json.loads(self._saved_text).get(day_key)
+    
+    def _source_mtimes(self):
+        """mtime of every file holding this tracker's days"""
+        if self.layout == 'single':
+            return {os.path.basename(self.tracker_file): self._file_mtime()}
+        if not os.path.isdir(self.tracker_dir):
+            return {}
+        return {
+            name: _mtime(os.path.join(self.tracker_dir, name))
+            for name in os.listdir(self.tracker_dir) if name.endswith('.json')
+        }
+    
+    def _load_totals(self):
+        """
+        Load the rolling totals saved with the data
+        
+        The totals file is a log of JSON lines: a version header, then
+        ``{"day": ..., <metric>: ...}`` lines for the days recorded by each
+        flush followed by a ``{"sources": ...}`` line with the mtimes of the
+        data files at that point. The prefix sums are rebuilt from the day
+        lines. If the last sources do not match the files (or the log is
+        missing or torn) the totals are rebuilt with one scan of the history.
+        """
+        self._totals_lines = None
+        try:
+            days, sources, lines = {}, None, 0
+            with open(self.totals_file, 'r') as f:
+                if json.loads(f.readline()).get('version') != TOTALS_LOG_VERSION:
+                    raise ValueError('old totals format')
+                lines = 1
+                for line in f:
+                    record = json.loads(line)
+                    if 'day' in record:
+                        days[record.pop('day')] = record
+                    else:
+                        sources = record['sources']
+                    lines += 1
+            if sources is not None and sources == self._source_mtimes():
+                totals = RollingTotals.build(days)
+                totals.pending.clear()
+                self._totals_lines = lines
+                return totals
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass
+        
+        # Scan a separate view so the partitions are not kept loaded
+        days = MonthlyDays(self.tracker_dir) if self.layout == 'monthly' else self.data
+        return RollingTotals.build(days)
+    
+    def _save_totals(self):
+        """
+        Append the days recorded since the last save to the totals log
+        
+        The log is rewritten with one line per day once it has grown to
+        twice that (or when it could not be used on load), so a flush costs
+        O(changed days) rather than O(history).
+        """
+        pending = self.totals.take_pending()
+        sources = json.dumps({'sources': self._source_mtimes()}, separators=(',', ':'))
+        if self._totals_lines is None or self._totals_lines > 2 * len(self.totals.values) + 64:
+            lines = [json.dumps({'version': TOTALS_LOG_VERSION})]
+            lines += [
+                json.dumps({'day': day_key, **values}, separators=(',', ':'))
+                for day_key, values in sorted(self.totals.values.items())
+            ]
+            lines.append(sources)
+            tmp_file = f"{self.totals_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_file, 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+            os.replace(tmp_file, self.totals_file)
+            self._totals_lines = len(lines)
+            return
+        
+        lines = [json.dumps({'day': day_key, **values}, separators=(',', ':')) for day_key, values in pending]
+        lines.append(sources)
+        with open(self.totals_file, 'a') as f:
+            f.write('\n'.join(lines) + '\n')
+        self._totals_lines += len(lines)
+    
+    def reload_if_changed(self):
+        """
+        Re-read the file if another process has written it since we last did
+        
+        Days changed locally but not flushed yet are merged into what was
+        read with merge_day, so neither side's changes to the same day are
+        lost; every other day comes from the file.
+        """
+        if self.layout == 'monthly':
+            changed = self.data.changed_on_disk()
+        else:
+            changed = self._file_mtime() != self._mtime
+        if not changed:
+            return False
+        
+        local = {day_key: (self._saved_day(day_key), self.data[day_key]) for day_key in self._dirty_days}
+        self.data = self._load_tracker_data()
+        for day_key, (base, day_data) in local.items():
+            disk = self.data[day_key] if day_key in self.data else None
+            self.data[day_key] = merge_day(base, day_data, disk)
+        self.totals = self._load_totals()
+        for day_key in sorted(local):
+            self.totals.record(day_key, self.data[day_key])
+        return True
+    
+    def _save_tracker_data(self, day_key=None):
+        """Record a change to a day (default today), writing it out now if autosave is on"""
+        day_key = day_key or self.get_today_key()
+        self.totals.record(day_key, self.data[day_key])
+        self.dirty = True
+        self._dirty_days.add(day_key)
+        if self.autosave:
+            self.flush()
+    
+    def flush(self):
+        """
+        Atomically write the tracker to disk if it has unsaved changes
+        
+        Changes another process wrote since our last read are merged in
+        first (see reload_if_changed). Where fcntl is available the check and
+        the write hold a lock file, so two processes cannot interleave them.
+        """
+        if not self.dirty:
+            return False
+        
+        with _file_lock(self.tracker_file + '.lock'):
+            self.reload_if_changed()
+            # Files are replaced atomically, so readers never see a half-written one
+            if self.layout == 'monthly':
+                self.data.save()
+            else:
+                self._saved_text = json.dumps(self.data, separators=(',', ':'))
+                _atomic_write_text(self.tracker_file, self._saved_text)
+                self._mtime = self._file_mtime()
+            self._save_totals()
+        self.dirty = False
+        self._dirty_days.clear()
+        self.writes += 1
+        return True
     
     def get_today_key(self):
         """Get today's date key"""
@@ -50,7 +576,7 @@ class DailyTracker:
                 'notes': '',
                 'created_at': datetime.now().isoformat()
             }
-            self._save_tracker_data()
+            self._save_tracker_data(today)
         
         return self.data[today]
     
@@ -129,6 +655,79 @@ class DailyTracker:
         self._save_tracker_data()
         return today_data
     
+    def _apply_operation(self, operation):
+        """Run one batch operation (see BATCH_OPERATIONS)"""
+        if not isinstance(operation, dict):
+            raise ValueError("operation must be an object")
+        
+        op_type = operation.get('type')
+        if op_type not in self.BATCH_OPERATIONS:
+            raise ValueError(f"unknown type {op_type!r}")
+        method, required, optional = self.BATCH_OPERATIONS[op_type]
+        
+        if '{action}' in method:
+            action = operation.get('action')
+            if action not in ('complete', 'uncomplete'):
+                raise ValueError(f"invalid action {action!r}")
+            method = method.format(action=action)
+        
+        missing = [field for field in required if field not in operation]
+        if missing:
+            raise ValueError(f"missing {', '.join(missing)}")
+        args = [self._batch_value(field, operation[field]) for field in required]
+        args += [operation.get(field) for field in optional]
+        getattr(self, method)(*args)
+    
+    def _batch_value(self, field, value):
+        convert = self.NUMERIC_FIELDS.get(field)
+        if convert is None:
+            return value
+        # bool is an int subclass, and float('nan') would poison the totals
+        if isinstance(value, bool):
+            raise ValueError(f"{field} must be a number")
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be a number") from None
+        if not math.isfinite(number):
+            raise ValueError(f"{field} must be a number")
+        return convert(number)
+    
+    def apply_batch(self, operations):
+        """
+        Apply a list of operations to today's data as one change
+        
+        Operations run in order, e.g. ``{'type': 'water', 'ml': 250}`` or
+        ``{'type': 'meal', 'meal_type': 'lunch', 'action': 'complete'}``, and
+        the tracker is written once at the end rather than after each one.
+        If an operation fails, today's data is restored and nothing is written.
+        
+        Raises:
+            ValueError: For an invalid operation; the message gives its index
+        """
+        autosave, self.autosave = self.autosave, False
+        try:
+            today = self.get_today_key()
+            before = copy.deepcopy(self.get_today_data())
+            was_dirty, dirty_days = self.dirty, set(self._dirty_days)
+            try:
+                for index, operation in enumerate(operations):
+                    try:
+                        self._apply_operation(operation)
+                    except (KeyError, TypeError, ValueError) as e:
+                        raise ValueError(f"Operation {index}: {e}") from e
+            except Exception:
+                self.data[today] = before
+                self.totals.record(today, before)
+                self.dirty, self._dirty_days = was_dirty, dirty_days
+                raise
+        finally:
+            self.autosave = autosave
+        
+        if self.autosave:
+            self.flush()
+        return self.data[today]
+    
     def get_weekly_summary(self):
         """Get weekly summary"""
         from datetime import timedelta
@@ -171,11 +770,8 @@ class DailyTracker:
         total_meals = 4
         meals_progress = (len(today_data['meals_completed']) / total_meals) * 100
         
-        # Weekly average
-        weekly_data = self.get_weekly_summary()
-        avg_steps = sum(d['steps'] for d in weekly_data) / len(weekly_data) if weekly_data else 0
-        avg_water = sum(d['water_ml'] for d in weekly_data) / len(weekly_data) if weekly_data else 0
-        avg_sleep = sum(d.get('sleep_hours', 0) for d in weekly_data) / len(weekly_data) if weekly_data else 0
+        # Rolling averages come from the prefix sums, not a scan of the days
+        weekly, monthly, quarterly = (self.get_window_stats(days) for days in (7, 30, 90))
         
         return {
             'today': {
@@ -191,10 +787,152 @@ class DailyTracker:
                 'meals_progress': round(meals_progress, 1),
                 'exercises_completed': len(today_data['exercises_completed'])
             },
-            'weekly': {
-                'avg_steps': round(avg_steps),
-                'avg_water': round(avg_water),
-                'avg_sleep': round(avg_sleep, 1),
-                'total_days': len(weekly_data)
-            }
+            'weekly': weekly,
+            'monthly': monthly,
+            'quarterly': quarterly
         }
+    
+    def get_window_stats(self, days, end=None):
+        """
+        Average steps, water and sleep over any number of days, in O(1)
+        
+        Args:
+            days: Window length; days without an entry count as 0
+            end: Last day of the window (default today)
+        """
+        totals = self.totals.window(days, end)
+        return {
+            'avg_steps': round(totals['avg_steps']),
+            'avg_water': round(totals['avg_water_ml']),
+            'avg_sleep': round(totals['avg_sleep_hours'], 1),
+            'total_days': days,
+            'days_tracked': totals['days_tracked']
+        }
+
+
+class TrackerStore:
+    """Bounded in-process cache of DailyTracker objects with write-back
+    
+    Trackers stay in memory between requests, so a user's history file is
+    parsed once rather than on every request. Changes only mark a tracker
+    dirty; a background thread writes dirty trackers every
+    ``flush_interval`` seconds, and evicted trackers and everything left at
+    interpreter exit are flushed too. Several taps on "+250 ml" in one
+    interval therefore cost a single file write.
+    
+    Use ``open`` to access a tracker: it holds the tracker's lock for the
+    duration of the block and first reloads the file if another process has
+    written it (merging in changes that have not been flushed yet).
+    
+    An evicted tracker is flushed before its user can be loaded again: until
+    the flush is done, a miss for that user waits instead of reading the
+    file the flush is about to replace.
+    """
+    
+    def __init__(self, max_trackers=256, flush_interval=2.0, layout='single'):
+        """
+        Args:
+            max_trackers: Trackers kept in memory (least recently used are evicted)
+            flush_interval: Seconds between background flushes; 0 writes
+                through at the end of every ``open`` block
+            layout: Storage layout of the trackers (see DailyTracker)
+        """
+        self.max_trackers = max_trackers
+        self.layout = layout
+        self.flush_interval = flush_interval
+        self._trackers = OrderedDict()
+        # user_email -> Event set once that user's evicted tracker is flushed
+        self._evicting = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        self._stop = threading.Event()
+        self._flusher = None
+        if flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name='tracker-flush', daemon=True)
+            self._flusher.start()
+        atexit.register(self.close)
+    
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Tracker flush failed: {e}")
+    
+    def _get(self, user_email):
+        evicted = []
+        while True:
+            with self._lock:
+                flushing = self._evicting.get(user_email)
+                if flushing is None:
+                    tracker = self._trackers.get(user_email)
+                    if tracker is not None:
+                        self._trackers.move_to_end(user_email)
+                        self.hits += 1
+                        return tracker
+                    
+                    self.misses += 1
+                    tracker = DailyTracker(user_email, autosave=False, layout=self.layout)
+                    self._trackers[user_email] = tracker
+                    while len(self._trackers) > self.max_trackers:
+                        old_email, old = self._trackers.popitem(last=False)
+                        self._evicting[old_email] = threading.Event()
+                        evicted.append(old)
+                        self.evictions += 1
+                    break
+            # The user's previous tracker is still being written out
+            flushing.wait()
+        
+        for old in evicted:
+            try:
+                with old.lock:
+                    old.evicted = True
+                    old.flush()
+            finally:
+                with self._lock:
+                    self._evicting.pop(old.user_email).set()
+        return tracker
+    
+    @contextmanager
+    def open(self, user_email):
+        """Lock and return the cached tracker for ``user_email``"""
+        while True:
+            tracker = self._get(user_email)
+            with tracker.lock:
+                # Evicted between lookup and lock: its changes would be lost
+                if tracker.evicted:
+                    continue
+                tracker.reload_if_changed()
+                yield tracker
+                if self.flush_interval <= 0:
+                    tracker.flush()
+                return
+    
+    def flush(self):
+        """Write every dirty tracker; returns how many were written"""
+        with self._lock:
+            trackers = list(self._trackers.values())
+        written = 0
+        for tracker in trackers:
+            with tracker.lock:
+                written += tracker.flush()
+        return written
+    
+    def close(self):
+        """Stop the background flusher and write any pending changes"""
+        self._stop.set()
+        self.flush()
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'trackers': len(self._trackers),
+                'dirty': sum(1 for t in self._trackers.values() if t.dirty),
+                'writes': sum(t.writes for t in self._trackers.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,280 @@
+"""
+Tracker Analytics
+Columnar view of every user's tracker history for trend and cohort reports
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from tracker import tracker_key
+
+
+# Per-day columns of the frame besides 'user' and 'date'
+METRICS = ('steps', 'water_ml', 'sleep_hours', 'meals_completed', 'exercises_completed')
+
+# Bumped whenever the snapshot layout changes; older snapshots are ignored
+SNAPSHOT_VERSION = 1
+
+
+def _numbers(values):
+    """Column of floats; entries that are not numbers count as 0"""
+    try:
+        return np.asarray([value or 0 for value in values], dtype=np.float64)
+    except (TypeError, ValueError):
+        result = np.zeros(len(values))
+        for i, value in enumerate(values):
+            try:
+                result[i] = float(value or 0)
+            except (TypeError, ValueError):
+                pass
+        return result
+
+
+def parse_tracker_file(path):
+    """
+    Read one tracker file (a single-file tracker or one monthly partition)
+
+    Returns:
+        dict: Column name -> NumPy array, one row per tracked day
+    """
+    with open(path, 'r') as f:
+        days = json.load(f)
+
+    # Convert all date keys at once; only fall back to checking them one by one
+    # if some key is not a date
+    try:
+        dates = np.asarray(list(days), dtype='datetime64[D]')
+    except ValueError:
+        valid = {}
+        for day_key, day in days.items():
+            try:
+                np.datetime64(day_key, 'D')
+            except ValueError:
+                continue
+            valid[day_key] = day
+        days = valid
+        dates = np.asarray(list(days), dtype='datetime64[D]')
+
+    entries = list(days.values())
+    return {
+        'date': dates,
+        'steps': _numbers([day.get('steps') for day in entries]),
+        'water_ml': _numbers([day.get('water_ml') for day in entries]),
+        'sleep_hours': _numbers([day.get('sleep_hours') for day in entries]),
+        'meals_completed': _numbers([len(day.get('meals_completed') or ()) for day in entries]),
+        'exercises_completed': _numbers([len(day.get('exercises_completed') or ()) for day in entries])
+    }
+
+
+class TrackerAnalytics:
+    """Cross-user tracker analytics backed by an .npz snapshot
+
+    All users' days are held as flat columns (user, date, steps, water_ml,
+    sleep_hours, meals_completed, exercises_completed), so reports are
+    pandas group-by/resample operations instead of loops over nested dicts.
+
+    Both tracker layouts are read: ``<user>.json`` files and
+    ``<user>/<YYYY-MM>.json`` partitions. The snapshot remembers the mtime
+    and size of every source file, and ``refresh`` only re-parses the files
+    that changed since, so after the first build a report costs a directory
+    scan plus the query.
+    """
+
+    def __init__(self, data_dir='tracker_data', snapshot_path=None, workers=None):
+        """
+        Args:
+            data_dir: Tracker data directory
+            snapshot_path: .npz cache file (default <data_dir>/analytics_snapshot.npz)
+            workers: Processes used to parse changed files (None: parse in-process)
+        """
+        self.data_dir = data_dir
+        self.snapshot_path = snapshot_path or os.path.join(data_dir, 'analytics_snapshot.npz')
+        self.workers = workers
+        self._frame = None
+        self.last_refresh = {}
+
+    def _scan_sources(self):
+        """(source name, user key, path, mtime, size) of every tracker file"""
+        sources = []
+        if not os.path.isdir(self.data_dir):
+            return sources
+        for entry in sorted(os.scandir(self.data_dir), key=lambda e: e.name):
+            if entry.is_file() and entry.name.endswith('.json'):
+                files = [(entry.name, entry)]
+                user = entry.name[:-5]
+            elif entry.is_dir():
+                files = [
+                    (f'{entry.name}/{month.name}', month)
+                    for month in sorted(os.scandir(entry.path), key=lambda e: e.name)
+                    if month.is_file() and month.name.endswith('.json')
+                ]
+                user = entry.name
+            else:
+                continue
+            for name, file_entry in files:
+                stat = file_entry.stat()
+                sources.append((name, user, file_entry.path, stat.st_mtime_ns, stat.st_size))
+        return sources
+
+    def _load_snapshot(self):
+        """Source name -> ((mtime, size), columns) from the saved snapshot"""
+        try:
+            with np.load(self.snapshot_path, allow_pickle=False) as snapshot:
+                if int(snapshot['version']) != SNAPSHOT_VERSION:
+                    return {}
+                columns = {name: snapshot[name] for name in ('date',) + METRICS}
+                bounds = np.concatenate([[0], np.cumsum(snapshot['counts'])])
+                return {
+                    str(name): ((int(mtime), int(size)), {
+                        column: values[bounds[i]:bounds[i + 1]] for column, values in columns.items()
+                    })
+                    for i, (name, mtime, size) in enumerate(
+                        zip(snapshot['sources'], snapshot['mtimes'], snapshot['sizes'])
+                    )
+                }
+        except (OSError, KeyError, ValueError):
+            return {}
+
+    def _save_snapshot(self, sources, parts):
+        os.makedirs(os.path.dirname(self.snapshot_path) or '.', exist_ok=True)
+        tmp_file = f"{self.snapshot_path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp_file,
+            version=np.int64(SNAPSHOT_VERSION),
+            sources=np.asarray([source[0] for source in sources], dtype=str),
+            mtimes=np.asarray([source[3] for source in sources], dtype=np.int64),
+            sizes=np.asarray([source[4] for source in sources], dtype=np.int64),
+            counts=np.asarray([len(part['date']) for part in parts], dtype=np.int64),
+            **{
+                column: np.concatenate([part[column] for part in parts]) if parts else np.array([])
+                for column in ('date',) + METRICS
+            }
+        )
+        os.replace(tmp_file, self.snapshot_path)
+
+    def _parse(self, paths):
+        if self.workers and len(paths) > 1:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                return list(pool.map(parse_tracker_file, paths, chunksize=32))
+        return [parse_tracker_file(path) for path in paths]
+
+    def refresh(self):
+        """
+        Bring the frame up to date with tracker_data, re-parsing changed files only
+
+        Returns:
+            pandas.DataFrame: One row per user and tracked day
+        """
+        sources = self._scan_sources()
+        cached = self._load_snapshot()
+
+        parts = [None] * len(sources)
+        changed = []
+        for i, (name, _, path, mtime, size) in enumerate(sources):
+            entry = cached.get(name)
+            if entry is not None and entry[0] == (mtime, size):
+                parts[i] = entry[1]
+            else:
+                changed.append(i)
+
+        for i, columns in zip(changed, self._parse([sources[i][2] for i in changed])):
+            parts[i] = columns
+
+        removed = len(cached.keys() - {source[0] for source in sources})
+        if changed or removed or not os.path.exists(self.snapshot_path):
+            self._save_snapshot(sources, parts)
+
+        users = [source[1] for source in sources]
+        counts = [len(part['date']) for part in parts]
+        frame = pd.DataFrame({
+            'user': pd.Categorical(np.repeat(np.asarray(users, dtype=object), counts)),
+            'date': pd.to_datetime(np.concatenate([part['date'] for part in parts]) if parts else []),
+            **{
+                metric: np.concatenate([part[metric] for part in parts]) if parts else np.array([])
+                for metric in METRICS
+            }
+        })
+        # A user caught mid-migration can have a day in both layouts
+        self._frame = frame.drop_duplicates(['user', 'date'], keep='last').reset_index(drop=True)
+
+        self.last_refresh = {
+            'sources': len(sources),
+            'parsed': len(changed),
+            'reused': len(sources) - len(changed),
+            'rows': len(self._frame)
+        }
+        return self._frame
+
+    @property
+    def frame(self):
+        """The columnar history, built on first use"""
+        if self._frame is None:
+            self.refresh()
+        return self._frame
+
+    def _select(self, users=None, days=None, end=None):
+        """Rows of the given users within the ``days`` days ending on ``end``"""
+        frame = self.frame
+        mask = np.ones(len(frame), dtype=bool)
+        if users is not None:
+            mask &= frame['user'].isin([tracker_key(user) if '@' in user else user for user in users]).to_numpy()
+        if days is not None:
+            last = pd.Timestamp(end or pd.Timestamp.today()).normalize()
+            mask &= ((frame['date'] > last - pd.Timedelta(days=days)) & (frame['date'] <= last)).to_numpy()
+        return frame[mask]
+
+    def resample(self, metric='steps', freq='W', how='mean', users=None, days=None, per_user=False):
+        """
+        Aggregate one metric per time period
+
+        Args:
+            metric: Column to aggregate
+            freq: pandas offset alias ('D', 'W', 'MS', 'QS', ...)
+            how: Aggregation ('mean', 'sum', 'median', 'count', ...)
+            users: Emails or tracker keys to include (default all)
+            days: Only use the last N days
+            per_user: Keep one series per user instead of pooling them
+        """
+        frame = self._select(users, days)
+        if per_user:
+            grouped = frame.groupby(['user', pd.Grouper(key='date', freq=freq)], observed=True)
+            return grouped[metric].agg(how)
+        return frame.set_index('date')[metric].resample(freq).agg(how)
+
+    def group_by(self, by='user', metrics=METRICS, how='mean', days=None):
+        """
+        Aggregate metrics per group of users
+
+        Args:
+            by: A frame column, or a mapping of tracker key -> group label
+                (users without a label are left out)
+            metrics: Columns to aggregate
+            how: Aggregation applied to every metric
+            days: Only use the last N days
+        """
+        frame = self._select(days=days)
+        if isinstance(by, str):
+            keys = frame[by]
+        else:
+            keys = frame['user'].astype(object).map(by)
+        return frame.groupby(keys, observed=True)[list(metrics)].agg(how)
+
+    @staticmethod
+    def goal_groups(db):
+        """Tracker key -> primary fitness goal for every user with a profile"""
+        groups = {}
+        for email, user_data in db.get_all_users().items():
+            goals = (user_data.get('profile') or {}).get('fitness_goals') or []
+            if goals:
+                groups[tracker_key(email)] = goals[0]
+        return groups
+
+    def cohort_report(self, db, metrics=('steps', 'water_ml', 'sleep_hours'), days=90, how='mean'):
+        """Average daily metrics per primary fitness goal over the last ``days`` days"""
+        frame = self._select(days=days)
+        goals = frame['user'].astype(object).map(self.goal_groups(db)).rename('goal')
+        grouped = frame.groupby(goals, observed=True)
+        report = grouped[list(metrics)].agg(how)
+        report['users'] = grouped['user'].nunique()
+        return report
@@ -0,0 +1,173 @@
+"""
+User Registry
+Where HealthFitnessXAISystem keeps its UserProfile objects
+"""
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from models.user_profile import UserProfile
+
+
+class InMemoryUserRegistry:
+    """Per-process registry: a plain dict of user_id -> UserProfile
+
+    Profiles created in one worker process are invisible to the others, so
+    multi-worker deployments need SQLiteUserRegistry or sticky sessions.
+    """
+
+    def __init__(self):
+        self._users = {}
+
+    def get(self, user_id, default=None):
+        return self._users.get(user_id, default)
+
+    def __getitem__(self, user_id):
+        return self._users[user_id]
+
+    def __setitem__(self, user_id, user):
+        self._users[user_id] = user
+
+    def __contains__(self, user_id):
+        return user_id in self._users
+
+    def __len__(self):
+        return len(self._users)
+
+    def stats(self):
+        return {'backend': 'memory', 'size': len(self._users)}
+
+
+class SQLiteUserRegistry:
+    """Registry shared by every process through a SQLite file
+
+    Each profile row carries a version that is bumped on every write. A
+    bounded LRU of recently used profiles sits in front of the table; a
+    cached profile is only returned after a primary-key lookup confirms its
+    version is current, so a write in one worker is seen by the next read
+    in any other.
+
+    Users missing from the table are hydrated lazily with ``loader`` (for
+    example a lookup in UserDatabase), so existing accounts work without a
+    migration step.
+    """
+
+    def __init__(self, db_path='user_registry.sqlite3', max_entries=1024, loader=None):
+        """
+        Args:
+            db_path: SQLite file shared by all workers
+            max_entries: Profiles kept in the in-memory LRU
+            loader: Callable user_id -> profile dict or None, used on a miss
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.loader = loader
+        self._local = threading.local()
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.hydrated = 0
+
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS user_profiles ('
+                'user_id TEXT PRIMARY KEY, profile TEXT NOT NULL, '
+                'version INTEGER NOT NULL, updated_at TEXT NOT NULL)'
+            )
+
+    def _connection(self):
+        """One connection per thread; WAL lets workers read while another writes"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, user_id, version, user):
+        with self._lock:
+            self._lru[user_id] = (version, user)
+            self._lru.move_to_end(user_id)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def get(self, user_id, default=None):
+        """Return the current profile for user_id, or ``default``"""
+        with self._lock:
+            cached = self._lru.get(user_id)
+
+        conn = self._connection()
+        if cached is not None:
+            row = conn.execute('SELECT version FROM user_profiles WHERE user_id = ?', (user_id,)).fetchone()
+            if row is not None and row[0] == cached[0]:
+                with self._lock:
+                    self._lru.move_to_end(user_id)
+                    self.hits += 1
+                return cached[1]
+
+        with self._lock:
+            self.misses += 1
+        row = conn.execute('SELECT profile, version FROM user_profiles WHERE user_id = ?', (user_id,)).fetchone()
+        if row is not None:
+            user = UserProfile.from_dict(json.loads(row[0]))
+            self._remember(user_id, row[1], user)
+            return user
+
+        profile = self.loader(user_id) if self.loader else None
+        if not profile:
+            return default
+        user = UserProfile.from_dict(profile)
+        self[user_id] = user
+        with self._lock:
+            self.hydrated += 1
+        return user
+
+    def __getitem__(self, user_id):
+        user = self.get(user_id)
+        if user is None:
+            raise KeyError(user_id)
+        return user
+
+    def __setitem__(self, user_id, user):
+        """Store a profile, bumping its version"""
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT INTO user_profiles (user_id, profile, version, updated_at) VALUES (?, ?, 1, ?) '
+                'ON CONFLICT(user_id) DO UPDATE SET profile = excluded.profile, '
+                'version = user_profiles.version + 1, updated_at = excluded.updated_at',
+                (user_id, json.dumps(user.to_dict(), default=str), datetime.now().isoformat())
+            )
+            version = conn.execute(
+                'SELECT version FROM user_profiles WHERE user_id = ?', (user_id,)
+            ).fetchone()[0]
+        self._remember(user_id, version, user)
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM user_profiles').fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'sqlite',
+                'cached': len(self._lru),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hydrated': self.hydrated,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+def open_user_registry(backend='memory', db_path='user_registry.sqlite3', max_entries=1024, loader=None):
+    """Create the registry selected by ``backend`` ('memory' or 'sqlite')"""
+    if backend == 'memory':
+        return InMemoryUserRegistry()
+    if backend == 'sqlite':
+        return SQLiteUserRegistry(db_path, max_entries=max_entries, loader=loader)
+    raise ValueError(f"Unknown user registry backend: {backend}")